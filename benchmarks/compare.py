@@ -0,0 +1,29 @@
+"""
+Compare two benchmark result files stage by stage, e.g.
+
+    python -m benchmarks.compare benchmarks/results/<before>.json benchmarks/results/<after>.json
+"""
+import json
+import sys
+
+METRICS = ('seconds', 'mb_per_s', 'rows_per_s', 'peak_rss_mb')
+
+
+def compare(before, after):
+    print('{:<20} {:<12} {:>12} {:>12} {:>8}'.format('stage', 'metric', before['commit'], after['commit'], 'ratio'))
+    for stage, before_result in before['stages'].items():
+        after_result = after['stages'].get(stage)
+        if after_result is None:
+            continue
+        for metric in METRICS:
+            old, new = before_result.get(metric), after_result.get(metric)
+            if old is None or new is None:
+                continue
+            print('{:<20} {:<12} {:>12.3f} {:>12.3f} {:>8.2f}'.format(stage, metric, old, new, new / old if old else 0))
+
+
+if __name__=="__main__":
+    if len(sys.argv)!=3:
+        print("Usage: python -m benchmarks.compare BEFORE.json AFTER.json")
+        sys.exit(2)
+    compare(json.loads(open(sys.argv[1]).read()), json.loads(open(sys.argv[2]).read()))
@@ -0,0 +1,278 @@
+"""
+Benchmark the FLO2D parse and push stages against a stand-in curw_fcst database.
+The timeseries writes go to an offline backend (memory or sqlite) with optional simulated latency.
+
+Synthetic HYCHAN.OUT and TIMDEP.OUT files are generated, then every stage is run in a forked
+process so its peak RSS can be measured on its own. Results are written as a JSON file named
+after the current commit, e.g.
+
+    python -m benchmarks.run -v 150 -e 300 -t 96 -n 0.01
+"""
+import getopt
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from flo2d.timdep import iter_timdep_blocks, TimdepRowIndex
+from flo2d.flood_map import read_grid, parse_timdep_block, FloodMap
+
+from benchmarks.synthetic import generate_hychan, generate_timdep
+from benchmarks.stand_in_db import StandInDatabase, install
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmarks', 'results')
+
+TS_START_DATE = '2019-05-24'
+TS_START_TIME = '00:00:00'
+
+
+def usage():
+    usageText = """
+    Usage: python -m benchmarks.run [-v 250|150] [-e ELEMENTS] [-t TIMESTEPS] [-n NAN_DENSITY]
+    [-b memory|sqlite] [-l LATENCY] [-o OUTPUT_DIR]
+
+    -h  --help          Show usage
+    -v  --version       FLO2D model version, selects the grid (flo2d_250m.csv / flo2d_150m.csv). Default 250.
+    -e  --elements      Number of channel elements in HYCHAN.OUT. Default 300.
+    -t  --timesteps     Number of output timesteps. Default 96.
+    -s  --stations      Number of channel and flood plain stations pushed. Default 40.
+    -n  --nan_density   Fraction of values written as NaN. Default 0.
+    -b  --backend       Offline timeseries backend, memory or sqlite. Default memory.
+    -l  --latency       Simulated latency per database round trip in seconds. Default 0.
+    -o  --output        Directory to write the JSON results to. Default benchmarks/results.
+    """
+    print(usageText)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR).decode().strip()
+    except Exception:
+        return 'unknown'
+
+
+def prepare_workspace(work_dir, version, elements, timesteps, stations, nan_density):
+    """
+    Lay out the synthetic run the way the hourly runner does: configs under ./extract and the
+    FLO2D outputs in their own directory.
+    :return: (output_dir, stand-in database arguments, file sizes)
+    """
+    extract_dir = os.path.join(work_dir, 'extract')
+    output_dir = os.path.join(work_dir, 'output')
+    os.makedirs(extract_dir)
+    os.makedirs(output_dir)
+
+    grid_csv = 'flo2d_{}m.csv'.format(version)
+    shutil.copy(os.path.join(REPO_DIR, grid_csv), extract_dir)
+    grid_ids = read_grid(os.path.join(extract_dir, grid_csv))[0]
+
+    for config_file in ('config.json', 'dis_config.json'):
+        config = json.loads(open(os.path.join(REPO_DIR, config_file)).read())
+        config.update({'version': str(version), 'sim_tag': 'benchmark', 'utc_offset': ''})
+        config['FLOOD_MAP_FILE'] = ''
+        config['RUN_SUMMARY_FILE'] = os.path.join(work_dir, 'run_summary.json')
+        with open(os.path.join(extract_dir, config_file), 'w') as f:
+            f.write(json.dumps(config, indent=2))
+
+    step = max(1, len(grid_ids) // (elements + stations))
+    channel_elements = [str(grid_id) for grid_id in grid_ids[::step][:elements]]
+    flood_elements = [str(grid_id) for grid_id in grid_ids[step // 2::step][:stations]]
+
+    sizes = {
+            'HYCHAN.OUT': generate_hychan(os.path.join(output_dir, 'HYCHAN.OUT'), channel_elements, timesteps,
+                    nan_density=nan_density),
+            'TIMDEP.OUT': generate_timdep(os.path.join(output_dir, 'TIMDEP.OUT'),
+                    os.path.join(extract_dir, grid_csv), timesteps, nan_density=nan_density)
+            }
+
+    channel_cell_map = {element: 'channel {}'.format(element) for element in channel_elements[:stations]}
+    flood_plain_cell_map = {element: 'flood plain {}'.format(element) for element in flood_elements}
+    station_elements = list(channel_cell_map) + list(flood_plain_cell_map)
+    # Distinct coordinates, the timeseries id is derived from them
+    db_args = (channel_cell_map, flood_plain_cell_map,
+               {element: [i + 1, round(6.9 + i * 0.001, 3), 79.8] for i, element in enumerate(station_elements)})
+    return output_dir, db_args, sizes
+
+
+def stage_timdep_scan(output_dir, db_args):
+    rowIndex = TimdepRowIndex(db_args[1].keys())
+    rows_parsed = 0
+    with open(os.path.join(output_dir, 'TIMDEP.OUT')) as infile:
+        for model_time, rows in iter_timdep_blocks(infile):
+            rowIndex.lookup(rows)
+            rows_parsed += len(rows)
+    return {'rows_parsed': rows_parsed, 'bytes_read': os.path.getsize(os.path.join(output_dir, 'TIMDEP.OUT'))}
+
+
+def stage_flood_map(output_dir, db_args):
+    grid_csv = [f for f in os.listdir(os.path.join(output_dir, '..', 'extract')) if f.endswith('.csv')][0]
+    floodMap = FloodMap(read_grid(os.path.join(output_dir, '..', 'extract', grid_csv))[0])
+    rows_parsed = 0
+    with open(os.path.join(output_dir, 'TIMDEP.OUT')) as infile:
+        for model_time, rows in iter_timdep_blocks(infile):
+            floodMap.update(model_time, parse_timdep_block(rows))
+            rows_parsed += len(rows)
+    return {'rows_parsed': rows_parsed, 'bytes_read': os.path.getsize(os.path.join(output_dir, 'TIMDEP.OUT'))}
+
+
+def _upload(function, output_dir, db_args, files):
+    import flo2d.engine
+    db = StandInDatabase(*db_args)
+    install(flo2d.engine, db)
+    summary_path = os.path.join(output_dir, '..', 'run_summary.json')
+    if os.path.exists(summary_path):
+        os.remove(summary_path)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        function(output_dir, TS_START_DATE, TS_START_TIME, TS_START_DATE, TS_START_TIME)
+    # Per stage breakdown recorded by the run's own instrumentation
+    with open(summary_path) as f:
+        run_stages = json.loads(f.read())['stages']
+    return {
+            'run_stages'  : run_stages,
+            'rows_written': db.rows_written,
+            'db_calls'    : db.calls,
+            'db_seconds'  : db.seconds,
+            'bytes_read'  : sum(os.path.getsize(os.path.join(output_dir, f)) for f in files)
+            }
+
+
+def stage_upload_discharges(output_dir, db_args):
+    import extract_discharge_hourly_run as module
+    return _upload(module.upload_discharges, output_dir, db_args, ['HYCHAN.OUT'])
+
+
+def stage_upload_waterlevels(output_dir, db_args):
+    import extract_water_level_hourly_run as module
+    return _upload(module.upload_waterlevels, output_dir, db_args, ['HYCHAN.OUT', 'TIMDEP.OUT'])
+
+
+STAGES = [
+        ('timdep_scan', stage_timdep_scan),
+        ('flood_map', stage_flood_map),
+        ('upload_discharges', stage_upload_discharges),
+        ('upload_waterlevels', stage_upload_waterlevels)
+        ]
+
+
+def _run_stage(stage, output_dir, db_args, queue):
+    os.chdir(os.path.join(output_dir, '..'))
+    start = time.perf_counter()
+    try:
+        result = stage(output_dir, db_args)
+    except Exception as e:
+        queue.put({'error': repr(e)})
+        return
+    result['seconds'] = time.perf_counter() - start
+    # ru_maxrss is in KB on Linux
+    result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    queue.put(result)
+
+
+def run_stage(stage, output_dir, db_args):
+    """
+    Run a stage in a forked process and add throughput figures to its result.
+    """
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    process = context.Process(target=_run_stage, args=(stage, output_dir, db_args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    if 'error' in result:
+        return result
+
+    seconds = result['seconds']
+    parse_seconds = seconds - result.get('db_seconds', 0.0)
+    result['mb_per_s'] = result['bytes_read'] / (1024.0 * 1024.0) / parse_seconds if parse_seconds else None
+    rows = result.get('rows_written', result.get('rows_parsed', 0))
+    result['rows_per_s'] = rows / seconds if seconds else None
+    return result
+
+
+def main(argv):
+    version = 250
+    elements = 300
+    timesteps = 96
+    stations = 40
+    nan_density = 0.0
+    backend = 'memory'
+    latency = 0.0
+    output = RESULTS_DIR
+
+    try:
+        opts, args = getopt.getopt(argv, "hv:e:t:s:n:b:l:o:",
+                ["help", "version=", "elements=", "timesteps=", "stations=", "nan_density=", "backend=", "latency=",
+                 "output="])
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            usage()
+            sys.exit()
+        elif opt in ("-v", "--version"):
+            version = int(arg)
+        elif opt in ("-e", "--elements"):
+            elements = int(arg)
+        elif opt in ("-t", "--timesteps"):
+            timesteps = int(arg)
+        elif opt in ("-s", "--stations"):
+            stations = int(arg)
+        elif opt in ("-n", "--nan_density"):
+            nan_density = float(arg)
+        elif opt in ("-b", "--backend"):
+            backend = arg.strip()
+        elif opt in ("-l", "--latency"):
+            latency = float(arg)
+        elif opt in ("-o", "--output"):
+            output = arg.strip()
+
+    parameters = {'version': version, 'elements': elements, 'timesteps': timesteps, 'stations': stations,
+                  'nan_density': nan_density, 'backend': backend, 'latency': latency}
+
+    work_dir = tempfile.mkdtemp(prefix='flo2d_benchmark_')
+    try:
+        output_dir, db_args, sizes = prepare_workspace(work_dir, version, elements, timesteps, stations, nan_density)
+        db_args += (backend, {'latency': latency})
+        stages = {}
+        for name, stage in STAGES:
+            stages[name] = run_stage(stage, output_dir, db_args)
+            if 'error' in stages[name]:
+                print('{:<20} failed: {}'.format(name, stages[name]['error']))
+                continue
+            print('{:<20} {:>8.3f}s {:>10} MB/s {:>12} rows/s {:>8.1f} MB peak RSS'.format(
+                    name, stages[name]['seconds'],
+                    '-' if stages[name]['mb_per_s'] is None else '%.2f' % stages[name]['mb_per_s'],
+                    '-' if stages[name]['rows_per_s'] is None else '%.0f' % stages[name]['rows_per_s'],
+                    stages[name]['peak_rss_mb']))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    commit = git_commit()
+    results = {
+            'commit'    : commit,
+            'created'   : datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'python'    : platform.python_version(),
+            'parameters': parameters,
+            'files'     : sizes,
+            'stages'    : stages
+            }
+    if not os.path.isdir(output):
+        os.makedirs(output)
+    results_path = os.path.join(output, '{}_{}.json'.format(datetime.now().strftime('%Y%m%d_%H%M%S'), commit))
+    with open(results_path, 'w') as f:
+        f.write(json.dumps(results, indent=2))
+    print('Results written to', results_path)
+
+
+if __name__=="__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,68 @@
+"""
+Stand-in for the curw_fcst calls made by the extract scripts.
+
+install() swaps the db_adapter metadata lookups of the extraction engine for in-process versions and
+points its timeseries writes at an offline backend (flo2d.backends memory or sqlite), counting the
+round trips and the time spent in them, so a benchmark measures parsing and not the network.
+"""
+import json
+import time
+
+from flo2d.backends import get_backend
+
+# Backend methods that are a round trip to the database
+ROUND_TRIPS = ('get_timeseries_id_if_exists', 'insert_run', 'update_start_date', 'update_latest_fgt', 'insert_data')
+
+
+class StandInDatabase(object):
+
+    def __init__(self, channel_cell_map, flood_plain_cell_map, stations, backend='memory', backend_options=None):
+        """
+        :param channel_cell_map: CHANNEL_CELL_MAP of the stand-in FLO2D source
+        :param flood_plain_cell_map: FLOOD_PLAIN_CELL_MAP of the stand-in FLO2D source
+        :param stations: dict of element number -> [station_id, latitude, longitude]
+        :param backend: offline timeseries backend, 'memory' or 'sqlite'
+        :param backend_options: backend keyword arguments, e.g. {'latency': 0.005}
+        """
+        self.source_parameters = json.dumps({
+                'CHANNEL_CELL_MAP'    : channel_cell_map,
+                'FLOOD_PLAIN_CELL_MAP': flood_plain_cell_map
+                })
+        self.stations = stations
+        self.backend = get_backend(backend, None, backend_options)
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows_written = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.backend, name)
+        if name not in ROUND_TRIPS:
+            return attr
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - start
+                self.calls += 1
+                if name=='insert_data':
+                    self.rows_written += len(kwargs['timeseries'] if 'timeseries' in kwargs else args[0])
+
+        return call
+
+
+def install(module, db):
+    """
+    Point the curw_fcst calls of the extraction engine at a stand-in database.
+    :param module: module making the calls, flo2d.engine
+    :param db: StandInDatabase instance
+    """
+    module.get_Pool = lambda **kwargs: db
+    module.destroy_Pool = lambda pool: None
+    module.get_source_parameters = lambda pool, model, version: pool.source_parameters
+    module.get_flo2d_output_stations = lambda pool, flo2d_model: pool.stations
+    module.get_source_id = lambda pool, model, version: 1
+    module.get_variable_id = lambda pool, variable: 1
+    module.get_unit_id = lambda pool, unit, unit_type: 1
+    module.get_backend = lambda name, pool, options=None: pool
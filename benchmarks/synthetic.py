@@ -0,0 +1,85 @@
+"""
+Generators for synthetic FLO2D HYCHAN.OUT and TIMDEP.OUT files.
+
+The files follow the layout the extract scripts parse, at a configurable size, so parse and push
+performance can be measured without real model output.
+"""
+import numpy as np
+
+from flo2d.flood_map import read_grid
+
+HYCHAN_COLUMNS = 'TIME       ELEV      DEPTH   VELOCITY  DISCHARGE     FROUDE'
+
+
+def _format_rows(values, fmt):
+    # np.savetxt style formatting, with FLO2D's spelling of missing values
+    return ''.join(fmt % tuple(row) for row in values).replace('nan', 'NaN')
+
+
+def _add_missing(values, nan_density, random):
+    if nan_density > 0:
+        values[random.random_sample(values.shape) < nan_density] = np.nan
+    return values
+
+
+def generate_hychan(file_path, elements, timesteps, interval=0.25, nan_density=0.0, seed=0):
+    """
+    Write a synthetic HYCHAN.OUT file.
+    :param file_path: output file path
+    :param elements: channel element numbers to write hydrographs for
+    :param timesteps: number of output timesteps per hydrograph
+    :param interval: output interval in hours
+    :param nan_density: fraction of values written as NaN
+    :param seed: random seed
+    :return: size of the written file in bytes
+    """
+    random = np.random.RandomState(seed)
+    times = interval * np.arange(1, timesteps + 1)
+    size = 0
+    with open(file_path, 'w') as outfile:
+        for element in elements:
+            bed = random.uniform(0.0, 5.0)
+            depth = np.abs(np.cumsum(random.normal(0.0, 0.05, timesteps))) + 0.5
+            velocity = random.uniform(0.1, 2.0, timesteps)
+            discharge = depth * velocity * random.uniform(5.0, 50.0)
+            froude = velocity / np.sqrt(9.81 * depth)
+            values = np.column_stack((times, bed + depth, depth, velocity, discharge, froude))
+            values[:, 1:] = _add_missing(values[:, 1:], nan_density, random)
+
+            text = '     CHANNEL HYDROGRAPH FOR ELEMENT NO: {:>8}\n\n    {}\n\n'.format(element, HYCHAN_COLUMNS)
+            text += _format_rows(values, '%10.2f %10.3f %10.3f %10.3f %10.3f %10.3f\n') + '\n'
+            outfile.write(text)
+            size += len(text)
+    return size
+
+
+def generate_timdep(file_path, grid_csv_path, timesteps, interval=0.25, nan_density=0.0, seed=0):
+    """
+    Write a synthetic TIMDEP.OUT file covering every cell of a model grid.
+    :param file_path: output file path
+    :param grid_csv_path: model grid CSV (flo2d_250m.csv / flo2d_150m.csv)
+    :param timesteps: number of output timesteps
+    :param interval: output interval in hours
+    :param nan_density: fraction of depths written as NaN
+    :param seed: random seed
+    :return: size of the written file in bytes
+    """
+    random = np.random.RandomState(seed)
+    grid_ids = read_grid(grid_csv_path)[0]
+    ground = random.uniform(0.0, 10.0, len(grid_ids))
+    depth = np.zeros(len(grid_ids))
+    size = 0
+    with open(file_path, 'w') as outfile:
+        for step in range(1, timesteps + 1):
+            depth = np.maximum(depth + random.normal(0.0, 0.02, len(grid_ids)), 0.0)
+            velocity_x = random.normal(0.0, 0.2, len(grid_ids))
+            velocity_y = random.normal(0.0, 0.2, len(grid_ids))
+            velocity = np.hypot(velocity_x, velocity_y)
+            values = np.column_stack((grid_ids, depth, velocity_x, velocity_y, velocity, ground + depth))
+            values[:, 1:2] = _add_missing(values[:, 1:2].copy(), nan_density, random)
+
+            text = '{:>12.2f}\n'.format(step * interval)
+            text += _format_rows(values, '%8d %10.3f %10.3f %10.3f %10.3f %10.3f\n')
+            outfile.write(text)
+            size += len(text)
+    return size
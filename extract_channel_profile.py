@@ -0,0 +1,92 @@
+import traceback
+import sys
+import os
+import getopt
+from datetime import datetime
+
+from logger import logger
+from flo2d.config import load_config, read_attribute_from_config_file
+from flo2d.channel_profile import ChannelProfile, PROFILE_VARIABLES
+from flo2d.hychan import iter_hydrographs, HYCHAN_ELEVATION_COLUMN
+
+
+def usage():
+    usageText = """
+    Usage: python extract_channel_profile.py [-d output_dir] [-s 2019-05-24] [-t 00:00:00] [-c 1] [-o channel_profile.nc]
+
+    Writes one column of every hydrograph of HYCHAN.OUT, i.e. the whole channel network, to a NetCDF
+    file as an (element x time) float32 matrix, with the maximum and time of maximum of each element.
+    Defaults are read from config.json.
+
+    -h  --help            Show usage
+    -d  --dir             FLO2D output directory (default: output_dir of config.json).
+    -s  --ts_start_date   Date of model time 0, YYYY-MM-DD (default: ts_start_date of config.json).
+    -t  --ts_start_time   Time of model time 0, HH:MM:SS (default: ts_start_time of config.json).
+    -c  --column          HYCHAN.OUT column: 1 water surface elevation, 2 depth, 3 velocity, 4 discharge
+                          (default: 1).
+    -o  --output          NetCDF file, relative to the output directory (default: channel_profile.nc).
+    -n  --chunk_elements  Elements held in memory before they are written (default: 512).
+    """
+    print(usageText)
+
+
+if __name__=="__main__":
+
+    try:
+
+        config = load_config('config.json')
+        output_dir = read_attribute_from_config_file('output_dir', config, False)
+        ts_start_date = read_attribute_from_config_file('ts_start_date', config, False)
+        ts_start_time = read_attribute_from_config_file('ts_start_time', config, False)
+        hychan_out_file = read_attribute_from_config_file('HYCHAN_OUT_FILE', config, False) or 'HYCHAN.OUT'
+        column = HYCHAN_ELEVATION_COLUMN
+        output = 'channel_profile.nc'
+        chunk_elements = 512
+
+        try:
+            opts, args = getopt.getopt(sys.argv[1:], "hd:s:t:c:o:n:",
+                                       ["help", "dir=", "ts_start_date=", "ts_start_time=", "column=", "output=",
+                                        "chunk_elements="])
+        except getopt.GetoptError:
+            usage()
+            sys.exit(2)
+        for opt, arg in opts:
+            if opt in ("-h", "--help"):
+                usage()
+                sys.exit()
+            elif opt in ("-d", "--dir"):
+                output_dir = arg.strip()
+            elif opt in ("-s", "--ts_start_date"):
+                ts_start_date = arg.strip()
+            elif opt in ("-t", "--ts_start_time"):
+                ts_start_time = arg.strip()
+            elif opt in ("-c", "--column"):
+                column = int(arg.strip())
+            elif opt in ("-o", "--output"):
+                output = arg.strip()
+            elif opt in ("-n", "--chunk_elements"):
+                chunk_elements = int(arg.strip())
+
+        if output_dir is None or ts_start_date is None or ts_start_time is None:
+            usage()
+            sys.exit(2)
+
+        base_time = datetime.strptime('%s %s' % (ts_start_date, ts_start_time), '%Y-%m-%d %H:%M:%S')
+        profile = ChannelProfile(os.path.join(output_dir, output), base_time, column, chunk_elements)
+        complete = False
+        try:
+            with open(os.path.join(output_dir, hychan_out_file)) as infile:
+                for element, rows in iter_hydrographs(infile):
+                    profile.add(element, rows)
+            complete = True
+        finally:
+            profile.close(complete)
+
+        print("Written {} of {} elements to {}".format(PROFILE_VARIABLES[column][0], profile.elements_written,
+                profile.path))
+
+    except Exception:
+        logger.info("Channel profile extraction failed.")
+        traceback.print_exc()
+    finally:
+        logger.info("Channel profile extraction finished.")
@@ -0,0 +1,179 @@
+"""
+Flood alert thresholds of the FLO2D output stations, and the channels alerts are emitted to.
+
+Thresholds are defined per element alongside the cell maps of the model parameters (flo2d_250.json,
+flo2d_150.json), e.g.
+
+    "ALERT_THRESHOLDS": {
+      "179": {"alert": 1.2, "minor": 1.5, "major": 2.0}
+    }
+
+and can be overridden by an ALERT_THRESHOLDS of the same layout in the run config. A level is
+crossed at the first time the forecast reaches its threshold.
+
+Channels have an emit(alert) and a close() method. Webhooks are posted from a thread of their own,
+so a slow endpoint never holds up the parsing of the FLO2D outputs.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from queue import Queue
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Alert levels, least severe first
+LEVELS = ('alert', 'minor', 'major')
+
+
+def read_thresholds(*threshold_maps):
+    """
+    :param threshold_maps: ALERT_THRESHOLDS dicts of element -> {level: threshold}, later ones
+    taking precedence per element
+    :return: dict of element -> (level name array, threshold array), least severe first
+    """
+    thresholds = {}
+    for threshold_map in threshold_maps:
+        for element, levels in (threshold_map or {}).items():
+            unknown = set(levels) - set(LEVELS)
+            if unknown:
+                raise ValueError("Unknown alert levels {} of element {}. Should be {}".format(', '.join(sorted(unknown)),
+                        element, ', '.join(LEVELS)))
+            names = [level for level in LEVELS if levels.get(level) is not None]
+            thresholds[str(element)] = (np.array(names), np.array([float(levels[level]) for level in names]))
+    return thresholds
+
+
+def first_crossings(values, thresholds):
+    """
+    :param values: value array of a series
+    :param thresholds: threshold array
+    :return: (index of the first value reaching each threshold, mask of the thresholds reached)
+    """
+    reached = values[np.newaxis, :] >= thresholds[:, np.newaxis]
+    return reached.argmax(axis=1), reached.any(axis=1)
+
+
+class FileAlerts(object):
+    """
+    Appends alerts to a JSON lines file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def emit(self, alert):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(alert) + '\n')
+
+    def close(self):
+        pass
+
+
+class StreamAlerts(object):
+    """
+    Writes alerts to a stream as JSON lines, stdout by default.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def emit(self, alert):
+        stream = self.stream or sys.stdout
+        stream.write(json.dumps(alert) + '\n')
+        stream.flush()
+
+    def close(self):
+        pass
+
+
+class WebhookAlerts(object):
+    """
+    POSTs each alert as JSON to a URL. Alerts are queued and posted in order by a worker thread,
+    started with the first alert; close() waits for the queue to drain for up to close_timeout
+    seconds, the alerts still queued then are dropped and logged.
+    """
+
+    def __init__(self, url, timeout=5.0, headers=None, close_timeout=30.0):
+        """
+        :param url: webhook URL
+        :param timeout: seconds to wait on the webhook, per alert
+        :param headers: extra HTTP headers, e.g. an authorization header
+        :param close_timeout: seconds close() waits for the queued alerts to be posted
+        """
+        self.url = url
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.close_timeout = close_timeout
+        self.queue = Queue()
+        self.worker = None
+        self.posted = 0
+        self.failed = 0
+
+    def emit(self, alert):
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._run, name='alert-webhook', daemon=True)
+            self.worker.start()
+        self.queue.put(alert)
+
+    def post(self, alert):
+        from urllib.request import Request, urlopen
+
+        headers = dict(self.headers)
+        headers['Content-Type'] = 'application/json'
+        request = Request(self.url, data=json.dumps(alert).encode(), headers=headers, method='POST')
+        with urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def _run(self):
+        while True:
+            alert = self.queue.get()
+            if alert is None:
+                return
+            try:
+                self.post(alert)
+                self.posted += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Exception occurred while posting an alert to {}".format(self.url),
+                        extra={'event': 'alert_emit_failed', 'channel': 'webhook'})
+
+    def close(self):
+        if self.worker is None:
+            return
+        self.queue.put(None)
+        self.worker.join(self.close_timeout)
+        if self.worker.is_alive():
+            logger.warning("Gave up on {} alerts still queued for {}".format(self.queue.qsize() - 1, self.url),
+                    extra={'event': 'alert_emit_failed', 'channel': 'webhook', 'dropped': self.queue.qsize() - 1})
+        self.worker = None
+
+
+ALERT_CHANNELS = {
+        'file'   : FileAlerts,
+        'stdout' : StreamAlerts,
+        'webhook': WebhookAlerts
+        }
+
+
+def get_alert_channels(specs, output_dir):
+    """
+    :param specs: list of dicts of the channel type and its keyword arguments, e.g.
+    [{"type": "file", "path": "alerts.jsonl"}, {"type": "webhook", "url": "http://localhost:8080/alerts"}]
+    :param output_dir: directory relative file paths are resolved against, the FLO2D output directory
+    :return: OrderedDict of channel type -> channel
+    """
+    channels = OrderedDict()
+    for spec in specs:
+        options = dict(spec)
+        name = options.pop('type', None)
+        if name not in ALERT_CHANNELS:
+            raise ValueError("Unknown alert channel {}. Should be one of {}".format(name, ', '.join(ALERT_CHANNELS)))
+        if 'path' in options:
+            options['path'] = os.path.join(output_dir, options['path'])
+        channels[name] = ALERT_CHANNELS[name](**options)
+    return channels
@@ -0,0 +1,26 @@
+from .base import TimeseriesBackend
+from .curw_fcst import CurwFcstBackend
+from .memory import MemoryBackend
+from .sqlite import SqliteBackend
+
+BACKENDS = {
+        'curw_fcst': CurwFcstBackend,
+        'memory'   : MemoryBackend,
+        'sqlite'   : SqliteBackend
+        }
+
+
+def get_backend(name, pool, options=None):
+    """
+    Create the timeseries backend of the given name.
+    :param name: 'curw_fcst', 'memory' or 'sqlite'
+    :param pool: curw_fcst connection pool, only used by the curw_fcst backend
+    :param options: dict of backend keyword arguments, e.g. {'latency': 0.005, 'path': 'fcst.db'}
+    :return: TimeseriesBackend instance
+    """
+    if name not in BACKENDS:
+        raise ValueError("Unknown timeseries backend {}. Should be one of {}".format(name, ', '.join(BACKENDS)))
+    options = options or {}
+    if name=='curw_fcst':
+        return CurwFcstBackend(pool=pool, **options)
+    return BACKENDS[name](**options)
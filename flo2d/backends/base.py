@@ -0,0 +1,60 @@
+import hashlib
+import json
+import time
+
+# Metadata fields identifying a curw_fcst timeseries (run table row)
+TMS_ID_FIELDS = ('sim_tag', 'latitude', 'longitude', 'model', 'version', 'variable', 'unit', 'unit_type')
+RUN_KEY_FIELDS = ('sim_tag', 'source_id', 'station_id', 'variable_id', 'unit_id')
+
+
+class TimeseriesBackend(object):
+    """
+    Storage behind the curw_fcst Timeseries calls made by save_forecast_timeseries_to_db.
+
+    Offline backends add `latency` seconds per round trip and `row_latency` seconds per data row
+    written, so batching and concurrency changes can be compared under a realistic link.
+    """
+
+    def __init__(self, latency=0.0, row_latency=0.0):
+        self.latency = latency
+        self.row_latency = row_latency
+
+    def _round_trip(self, rows=0):
+        delay = self.latency + rows * self.row_latency
+        if delay > 0:
+            time.sleep(delay)
+
+    @staticmethod
+    def run_key(meta_data):
+        return tuple(meta_data[field] for field in RUN_KEY_FIELDS)
+
+    def generate_timeseries_id(self, meta_data):
+        """
+        Generate the tms_id of a timeseries the way curw_fcst does: sha256 of the identifying metadata.
+        :param meta_data: dict holding the TMS_ID_FIELDS keys
+        :return: 64 character hex string
+        """
+        hash_data = {field: meta_data[field] for field in TMS_ID_FIELDS}
+        return hashlib.sha256(json.dumps(hash_data, sort_keys=True).encode("ascii")).hexdigest()
+
+    def get_timeseries_id_if_exists(self, meta_data):
+        raise NotImplementedError
+
+    def insert_run(self, run_meta):
+        raise NotImplementedError
+
+    def update_start_date(self, id_, start_date):
+        raise NotImplementedError
+
+    def update_latest_fgt(self, id_, fgt):
+        raise NotImplementedError
+
+    def insert_data(self, timeseries, tms_id, fgt, upsert=False):
+        """
+        :param timeseries: list of [time, value] rows
+        :param tms_id: timeseries id
+        :param fgt: forecast generated time
+        :param upsert: replace the values of existing (tms_id, time, fgt) rows instead of failing
+        :return: number of rows written
+        """
+        raise NotImplementedError
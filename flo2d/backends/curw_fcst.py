@@ -0,0 +1,30 @@
+from .base import TimeseriesBackend
+
+
+class CurwFcstBackend(TimeseriesBackend):
+    """
+    The curw_fcst MySQL database, through db_adapter's Timeseries.
+    """
+
+    def __init__(self, pool):
+        super(CurwFcstBackend, self).__init__()
+        from db_adapter.curw_fcst.timeseries import Timeseries
+        self.TS = Timeseries(pool=pool)
+
+    def generate_timeseries_id(self, meta_data):
+        return self.TS.generate_timeseries_id(meta_data=meta_data)
+
+    def get_timeseries_id_if_exists(self, meta_data):
+        return self.TS.get_timeseries_id_if_exists(meta_data=meta_data)
+
+    def insert_run(self, run_meta):
+        return self.TS.insert_run(run_meta=run_meta)
+
+    def update_start_date(self, id_, start_date):
+        return self.TS.update_start_date(id_=id_, start_date=start_date)
+
+    def update_latest_fgt(self, id_, fgt):
+        return self.TS.update_latest_fgt(id_=id_, fgt=fgt)
+
+    def insert_data(self, timeseries, tms_id, fgt, upsert=False):
+        return self.TS.insert_data(timeseries=timeseries, tms_id=tms_id, fgt=fgt, upsert=upsert)
@@ -0,0 +1,51 @@
+import threading
+
+from .base import TimeseriesBackend
+
+
+class MemoryBackend(TimeseriesBackend):
+    """
+    Pure in-memory stand-in for the curw_fcst run and data tables.
+    """
+
+    def __init__(self, latency=0.0, row_latency=0.0):
+        super(MemoryBackend, self).__init__(latency=latency, row_latency=row_latency)
+        self.lock = threading.Lock()
+        # tms_id -> run row, run key -> tms_id
+        self.runs = {}
+        self.run_ids = {}
+        # (tms_id, time, fgt) -> value
+        self.data = {}
+
+    def get_timeseries_id_if_exists(self, meta_data):
+        self._round_trip()
+        with self.lock:
+            return self.run_ids.get(self.run_key(meta_data))
+
+    def insert_run(self, run_meta):
+        self._round_trip()
+        with self.lock:
+            if run_meta['tms_id'] in self.runs:
+                raise ValueError("Duplicate entry {} for run".format(run_meta['tms_id']))
+            self.runs[run_meta['tms_id']] = {'id': run_meta['tms_id'], 'start_date': None, 'latest_fgt': None}
+            self.run_ids[self.run_key(run_meta)] = run_meta['tms_id']
+
+    def update_start_date(self, id_, start_date):
+        self._round_trip()
+        with self.lock:
+            self.runs[id_]['start_date'] = start_date
+
+    def update_latest_fgt(self, id_, fgt):
+        self._round_trip()
+        with self.lock:
+            self.runs[id_]['latest_fgt'] = fgt
+
+    def insert_data(self, timeseries, tms_id, fgt, upsert=False):
+        self._round_trip(len(timeseries))
+        with self.lock:
+            for date_time, value in timeseries:
+                key = (tms_id, str(date_time), str(fgt))
+                if not upsert and key in self.data:
+                    raise ValueError("Duplicate entry {} for data".format(key))
+                self.data[key] = float(value)
+        return len(timeseries)
@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+
+from .base import TimeseriesBackend
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS run (
+    id VARCHAR(64) NOT NULL PRIMARY KEY,
+    sim_tag VARCHAR(100) NOT NULL,
+    station INTEGER NOT NULL,
+    source INTEGER NOT NULL,
+    variable INTEGER NOT NULL,
+    unit INTEGER NOT NULL,
+    start_date DATETIME,
+    end_date DATETIME,
+    latest_fgt DATETIME,
+    UNIQUE (sim_tag, source, station, variable, unit)
+);
+CREATE TABLE IF NOT EXISTS data (
+    id VARCHAR(64) NOT NULL,
+    time DATETIME NOT NULL,
+    fgt DATETIME NOT NULL,
+    value DECIMAL(8,3) NOT NULL,
+    PRIMARY KEY (id, time, fgt)
+);
+"""
+
+
+class SqliteBackend(TimeseriesBackend):
+    """
+    SQLite copy of the curw_fcst run and data tables.
+    """
+
+    def __init__(self, path=':memory:', latency=0.0, row_latency=0.0):
+        """
+        :param path: SQLite database file, kept in memory by default
+        """
+        super(SqliteBackend, self).__init__(latency=latency, row_latency=row_latency)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+    def _execute(self, sql, args=(), rows=0):
+        self._round_trip(rows)
+        with self.lock, self.connection:
+            return self.connection.execute(sql, args).fetchone()
+
+    def get_timeseries_id_if_exists(self, meta_data):
+        row = self._execute("SELECT id FROM run WHERE sim_tag=? AND source=? AND station=? AND variable=? AND unit=?",
+                self.run_key(meta_data))
+        return None if row is None else row[0]
+
+    def insert_run(self, run_meta):
+        self._execute("INSERT INTO run (id, sim_tag, source, station, variable, unit) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_meta['tms_id'],) + self.run_key(run_meta))
+
+    def update_start_date(self, id_, start_date):
+        self._execute("UPDATE run SET start_date=? WHERE id=?", (start_date, id_))
+
+    def update_latest_fgt(self, id_, fgt):
+        self._execute("UPDATE run SET latest_fgt=? WHERE id=?", (fgt, id_))
+
+    def insert_data(self, timeseries, tms_id, fgt, upsert=False):
+        sql = "INSERT INTO data (id, time, fgt, value) VALUES (?, ?, ?, ?)"
+        if upsert:
+            sql += " ON CONFLICT (id, time, fgt) DO UPDATE SET value=excluded.value"
+        self._round_trip(len(timeseries))
+        with self.lock, self.connection:
+            self.connection.executemany(sql,
+                    [(tms_id, str(date_time), str(fgt), float(value)) for date_time, value in timeseries])
+        return len(timeseries)
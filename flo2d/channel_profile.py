@@ -0,0 +1,180 @@
+"""
+Longitudinal profile of the whole channel network from FLO2D HYCHAN.OUT: one column of every
+hydrograph, e.g. the water surface elevation, as a dense (element x time) float32 matrix with the
+maximum and time of maximum of each element.
+
+The hydrographs are read in the single pass over HYCHAN.OUT and written to a NetCDF file in
+chunks of elements, so memory is bounded by one chunk whatever the size of the network.
+"""
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from .hychan import HYCHAN_TIME_COLUMN, HYCHAN_ELEVATION_COLUMN, HYCHAN_DEPTH_COLUMN, HYCHAN_VELOCITY_COLUMN, \
+    HYCHAN_DISCHARGE_COLUMN
+
+logger = logging.getLogger(__name__)
+
+FILL_VALUE = -9999.0
+
+# Column -> (NetCDF variable, units, long name)
+PROFILE_VARIABLES = {
+        HYCHAN_ELEVATION_COLUMN: ('water_surface_elevation', 'm', 'Channel water surface elevation'),
+        HYCHAN_DEPTH_COLUMN    : ('depth', 'm', 'Channel flow depth'),
+        HYCHAN_VELOCITY_COLUMN : ('velocity', 'm/s', 'Channel flow velocity'),
+        HYCHAN_DISCHARGE_COLUMN: ('discharge', 'm3/s', 'Channel discharge')
+        }
+
+
+def hydrograph_column(rows, column):
+    """
+    :param rows: split hydrograph rows, as yielded by flo2d.hychan.iter_hydrographs()
+    :param column: column position, e.g. HYCHAN_ELEVATION_COLUMN
+    :return: (model time array, value array), NaN for the missing and non numeric values
+    """
+    times = np.array([v[HYCHAN_TIME_COLUMN] for v in rows], dtype=np.float64)
+    values = [v[column] if len(v) > column else 'NaN' for v in rows]
+    try:
+        return times, np.array(values, dtype=np.float64)
+    except ValueError:
+        return times, np.array([_to_float(value) for value in values])
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+class ChannelProfile(object):
+    """
+    Writes the hydrographs of a HYCHAN.OUT file to a NetCDF file, a chunk of elements at a time.
+    Needs netCDF4.
+
+    The time axis is the output times of the first hydrograph; the values of a later hydrograph
+    at other times are dropped and counted in times_dropped.
+
+    The file is written to a temporary file next to path, which only replaces path once the profile
+    is closed complete; an incomplete profile leaves no file behind.
+    """
+
+    def __init__(self, path, base_time, column=HYCHAN_ELEVATION_COLUMN, chunk_elements=512):
+        """
+        :param path: NetCDF file, replaced once complete
+        :param base_time: datetime of model time 0
+        :param column: HYCHAN.OUT column of the profile
+        :param chunk_elements: elements held in memory before they are written
+        """
+        if column not in PROFILE_VARIABLES:
+            raise ValueError("Unknown HYCHAN.OUT column {}. Should be one of {}".format(column,
+                    ', '.join(str(column) for column in sorted(PROFILE_VARIABLES))))
+        self.path = path
+        self.base_time = base_time
+        self.column = column
+        self.chunk_elements = int(chunk_elements)
+        self.times = None
+        self.elements_written = 0
+        self.times_dropped = 0
+        self._nc = None
+        self._tmp_path = None
+        self._elements = []
+        self._chunk = None
+
+    def _open(self, times):
+        from netCDF4 import Dataset
+
+        self.times = times
+        name, units, long_name = PROFILE_VARIABLES[self.column]
+        fd, self._tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.path) + '.', suffix='.tmp',
+                dir=os.path.dirname(os.path.abspath(self.path)))
+        os.close(fd)
+        nc = Dataset(self._tmp_path, 'w', format='NETCDF4')
+        nc.createDimension('element', None)
+        nc.createDimension('time', len(times))
+        time_var = nc.createVariable('time', 'f8', ('time',))
+        time_var.units = 'hours since {}'.format(self.base_time.strftime('%Y-%m-%d %H:%M:%S'))
+        time_var[:] = times
+        nc.createVariable('element', 'i4', ('element',))
+        # One NetCDF chunk per chunk of elements written
+        profile = nc.createVariable(name, 'f4', ('element', 'time'), fill_value=FILL_VALUE, zlib=True,
+                chunksizes=(self.chunk_elements, len(times)))
+        profile.units = units
+        profile.long_name = long_name
+        maximum = nc.createVariable('max_' + name, 'f4', ('element',), fill_value=FILL_VALUE)
+        maximum.units = units
+        maximum.long_name = 'Maximum {}'.format(long_name.lower())
+        time_of_max = nc.createVariable('time_of_max_' + name, 'f8', ('element',), fill_value=FILL_VALUE)
+        time_of_max.units = time_var.units
+        time_of_max.long_name = 'Time of maximum {}'.format(long_name.lower())
+        nc.hychan_column = self.column
+        self._nc = nc
+        self._chunk = np.full((self.chunk_elements, len(times)), np.nan, dtype=np.float32)
+
+    def add(self, element, rows):
+        """
+        Add the hydrograph of an element.
+        :param element: element number
+        :param rows: split hydrograph rows, as yielded by flo2d.hychan.iter_hydrographs()
+        """
+        times, values = hydrograph_column(rows, self.column)
+        if self._nc is None:
+            self._open(times)
+        row = self._chunk[len(self._elements)]
+        if len(times)==len(self.times) and np.array_equal(times, self.times):
+            row[:] = values
+        else:
+            row[:] = np.nan
+            positions = np.clip(np.searchsorted(self.times, times), 0, len(self.times) - 1)
+            on_axis = self.times[positions]==times
+            row[positions[on_axis]] = values[on_axis]
+            self.times_dropped += int(np.count_nonzero(~on_axis))
+        self._elements.append(int(element))
+        if len(self._elements)==self.chunk_elements:
+            self._flush()
+
+    def _flush(self):
+        count = len(self._elements)
+        if not count:
+            return
+        chunk = self._chunk[:count]
+        has_value = ~np.isnan(chunk).all(axis=1)
+        peak = np.argmax(np.where(np.isnan(chunk), -np.inf, chunk), axis=1)
+        maximum = np.where(has_value, chunk[np.arange(count), peak], FILL_VALUE)
+        time_of_max = np.where(has_value, self.times[peak], FILL_VALUE)
+
+        name = PROFILE_VARIABLES[self.column][0]
+        start, end = self.elements_written, self.elements_written + count
+        self._nc.variables['element'][start:end] = self._elements
+        self._nc.variables[name][start:end, :] = np.where(np.isnan(chunk), FILL_VALUE, chunk)
+        self._nc.variables['max_' + name][start:end] = maximum
+        self._nc.variables['time_of_max_' + name][start:end] = time_of_max
+        self.elements_written = end
+        self._elements = []
+
+    def close(self, complete=True):
+        """
+        Write the elements still held and close the file.
+        :param complete: whether every hydrograph was added; if not, or if writing fails, the file is removed
+        and path left as it was
+        """
+        if self._nc is None:
+            return
+        try:
+            try:
+                if complete:
+                    self._flush()
+            finally:
+                self._nc.close()
+                self._nc = None
+            if complete:
+                os.chmod(self._tmp_path, 0o644)
+                os.replace(self._tmp_path, self.path)
+        finally:
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+        if self.times_dropped:
+            logger.warning("Dropped {} values of the channel profile off the time axis".format(self.times_dropped),
+                    extra={'event': 'channel_profile_times_dropped', 'values': self.times_dropped})
@@ -0,0 +1,33 @@
+"""
+Loading of the JSON run configs (config.json, dis_config.json).
+"""
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def load_config(config_path):
+    """
+    :param config_path: path of the JSON config file
+    :return: loaded config dict
+    """
+    with open(config_path) as f:
+        return json.loads(f.read())
+
+
+def read_attribute_from_config_file(attribute, config, compulsory):
+    """
+    :param attribute: key name of the config json file
+    :param config: loaded json file
+    :param compulsory: Boolean value: whether the attribute is must present or not in the config file
+    :return:
+    """
+    if attribute in config and (config[attribute]!=""):
+        return config[attribute]
+    elif compulsory:
+        logger.error("{} not specified in config file.".format(attribute))
+        exit(1)
+    else:
+        logger.info("{} not specified in config file.".format(attribute))
+        return None
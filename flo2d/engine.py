@@ -0,0 +1,660 @@
+"""
+FLO2D extraction engine: reads the HYCHAN.OUT and TIMDEP.OUT outputs of a FLO2D run and pushes the
+series of the configured variables to the timeseries backend.
+
+The extract scripts are thin entry points over extract_and_upload(); they only decide which config
+to load, the run date and time, and the database to write to.
+"""
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from db_adapter.constants import CURW_FCST_DATABASE, CURW_FCST_PASSWORD, CURW_FCST_USERNAME, CURW_FCST_PORT, \
+    CURW_FCST_HOST
+from db_adapter.base import get_Pool, destroy_Pool
+from db_adapter.curw_fcst.source import get_source_id, get_source_parameters
+from db_adapter.curw_fcst.variable import get_variable_id
+from db_adapter.curw_fcst.unit import get_unit_id, UnitType
+from db_adapter.curw_fcst.station import get_flo2d_output_stations, StationEnum
+
+from logger import logger
+from .alerts import read_thresholds, get_alert_channels
+from .backends import get_backend
+from .config import load_config, read_attribute_from_config_file
+from .channel_profile import ChannelProfile
+from .flood_map import read_grid, parse_timdep_block, FloodMap, write_flood_map_netcdf
+from .inundation import InundationExtent, DEFAULT_THRESHOLDS, write_inundation_csv
+from .polygons import load_membership, PolygonDepths, write_polygon_depths_csv
+from .hychan import iter_hydrographs, hydrograph_series, HYCHAN_ELEVATION_COLUMN, HYCHAN_DISCHARGE_COLUMN, \
+    HYCHAN_PARSE_STAGE
+from .instrumentation import RunMetrics
+from .journal import RunJournal, run_key_for, output_stamp, DEFAULT_MAX_AGE_HOURS
+from .prometheus import export_run_metrics
+from .resample import Resampler
+from .series_buffer import SeriesBuffer, window_size_for, DEFAULT_MEMORY_LIMIT_MB
+from .sinks import get_sinks, AlertSink, FanOut
+from .timdep import iter_timdep_blocks, TimdepRowIndex, TIMDEP_ELEVATION_COLUMN, TIMDEP_PARSE_STAGE
+from .timeseries import getUTCOffset, StepTimes, DATE_TIME_FORMAT, MISSING_VALUE
+from .writer import save_forecast_timeseries_to_db
+
+# Column of each variable within the FLO2D output files, keyed by the config key naming the file.
+# Used to build the variable specs of a single variable config; files a variable is not listed
+# against are not read for it.
+VARIABLE_COLUMNS = {
+        'WaterLevel': {
+                'HYCHAN_OUT_FILE': HYCHAN_ELEVATION_COLUMN,
+                'TIMDEP_FILE'    : TIMDEP_ELEVATION_COLUMN
+                },
+        'Discharge' : {
+                'HYCHAN_OUT_FILE': HYCHAN_DISCHARGE_COLUMN
+                }
+        }
+
+# FLO2D output files the engine can read, by the config key naming them, and the FLO2D source
+# parameter holding the stations of each by default
+STATION_MAPS = {
+        'HYCHAN_OUT_FILE': 'CHANNEL_CELL_MAP',
+        'TIMDEP_FILE'    : 'FLOOD_PLAIN_CELL_MAP'
+        }
+
+SPEC_KEYS = ('variable', 'source_file', 'column', 'unit', 'unit_type')
+
+CURW_FCST_DB = {
+        'host'    : CURW_FCST_HOST,
+        'port'    : CURW_FCST_PORT,
+        'db'      : CURW_FCST_DATABASE,
+        'user'    : CURW_FCST_USERNAME,
+        'password': CURW_FCST_PASSWORD
+        }
+
+
+def read_variable_specs(config):
+    """
+    Variable specs of a config: the "variables" list if given, else a spec per output file of the
+    single "variable" / "unit" / "unit_type" of older configs.
+
+    "variables": [
+      {"variable": "WaterLevel", "source_file": "HYCHAN.OUT", "column": 1, "unit": "m",
+       "unit_type": "Instantaneous", "station_map": "CHANNEL_CELL_MAP"},
+      {"variable": "Discharge", "source_file": "HYCHAN.OUT", "column": 4, "unit": "m3/s",
+       "unit_type": "Instantaneous"}
+    ]
+
+    source_file has to be the HYCHAN_OUT_FILE or TIMDEP_FILE of the config. station_map is optional
+    and defaults to the station map of the source file (STATION_MAPS).
+
+    :param config: loaded config
+    :return: list of spec dicts with the keys of SPEC_KEYS, plus 'file_key' (config key of the source
+    file) and 'station_map'
+    """
+    files = {}
+    for file_key in STATION_MAPS:
+        if config.get(file_key):
+            files[config[file_key]] = file_key
+
+    specs = read_attribute_from_config_file('variables', config, False)
+    if specs is None:
+        variable = read_attribute_from_config_file('variable', config, True)
+        if variable not in VARIABLE_COLUMNS:
+            raise ValueError("Unsupported variable {}. Should be one of {}".format(variable,
+                    ', '.join(VARIABLE_COLUMNS)))
+        unit = read_attribute_from_config_file('unit', config, True)
+        unit_type = read_attribute_from_config_file('unit_type', config, True)
+        specs = []
+        for file_key, column in VARIABLE_COLUMNS[variable].items():
+            specs.append({
+                    'variable'   : variable,
+                    'source_file': read_attribute_from_config_file(file_key, config, True),
+                    'column'     : column,
+                    'unit'       : unit,
+                    'unit_type'  : unit_type
+                    })
+
+    variable_specs = []
+    for spec in specs:
+        missing = [key for key in SPEC_KEYS if key not in spec]
+        if missing:
+            raise ValueError("Variable spec {} is missing {}".format(spec, ', '.join(missing)))
+        if spec['source_file'] not in files:
+            raise ValueError("Source file {} of variable {} is neither the HYCHAN_OUT_FILE nor the TIMDEP_FILE "
+                             "of the config".format(spec['source_file'], spec['variable']))
+        spec = dict(spec, file_key=files[spec['source_file']], column=int(spec['column']))
+        spec.setdefault('station_map', STATION_MAPS[spec['file_key']])
+        variable_specs.append(spec)
+    return variable_specs
+
+
+@contextmanager
+def optional_output(name):
+    """
+    Guard the building, filling or writing of an optional output, e.g. the flood map: a failure is
+    logged and the output skipped, so the upload of the series never depends on it.
+    :param name: name of the output in the log
+    """
+    try:
+        yield
+    except Exception:
+        logger.exception("Exception occurred while producing the {}, it is skipped".format(name),
+                extra={'event': 'optional_output_failed', 'output': name})
+
+
+def forecast_generated_time():
+    """
+    :return: current Sri Lanka time, used as the forecast generated time (fgt) of a run
+    """
+    return (datetime.now() + timedelta(hours=5, minutes=30)).strftime(DATE_TIME_FORMAT)
+
+
+def extract_and_upload(config_path, dir_path, ts_start_date, ts_start_time, run_date, run_time, run_name,
+        overrides=None, db=None, fgt=None):
+    """
+    Extract the configured variables from the FLO2D outputs in dir_path and push them to the
+    timeseries backend, recording the run metrics. Each output file is read once, whatever the
+    number of variables taken from it.
+
+    Config.json
+    {
+      "HYCHAN_OUT_FILE": "HYCHAN.OUT",
+      "TIMDEP_FILE": "TIMDEP.OUT",
+      "FLOOD_MAP_FILE": "flood_map.nc",
+      "INUNDATION_EXTENT_FILE": "inundation_extent.csv",
+      "INUNDATION_THRESHOLDS": [0.1, 0.3, 0.5, 1.0],
+      "CHANNEL_PROFILE": {"path": "channel_profile.nc", "column": 1, "chunk_elements": 512},
+      "POLYGON_DEPTHS": {"polygons": "ds_divisions.geojson", "name_property": "name", "path": "polygon_depths.csv"},
+      "TIMDEP_MEMORY_LIMIT_MB": 64,
+
+      "utc_offset": "",
+
+      "sim_tag": "hourly_run",
+
+      "model": "FLO2D",
+      "version": "250",
+
+      "variables": [
+        {"variable": "WaterLevel", "source_file": "HYCHAN.OUT", "column": 1, "unit": "m",
+         "unit_type": "Instantaneous", "station_map": "CHANNEL_CELL_MAP"},
+        {"variable": "WaterLevel", "source_file": "TIMDEP.OUT", "column": 5, "unit": "m",
+         "unit_type": "Instantaneous", "station_map": "FLOOD_PLAIN_CELL_MAP"}
+      ],
+
+      "TIMESERIES_BACKEND": "curw_fcst",
+      "TIMESERIES_BACKEND_OPTIONS": {},
+
+      "SINKS": [
+        {"type": "curw_fcst", "retries": 3, "retry_delay": 0.5, "max_retry_delay": 10, "timeout": 30,
+         "breaker_threshold": 5, "breaker_reset": 60},
+        {"type": "csv", "path": "series.csv", "batch_size": 500, "retries": 2, "retry_delay": 1.0}
+      ],
+
+      "JOURNAL_FILE": "journal.db",
+      "JOURNAL_MAX_AGE_HOURS": 24,
+
+      "ALERTS": [{"type": "file", "path": "alerts.jsonl"}, {"type": "webhook", "url": "http://localhost:8080/alerts"}],
+
+      "RUN_SUMMARY_FILE": "",
+      "METRICS_TEXTFILE": ""
+    }
+
+    With a JOURNAL_FILE, the parsed series and what each sink committed are journaled. Running the
+    same run again (same run name, output directory, times, sim tag, model and unchanged output files)
+    after a failure only pushes the series a sink did not commit, without parsing the outputs again
+    once they were parsed in full; a run that finished ok is parsed and pushed afresh. See
+    flo2d.journal.
+
+    The journal is also where the series a sink failed on are kept, e.g. while the database was
+    unreachable and the sink's circuit breaker open. Every run first resends those of the earlier
+    runs of the last JOURNAL_MAX_AGE_HOURS, as long as the circuit lets writes through.
+
+    With an INUNDATION_EXTENT_FILE, the flooded cells and km2 above each of the INUNDATION_THRESHOLDS
+    depths are counted at every TIMDEP.OUT timestep; see flo2d.inundation.
+
+    With CHANNEL_PROFILE, a column of every HYCHAN.OUT hydrograph, not only of the CHANNEL_CELL_MAP
+    elements, is written to a NetCDF file as an (element x time) matrix; see flo2d.channel_profile.
+
+    With POLYGON_DEPTHS, the mean and maximum depth of each polygon of a GeoJSON file (relative to the
+    config) are reduced from every TIMDEP.OUT timestep; see flo2d.polygons.
+
+    With RESAMPLE, the series are resampled to a regular grid, by linear interpolation or by the
+    last value per variable, before they are pushed; see flo2d.resample.
+
+    With ALERTS, the series of the elements with ALERT_THRESHOLDS in the model parameters are checked
+    as they are parsed, before any resampling, and the first crossing of each level is emitted to the
+    alert channels right away; see flo2d.alerts.
+
+    SINKS are the destinations of the parsed series (flo2d.sinks.SINKS), written to in one fan-out
+    with batching and retry per sink; relative paths are resolved against dir_path, but those of the
+    stores kept across runs, e.g. the summary table, against the config directory.
+
+    Configs with a single "variable", "unit" and "unit_type" instead of "variables" are still
+    read, see read_variable_specs().
+
+    :param config_path: path of the config json file, the grid CSVs are looked up next to it
+    :param dir_path: FLO2D output directory
+    :param ts_start_date: timeseries start date, i.e. date of model time 0 (YYYY-MM-DD)
+    :param ts_start_time: timeseries start time (HH:MM:SS)
+    :param run_date: date from which the series are pushed (YYYY-MM-DD)
+    :param run_time: time from which the series are pushed (HH:MM:SS)
+    :param run_name: name of the run in the logs and the run metrics, e.g. 'upload_waterlevels'
+    :param overrides: dict of config values taking precedence over the config file, e.g. {'version': '150'}
+    :param db: get_Pool keyword arguments of the database to write to, CURW_FCST_DB by default
+    :param fgt: forecast generated time, the current Sri Lanka time by default
+    :return: run summary, see flo2d.instrumentation.RunMetrics.summary()
+    """
+    metrics = RunMetrics(run_name)
+    status = 'ok'
+    RUN_SUMMARY_FILE = None
+    METRICS_TEXTFILE = None
+    pool = None
+    sinks = None
+    alerts = None
+    journal = None
+    try:
+        config = load_config(config_path)
+        if overrides:
+            config.update(overrides)
+
+        # variable details, one spec per variable and source file
+        specs = read_variable_specs(config)
+        variables = sorted(set(spec['variable'] for spec in specs))
+
+        # flo2D related details
+        HYCHAN_OUT_FILE = read_attribute_from_config_file('HYCHAN_OUT_FILE', config, False)
+        TIMDEP_FILE = read_attribute_from_config_file('TIMDEP_FILE', config, False)
+        # Optional full grid flood map, written next to the FLO2D outputs
+        FLOOD_MAP_FILE = read_attribute_from_config_file('FLOOD_MAP_FILE', config, False)
+        # Optional flooded area per timestep and depth threshold, written next to the FLO2D outputs
+        INUNDATION_EXTENT_FILE = read_attribute_from_config_file('INUNDATION_EXTENT_FILE', config, False)
+        INUNDATION_THRESHOLDS = read_attribute_from_config_file('INUNDATION_THRESHOLDS', config, False)
+        if INUNDATION_THRESHOLDS is None:
+            INUNDATION_THRESHOLDS = DEFAULT_THRESHOLDS
+        # Optional profile of the whole channel network, e.g. {"path": "channel_profile.nc", "column": 1}
+        CHANNEL_PROFILE = read_attribute_from_config_file('CHANNEL_PROFILE', config, False)
+        # Optional depth series of polygons, e.g. administrative areas
+        POLYGON_DEPTHS = read_attribute_from_config_file('POLYGON_DEPTHS', config, False)
+        # Memory ceiling of the buffered flood plain series
+        TIMDEP_MEMORY_LIMIT_MB = read_attribute_from_config_file('TIMDEP_MEMORY_LIMIT_MB', config, False)
+        if TIMDEP_MEMORY_LIMIT_MB is None:
+            TIMDEP_MEMORY_LIMIT_MB = DEFAULT_MEMORY_LIMIT_MB
+
+        utc_offset = read_attribute_from_config_file('utc_offset', config, False)
+        if utc_offset is None:
+            utc_offset = ''
+
+        # sim tag
+        sim_tag = read_attribute_from_config_file('sim_tag', config, True)
+
+        # source details
+        model = read_attribute_from_config_file('model', config, True)
+        version = read_attribute_from_config_file('version', config, True)
+
+        # timeseries backend details (curw_fcst, sqlite or memory)
+        backend_name = read_attribute_from_config_file('TIMESERIES_BACKEND', config, False)
+        if backend_name is None:
+            backend_name = 'curw_fcst'
+        backend_options = read_attribute_from_config_file('TIMESERIES_BACKEND_OPTIONS', config, False)
+        # sinks every parsed series is fanned out to, the timeseries backend only by default
+        SINKS = read_attribute_from_config_file('SINKS', config, False)
+        # Optional resampling of the series to a regular grid, e.g. {"step_minutes": 15, "methods": {"Discharge": "last"}}
+        RESAMPLE = read_attribute_from_config_file('RESAMPLE', config, False)
+        # Optional flood alert channels, the thresholds are read with the model parameters
+        ALERTS = read_attribute_from_config_file('ALERTS', config, False)
+        ALERT_THRESHOLDS = read_attribute_from_config_file('ALERT_THRESHOLDS', config, False)
+        # Optional run journal (SQLite, next to the config), so a failed run can be retried cheaply
+        JOURNAL_FILE = read_attribute_from_config_file('JOURNAL_FILE', config, False)
+        # Hours the series of a failed run are resent by later runs
+        JOURNAL_MAX_AGE_HOURS = read_attribute_from_config_file('JOURNAL_MAX_AGE_HOURS', config, False)
+        if JOURNAL_MAX_AGE_HOURS is None:
+            JOURNAL_MAX_AGE_HOURS = DEFAULT_MAX_AGE_HOURS
+
+        # JSON lines file the run summary is appended to, besides the log
+        RUN_SUMMARY_FILE = read_attribute_from_config_file('RUN_SUMMARY_FILE', config, False)
+        # Prometheus textfile collector file the run metrics are exported to
+        METRICS_TEXTFILE = read_attribute_from_config_file('METRICS_TEXTFILE', config, False)
+        metrics.labels.update(model=model, version=version, sim_tag=sim_tag, variable=','.join(variables))
+
+        grid_csv_path = os.path.join(os.path.dirname(config_path), 'flo2d_{}m.csv'.format(version))
+        flo2d_model_name = '{}_{}'.format(model, version)
+
+        pool = get_Pool(**(db or CURW_FCST_DB))
+
+        backend = get_backend(backend_name, pool, backend_options)
+
+        isParsed = False
+        if JOURNAL_FILE is not None:
+            journal = RunJournal(os.path.join(os.path.dirname(config_path), JOURNAL_FILE))
+            # Outputs regenerated in the same directory make a new run, not a retry of the last one
+            outputStamp = output_stamp(*[os.path.join(dir_path, file_name)
+                                         for file_name in (HYCHAN_OUT_FILE, TIMDEP_FILE) if file_name is not None])
+            isParsed = journal.start_run(run_key_for(run_name, os.path.abspath(dir_path), ts_start_date, ts_start_time,
+                    run_date, run_time, sim_tag, flo2d_model_name, outputStamp))
+
+        sinks = get_sinks(SINKS, backend, dir_path, metrics, journal, os.path.dirname(config_path))
+
+        if journal is not None:
+            # Earlier runs may have left series a sink failed on, e.g. while the database was down
+            with metrics.stage('journal_recovery'):
+                recovered = sinks.recover(float(JOURNAL_MAX_AGE_HOURS))
+            if recovered:
+                logger.info("Resent {} series of earlier runs from the run journal".format(recovered),
+                        extra={'event': 'journal_recovered', 'series': recovered})
+
+        if isParsed:
+            # An earlier attempt parsed the outputs in full, only push what the sinks didn't commit
+            with metrics.stage('journal_replay'):
+                replayed = sinks.replay()
+            logger.info("Replayed {} series from the run journal".format(replayed),
+                    extra={'event': 'journal_replayed', 'series': replayed})
+        else:
+            with metrics.stage('db_metadata'):
+                flo2d_source = json.loads(get_source_parameters(pool=pool, model=model, version=version))
+
+                flo2d_stations = get_flo2d_output_stations(pool=pool,
+                        flo2d_model=StationEnum.getType(flo2d_model_name))
+
+                source_id = get_source_id(pool=pool, model=model, version=version)
+
+                # Looked up once per distinct variable and unit across the specs
+                variable_ids = {}
+                unit_ids = {}
+                for spec in specs:
+                    if spec['variable'] not in variable_ids:
+                        variable_ids[spec['variable']] = get_variable_id(pool=pool, variable=spec['variable'])
+                    unit_key = (spec['unit'], spec['unit_type'])
+                    if unit_key not in unit_ids:
+                        unit_ids[unit_key] = get_unit_id(pool=pool, unit=spec['unit'],
+                                unit_type=UnitType.getType(spec['unit_type']))
+            metrics.add('db_metadata', db_round_trips=3 + len(variable_ids) + len(unit_ids))
+
+            for spec in specs:
+                spec['tms_meta'] = {
+                        'sim_tag'    : sim_tag,
+                        'model'      : model,
+                        'version'    : version,
+                        'variable'   : spec['variable'],
+                        'unit'       : spec['unit'],
+                        'unit_type'  : UnitType.getType(spec['unit_type']).value,
+                        'source_id'  : source_id,
+                        'variable_id': variable_ids[spec['variable']],
+                        'unit_id'    : unit_ids[(spec['unit'], spec['unit_type'])]
+                        }
+                spec['elements'] = flo2d_source[spec['station_map']].keys()
+
+            if ALERTS is not None:
+                station_names = {}
+                for station_map in STATION_MAPS.values():
+                    station_names.update(flo2d_source.get(station_map) or {})
+                # A fan-out of its own, fed the series as they are parsed, before they are resampled
+                # and batched for the database
+                alerts = FanOut([AlertSink(read_thresholds(flo2d_source.get('ALERT_THRESHOLDS'), ALERT_THRESHOLDS),
+                        get_alert_channels(ALERTS, dir_path), station_names)], metrics)
+
+            utcOffset = getUTCOffset(utc_offset, default=True)
+
+            if fgt is None:
+                fgt = forecast_generated_time()
+
+            baseTime = datetime.strptime('%s %s' % (ts_start_date, ts_start_time), DATE_TIME_FORMAT)
+            # Timestamps of the model output times, shared by every element of both files
+            stepTimes = StepTimes(baseTime)
+
+            logger.info("Extract {} Result of FLO2D on {} @ {} with Base time of {} @ {}".format(
+                    ', '.join(variables), run_date, run_time, ts_start_date, ts_start_time),
+                    extra={'event': 'run_started', 'run': run_name})
+
+            def save_series(spec, elementNo, timeseries, sink=sinks):
+                # Save Forecast values into Database
+                opts = {
+                        'elementNo': elementNo,
+                        'tms_meta' : spec['tms_meta']
+                        }
+                if utcOffset!=timedelta():
+                    opts['utcOffset'] = utcOffset
+
+                # Push timeseries to database
+                save_forecast_timeseries_to_db(pool=pool, timeseries=timeseries,
+                        run_date=run_date, run_time=run_time, opts=opts, flo2d_stations=flo2d_stations, fgt=fgt,
+                        backend=backend, metrics=metrics, sink=sink)
+
+            push_series = save_series
+            resampler = None
+            if RESAMPLE is not None:
+                resampler = Resampler(save_series, **RESAMPLE)
+                push_series = resampler
+            if alerts is not None:
+                def push_series(spec, elementNo, timeseries, push=push_series):
+                    save_series(spec, elementNo, timeseries, sink=alerts)
+                    push(spec, elementNo, timeseries)
+
+            hychan_specs = [spec for spec in specs if spec['file_key']=='HYCHAN_OUT_FILE']
+            if hychan_specs:
+                # Optional profile of every hydrograph, it cannot stop the upload
+                channelProfile = None
+                if CHANNEL_PROFILE is not None:
+                    with optional_output('channel profile'):
+                        profile_options = dict(CHANNEL_PROFILE)
+                        profile_options['path'] = os.path.join(dir_path,
+                                profile_options.get('path', 'channel_profile.nc'))
+                        channelProfile = ChannelProfile(base_time=baseTime, **profile_options)
+                isProfiled = False
+                try:
+                    isProfiled = extract_hychan(os.path.join(dir_path, HYCHAN_OUT_FILE), hychan_specs, stepTimes,
+                            push_series, metrics, channelProfile)
+                finally:
+                    if channelProfile is not None:
+                        with optional_output('channel profile'):
+                            channelProfile.close(isProfiled)
+                            if isProfiled:
+                                logger.info("Channel profile written to {}".format(channelProfile.path),
+                                        extra={'event'   : 'channel_profile_written',
+                                               'elements': channelProfile.elements_written})
+                if resampler is not None:
+                    with metrics.stage('resample'):
+                        resampler.flush()
+
+            timdep_specs = [spec for spec in specs if spec['file_key']=='TIMDEP_FILE']
+            if timdep_specs:
+                # Optional outputs reduced from every parsed TIMDEP.OUT block, none of them can stop the upload
+                reducers = []
+                floodMap = None
+                if FLOOD_MAP_FILE is not None:
+                    with optional_output('flood map'):
+                        grid_ids, grid_x, grid_y = read_grid(grid_csv_path)
+                        floodMap = FloodMap(grid_ids)
+                        reducers.append(floodMap)
+                inundationExtent = None
+                if INUNDATION_EXTENT_FILE is not None:
+                    with optional_output('inundation extent'):
+                        inundationExtent = InundationExtent(int(version), INUNDATION_THRESHOLDS)
+                        reducers.append(inundationExtent)
+                polygonDepths = None
+                if POLYGON_DEPTHS is not None:
+                    with metrics.stage('polygon_membership'), optional_output('polygon depths'):
+                        polygonDepths = PolygonDepths(*load_membership(
+                                os.path.join(os.path.dirname(config_path), POLYGON_DEPTHS['polygons']), grid_csv_path,
+                                POLYGON_DEPTHS.get('name_property', 'name')))
+                        reducers.append(polygonDepths)
+                # The reducers that saw every block, a failing one is dropped
+                reducers = extract_timdep(os.path.join(dir_path, TIMDEP_FILE), timdep_specs, stepTimes, push_series,
+                        metrics, float(TIMDEP_MEMORY_LIMIT_MB), reducers)
+                if resampler is not None:
+                    with metrics.stage('resample'):
+                        resampler.flush()
+                if floodMap in reducers:
+                    with optional_output('flood map'):
+                        flood_map_file_path = os.path.join(dir_path, FLOOD_MAP_FILE)
+                        write_flood_map_netcdf(flood_map_file_path, floodMap, grid_x, grid_y, int(version), baseTime)
+                        logger.info("Flood map written to {}".format(flood_map_file_path),
+                                extra={'event': 'flood_map_written', 'timesteps': floodMap.timesteps})
+                if inundationExtent in reducers:
+                    with optional_output('inundation extent'):
+                        inundation_file_path = os.path.join(dir_path, INUNDATION_EXTENT_FILE)
+                        write_inundation_csv(inundation_file_path, inundationExtent, baseTime)
+                        logger.info("Inundation extent written to {}".format(inundation_file_path),
+                                extra={'event': 'inundation_extent_written',
+                                       'timesteps': len(inundationExtent.model_times)})
+                if polygonDepths in reducers:
+                    with optional_output('polygon depths'):
+                        polygon_file_path = os.path.join(dir_path, POLYGON_DEPTHS.get('path', 'polygon_depths.csv'))
+                        write_polygon_depths_csv(polygon_file_path, polygonDepths, baseTime)
+                        logger.info("Polygon depths written to {}".format(polygon_file_path),
+                                extra={'event': 'polygon_depths_written', 'polygons': len(polygonDepths.names),
+                                       'timesteps': len(polygonDepths.model_times)})
+
+            if journal is not None:
+                journal.mark_parsed()
+
+    except Exception:
+        status = 'failed'
+        logger.exception("Process failed.", extra={'event': 'run_failed'})
+    finally:
+        if alerts is not None:
+            # Waits for the alerts still queued for a webhook
+            try:
+                alerts.close()
+            except Exception:
+                logger.exception("Exception occurred while closing the alert channels")
+        if sinks is not None:
+            # Writes out what the sinks still hold in their batches
+            try:
+                sinks.close()
+            except Exception:
+                status = 'failed'
+                logger.exception("Exception occurred while closing the sinks")
+        if journal is not None:
+            try:
+                journal.finish([sink.key for sink in sinks.sinks] if sinks is not None else [])
+            except Exception:
+                logger.exception("Exception occurred while closing the run journal")
+            journal.close()
+        if pool is not None:
+            destroy_Pool(pool=pool)
+        summary = metrics.emit(status, RUN_SUMMARY_FILE)
+        if METRICS_TEXTFILE is not None:
+            try:
+                export_run_metrics(METRICS_TEXTFILE, summary)
+            except Exception:
+                logger.exception("Exception occurred while exporting run metrics")
+        logger.info("Process finished.")
+    return summary
+
+
+def extract_hychan(file_path, specs, step_times, save_series, metrics, profile=None):
+    """
+    Extract the channel series of the given variable specs from HYCHAN.OUT, in one pass over the file.
+    :param file_path: HYCHAN.OUT path
+    :param specs: variable specs read from HYCHAN.OUT, with their 'elements'
+    :param step_times: flo2d.timeseries.StepTimes of the run
+    :param save_series: function(spec, element number, timeseries) pushing a series
+    :param metrics: RunMetrics of the run
+    :param profile: ChannelProfile every hydrograph is added to, if given. A failure to add one is logged
+    and the profile dropped for the rest of the file; the series are extracted regardless
+    :return: True if every hydrograph was added to the profile
+    """
+    # Check HYCHAN.OUT file exists
+    if not os.path.exists(file_path):
+        logger.error("Unable to find file : {}".format(file_path))
+
+    # Every spec is read from the same pass over the file
+    ELEMENT_NUMBERS = set()
+    for spec in specs:
+        ELEMENT_NUMBERS.update(spec['elements'])
+
+    with metrics.stage(HYCHAN_PARSE_STAGE), open(file_path) as infile:
+        # The profile needs every hydrograph, the others are skipped unsplit otherwise
+        for elementNo, rows in iter_hydrographs(infile, None if profile is not None else ELEMENT_NUMBERS):
+            if profile is not None:
+                try:
+                    profile.add(elementNo, rows)
+                except Exception:
+                    logger.exception("Unable to add element {} to the channel profile, it is skipped".format(elementNo),
+                            extra={'event': 'optional_output_failed', 'output': 'channel profile'})
+                    profile = None
+            for spec in specs:
+                if elementNo in spec['elements']:
+                    timeseries = hydrograph_series(rows, spec['column'], step_times)
+                    metrics.add(HYCHAN_PARSE_STAGE, station=elementNo, rows_parsed=len(timeseries))
+                    save_series(spec, elementNo, timeseries)
+        metrics.add(HYCHAN_PARSE_STAGE, bytes_read=infile.tell())
+    logger.info("Extracted channel {} from HYCHAN.OUT".format(', '.join(spec['variable'] for spec in specs)),
+            extra={'event': 'hychan_parsed', 'stations': len(ELEMENT_NUMBERS), 'variables': len(specs)})
+    return profile is not None
+
+
+def extract_timdep(file_path, specs, step_times, save_series, metrics, memory_limit_mb, reducers=()):
+    """
+    Extract the flood plain series of the given variable specs from TIMDEP.OUT, in one pass over the
+    file. The series are pushed in time windows, to keep memory bounded on long horizons.
+    :param file_path: TIMDEP.OUT path
+    :param specs: variable specs read from TIMDEP.OUT, with their 'elements'
+    :param step_times: flo2d.timeseries.StepTimes of the run
+    :param save_series: function(spec, element number, timeseries) pushing a series
+    :param metrics: RunMetrics of the run
+    :param memory_limit_mb: memory ceiling of the buffered series
+    :param reducers: objects with an update(model_time, block) method fed every block parsed once into an
+    array, e.g. FloodMap, InundationExtent or PolygonDepths. A reducer failing on a block is logged and
+    dropped for the rest of the file, all of them if the block cannot be parsed; the series are
+    extracted regardless
+    :return: list of the reducers that were fed every block
+    """
+    if not os.path.exists(file_path):
+        logger.error("Unable to find file : {}".format(file_path))
+
+    FLOOD_ELEMENT_NUMBERS = set()
+    for spec in specs:
+        FLOOD_ELEMENT_NUMBERS.update(spec['elements'])
+    reducers = list(reducers)
+
+    with metrics.stage(TIMDEP_PARSE_STAGE), open(file_path) as infile:
+        windowSize = window_size_for(memory_limit_mb, sum(len(spec['elements']) for spec in specs))
+        buffers = [SeriesBuffer(spec['elements'],
+                                lambda elementNo, timeseries, spec=spec: save_series(spec, elementNo, timeseries),
+                                windowSize) for spec in specs]
+        # Flood plain cells sit on the same rows of every block, look them up directly
+        rowIndex = TimdepRowIndex(FLOOD_ELEMENT_NUMBERS)
+        for ModelTime, rows in iter_timdep_blocks(infile):
+            if reducers:
+                reducers = reduce_timdep_block(reducers, ModelTime, rows)
+            cellRows = rowIndex.lookup(rows)
+            metrics.add(TIMDEP_PARSE_STAGE, rows_parsed=len(rows))
+
+            dateAndTime = step_times[ModelTime]
+
+            for spec, floodPlainSeries in zip(specs, buffers):
+                column = spec['column']
+                for elementNo in spec['elements']:
+                    if elementNo in cellRows:
+                        floodPlainSeries.append(elementNo, [dateAndTime, cellRows[elementNo][column]])
+                    else:
+                        floodPlainSeries.append(elementNo, [dateAndTime, MISSING_VALUE])
+
+        for floodPlainSeries in buffers:
+            floodPlainSeries.flush()
+        metrics.add(TIMDEP_PARSE_STAGE, bytes_read=infile.tell())
+    logger.info("Extracted flood plain {} from TIMDEP.OUT".format(', '.join(spec['variable'] for spec in specs)),
+            extra={'event': 'timdep_parsed', 'stations': len(FLOOD_ELEMENT_NUMBERS), 'variables': len(specs),
+                   'window_size': windowSize, 'windows': sum(buffer.flushes for buffer in buffers),
+                   'full_scans': rowIndex.full_scans})
+    return reducers
+
+
+def reduce_timdep_block(reducers, model_time, rows):
+    """
+    Feed a TIMDEP.OUT block to the reducers.
+    :param reducers: list of reducers, see extract_timdep()
+    :param model_time: model time of the block in hours
+    :param rows: cell rows of the block
+    :return: list of the reducers that took the block
+    """
+    try:
+        block = parse_timdep_block(rows)
+    except Exception:
+        logger.exception("Unable to parse the TIMDEP.OUT block at {}, the outputs reduced from it are skipped".format(
+                model_time), extra={'event': 'timdep_block_unparsed', 'model_time': model_time})
+        return []
+    remaining = []
+    for reducer in reducers:
+        with optional_output(type(reducer).__name__):
+            reducer.update(model_time, block)
+            remaining.append(reducer)
+    return remaining
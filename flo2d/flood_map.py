@@ -0,0 +1,174 @@
+"""
+Full-grid flood maps from FLO2D TIMDEP.OUT.
+
+Every timestep block is parsed into a NumPy array and folded into running per-cell statistics
+(maximum depth, time of maximum depth, maximum water surface elevation and final depth), so the
+full (cell x time) cube is never held in memory. Cells are aligned with the Grid_ID order of the
+model grid CSV (flo2d_250m.csv / flo2d_150m.csv).
+"""
+import numpy as np
+
+from .timdep import TIMDEP_CELL_COLUMN, TIMDEP_DEPTH_COLUMN, TIMDEP_ELEVATION_COLUMN
+
+FILL_VALUE = -9999.0
+METERS_PER_DEGREE = 111320.0
+
+
+def read_grid(grid_csv_path):
+    """
+    Read a FLO2D grid CSV with Grid_ID,X,Y columns.
+    :param grid_csv_path: path of the grid CSV file
+    :return: (grid_ids, x, y) numpy arrays
+    """
+    grid = np.loadtxt(grid_csv_path, delimiter=',', skiprows=1, ndmin=2)
+    return grid[:, 0].astype(np.int64), grid[:, 1], grid[:, 2]
+
+
+def parse_timdep_block(rows):
+    """
+    Parse the cell rows of one TIMDEP.OUT block into a 2-D float array.
+    :param rows: cell rows of one block, as yielded by flo2d.timdep.iter_timdep_blocks()
+    :return: numpy array of shape (len(rows), columns)
+    """
+    if not rows:
+        return np.empty((0, TIMDEP_ELEVATION_COLUMN + 1))
+    values = np.array(''.join(rows).split(), dtype=np.float64)
+    return values.reshape(len(rows), -1)
+
+
+class FloodMap(object):
+    """
+    Running per-cell flood statistics over the timestep blocks of a TIMDEP.OUT file.
+    """
+
+    def __init__(self, grid_ids):
+        """
+        :param grid_ids: Grid_IDs of the model grid, in grid CSV order
+        """
+        self.grid_ids = np.asarray(grid_ids, dtype=np.int64)
+        size = len(self.grid_ids)
+
+        self.max_depth = np.full(size, -np.inf)
+        self.time_of_max = np.full(size, np.nan)
+        self.max_elevation = np.full(size, -np.inf)
+        self.final_depth = np.full(size, np.nan)
+        self.timesteps = 0
+
+        self._position_of = np.full(self.grid_ids.max() + 1 if size else 1, -1, dtype=np.int64)
+        self._position_of[self.grid_ids] = np.arange(size)
+        self._block_cells = None
+        self._block_positions = None
+
+    def _positions(self, cells):
+        # Blocks list the cells in the same order every timestep, reuse the last mapping
+        if self._block_cells is not None and np.array_equal(cells, self._block_cells):
+            return self._block_positions
+
+        positions = self._position_of[cells]
+        if (positions < 0).any():
+            raise ValueError("TIMDEP.OUT has cells that are not in the model grid")
+        if len(positions)==len(self.grid_ids) and (positions==np.arange(len(positions))).all():
+            # Block rows are the whole grid in grid order, update the arrays in place
+            positions = slice(None)
+
+        self._block_cells = cells
+        self._block_positions = positions
+        return positions
+
+    def update(self, model_time, block):
+        """
+        Fold one timestep into the running statistics.
+        :param model_time: model time of the block in hours
+        :param block: block array, as returned by parse_timdep_block()
+        """
+        if len(block)==0:
+            return
+        positions = self._positions(block[:, TIMDEP_CELL_COLUMN].astype(np.int64))
+        depth = block[:, TIMDEP_DEPTH_COLUMN]
+        elevation = block[:, TIMDEP_ELEVATION_COLUMN]
+
+        if isinstance(positions, slice):
+            is_greater = np.greater(depth, self.max_depth)
+            np.copyto(self.max_depth, depth, where=is_greater)
+            self.time_of_max[is_greater] = model_time
+            np.fmax(self.max_elevation, elevation, out=self.max_elevation)
+            self.final_depth[:] = depth
+        else:
+            is_greater = np.greater(depth, self.max_depth[positions])
+            self.max_depth[positions[is_greater]] = depth[is_greater]
+            self.time_of_max[positions[is_greater]] = model_time
+            self.max_elevation[positions] = np.fmax(self.max_elevation[positions], elevation)
+            self.final_depth[positions] = depth
+
+        self.timesteps += 1
+
+
+def _axis(values, nominal_step):
+    # Grid coordinates are projected cell centres converted to lat/lon, so they jitter slightly
+    # around the rows and columns. Snap them to the median spacing of the real gaps.
+    gaps = np.diff(np.unique(values))
+    gaps = gaps[gaps > nominal_step / 2]
+    step = np.median(gaps) if len(gaps) else nominal_step
+    origin = values.min()
+    index = np.rint((values - origin) / step).astype(np.int64)
+    return origin + step * np.arange(index.max() + 1), index
+
+
+def _raster_index(x, y, cell_size):
+    # Axes of the raster and the row and column of every cell, shared by all the variables
+    lat_step = cell_size / METERS_PER_DEGREE
+    lon_step = lat_step / np.cos(np.radians(np.mean(y)))
+    lons, columns = _axis(x, lon_step)
+    lats, rows = _axis(y, lat_step)
+    return lons, lats, rows, columns
+
+
+def _to_raster(index, values):
+    lons, lats, rows, columns = index
+    raster = np.full((len(lats), len(lons)), FILL_VALUE)
+    valid = np.isfinite(values)
+    raster[rows[valid], columns[valid]] = values[valid]
+    return raster
+
+
+def write_flood_map_netcdf(file_path, flood_map, x, y, cell_size, base_time):
+    """
+    Write the flood map statistics as a regular lat/lon NetCDF grid.
+    :param file_path: output NetCDF file path
+    :param flood_map: FloodMap instance
+    :param x: longitudes of the grid cells, in grid CSV order
+    :param y: latitudes of the grid cells, in grid CSV order
+    :param cell_size: grid cell size in meters (250 for FLO2D_250, 150 for FLO2D_150)
+    :param base_time: datetime of model time 0
+    """
+    from netCDF4 import Dataset
+
+    variables = {
+            'max_depth'    : (flood_map.max_depth, 'm', 'Maximum flow depth'),
+            'time_of_max'  : (flood_map.time_of_max,
+                              'hours since {}'.format(base_time.strftime('%Y-%m-%d %H:%M:%S')),
+                              'Time of maximum flow depth'),
+            'max_elevation': (flood_map.max_elevation, 'm', 'Maximum water surface elevation'),
+            'final_depth'  : (flood_map.final_depth, 'm', 'Flow depth at the last timestep'),
+            'grid_id'      : (flood_map.grid_ids.astype(np.float64), '1', 'FLO2D grid element number')
+            }
+
+    index = _raster_index(x, y, cell_size)
+    lons, lats = index[:2]
+    with Dataset(file_path, 'w', format='NETCDF4') as nc:
+        nc.createDimension('lat', len(lats))
+        nc.createDimension('lon', len(lons))
+        for name, (values, units, long_name) in variables.items():
+            var = nc.createVariable(name, 'f4', ('lat', 'lon'), fill_value=FILL_VALUE, zlib=True)
+            var.units = units
+            var.long_name = long_name
+            var[:] = _to_raster(index, values)
+
+        lat = nc.createVariable('lat', 'f8', ('lat',))
+        lat.units = 'degrees_north'
+        lat[:] = lats
+        lon = nc.createVariable('lon', 'f8', ('lon',))
+        lon.units = 'degrees_east'
+        lon[:] = lons
+
+        nc.timesteps = flood_map.timesteps
@@ -0,0 +1,80 @@
+"""
+Reader for the FLO2D HYCHAN.OUT output file.
+
+HYCHAN.OUT holds one hydrograph per channel element. A hydrograph starts with a header line
+
+         CHANNEL HYDROGRAPH FOR ELEMENT NO:   <element number>
+
+followed by a few column title lines and one row per output time:
+
+    <time> <elevation> <depth> <velocity> <discharge> ...
+"""
+from .timeseries import isfloat
+
+BUFSIZE = 65536
+
+HYDROGRAPH_HEADER = 'CHANNEL HYDROGRAPH FOR ELEMENT NO:'
+
+# Column positions within a HYCHAN.OUT hydrograph row
+HYCHAN_TIME_COLUMN = 0
+HYCHAN_ELEVATION_COLUMN = 1
+HYCHAN_DEPTH_COLUMN = 2
+HYCHAN_VELOCITY_COLUMN = 3
+HYCHAN_DISCHARGE_COLUMN = 4
+
+# Stage of the run metrics the reading and parsing of HYCHAN.OUT is recorded under
+HYCHAN_PARSE_STAGE = 'hychan_parse'
+
+
+def iter_hydrographs(infile, elements=None, bufsize=BUFSIZE):
+    """
+    Iterate over the hydrographs of an open HYCHAN.OUT file in a single pass.
+    A hydrograph ends at the first non numeric line after its rows, at the next header or at the end
+    of the file, so the series length need not be known up front. Rows of elements that are not
+    asked for are skipped without being split.
+    :param infile: HYCHAN.OUT file object opened in text mode
+    :param elements: collection of element numbers (strings) to read, None to read every element
+    :param bufsize: size hint passed to readlines()
+    :return: generator of (element number, rows) tuples, rows being the split hydrograph rows
+    """
+    element = None
+    rows = None
+    while True:
+        lines = infile.readlines(bufsize)
+        if not lines:
+            break
+        for line in lines:
+            if line.startswith(HYDROGRAPH_HEADER, 5):
+                if rows:
+                    yield element, rows
+                element = line.split()[5]
+                rows = [] if elements is None or element in elements else None
+            elif rows is not None:
+                cols = line.split()
+                if cols and isfloat(cols[0]):
+                    rows.append(cols)
+                elif rows:
+                    yield element, rows
+                    rows = None
+
+    if rows:
+        yield element, rows
+
+
+def hydrograph_series(rows, column, step_times):
+    """
+    Timeseries of one column of a hydrograph. Missing and NaN values are skipped.
+    :param rows: split hydrograph rows, as yielded by iter_hydrographs()
+    :param column: column position, e.g. HYCHAN_ELEVATION_COLUMN
+    :param step_times: flo2d.timeseries.StepTimes of the run
+    :return: list of [timestamp, value] pairs
+    """
+    timeseries = []
+    for v in rows:
+        if len(v) <= column:
+            continue
+        value = v[column]
+        if value=='NaN' or not isfloat(value):
+            continue
+        timeseries.append([step_times[v[HYCHAN_TIME_COLUMN]], value])
+    return timeseries
@@ -0,0 +1,187 @@
+"""
+Lightweight per-run instrumentation.
+
+A RunMetrics instance collects wall time and counters (bytes read, rows parsed, rows written,
+rows skipped as unchanged, database round trips) per stage and per station, and emits one structured summary record at the
+end of the run. Stage timings are exclusive: time spent in a nested stage, such as the database
+writes made while parsing HYCHAN.OUT, is only counted against the nested stage.
+
+A RunMetrics may be used from several threads: counters are updated under a lock and each thread
+nests its own stages. A sink writing on a timed worker thread defers what it measures there, and
+the waiting thread merges it once the write returned in time (deferred(), merge()), so a write
+given up on never reaches the metrics.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('wall_time', 'bytes_read', 'rows_parsed', 'rows_written', 'rows_skipped', 'db_round_trips', 'failures')
+
+
+def _counters():
+    return OrderedDict((counter, 0) for counter in COUNTERS)
+
+
+class RunMetrics(object):
+
+    def __init__(self, run, **labels):
+        """
+        :param run: name of the run, e.g. 'upload_waterlevels'
+        :param labels: labels of the run, e.g. model, version, sim_tag, variable
+        """
+        self.run = run
+        self.labels = labels
+        self.started = datetime.now()
+        self.start = time.perf_counter()
+        self.stages = OrderedDict()
+        self.stations = OrderedDict()
+        self._lock = threading.Lock()
+        # Per thread: stack of [stage name, time the stage was last resumed, station], and the
+        # counters deferred by the thread
+        self._local = threading.local()
+
+    @property
+    def _active(self):
+        active = getattr(self._local, 'active', None)
+        if active is None:
+            active = self._local.active = []
+        return active
+
+    def add(self, stage, station=None, **counters):
+        """
+        Add to the counters of a stage, and of a station when given.
+        """
+        deferred = getattr(self._local, 'deferred', None)
+        if deferred is not None:
+            deferred.append((stage, station, counters))
+            return
+        with self._lock:
+            stage_counters = self.stages.setdefault(stage, _counters())
+            station_counters = self.stations.setdefault(station, _counters()) if station is not None else None
+            for counter, amount in counters.items():
+                stage_counters[counter] += amount
+                if station_counters is not None:
+                    station_counters[counter] += amount
+
+    @contextmanager
+    def deferred(self):
+        """
+        Keep what the current thread adds within the block aside instead of counting it.
+        :return: list of the deferred (stage, station, counters), to merge()
+        """
+        records = self._local.deferred = []
+        try:
+            yield records
+        finally:
+            self._local.deferred = None
+
+    def merge(self, records):
+        """
+        Count records deferred by another thread, as stages nested in the current stage of this thread.
+        :param records: list yielded by deferred()
+        """
+        nested = 0.0
+        for stage, station, counters in records:
+            self.add(stage, station=station, **counters)
+            nested += counters.get('wall_time', 0)
+        if self._active:
+            # The time waited on the other thread is not the current stage's own
+            self._active[-1][1] += nested
+
+    @contextmanager
+    def stage(self, name, station=None):
+        """
+        Time a block of code as a stage. A stage entered within another one pauses the outer stage.
+        """
+        now = time.perf_counter()
+        if self._active:
+            outer = self._active[-1]
+            self.add(outer[0], station=outer[2], wall_time=now - outer[1])
+        current = [name, now, station]
+        self._active.append(current)
+        try:
+            yield self
+        finally:
+            now = time.perf_counter()
+            self._active.pop()
+            self.add(name, station=station, wall_time=now - current[1])
+            if self._active:
+                self._active[-1][1] = now
+
+    def backend(self, backend, station=None, stage='db_write'):
+        """
+        Wrap a timeseries backend so each round trip is timed and counted under `stage`.
+        """
+        return _MeasuredBackend(backend, self, station, stage)
+
+    def summary(self, status='ok'):
+        """
+        :return: dict summarising the run
+        """
+        totals = _counters()
+        for stage_counters in self.stages.values():
+            for counter, amount in stage_counters.items():
+                if counter!='wall_time':
+                    totals[counter] += amount
+        totals['wall_time'] = time.perf_counter() - self.start
+        return OrderedDict([
+                ('run', self.run),
+                ('labels', self.labels),
+                ('started', self.started.strftime('%Y-%m-%d %H:%M:%S')),
+                ('status', status),
+                ('totals', totals),
+                ('stages', self.stages),
+                ('stations', self.stations)
+                ])
+
+    def emit(self, status='ok', file_path=None):
+        """
+        Log the run summary as one structured record, and append it to file_path when given.
+        :return: the run summary
+        """
+        summary = self.summary(status)
+        logger.info("Run summary of {}".format(self.run), extra={'event': 'run_summary', 'summary': summary})
+        if file_path is not None:
+            with open(file_path, 'a') as f:
+                f.write(json.dumps(summary) + '\n')
+        return summary
+
+
+class _MeasuredBackend(object):
+
+    def __init__(self, backend, metrics, station, stage):
+        self.wrapped = backend
+        self.metrics = metrics
+        self.station = station
+        self.stage = stage
+
+    def _round_trip(self, function, rows=0, **kwargs):
+        with self.metrics.stage(self.stage, station=self.station):
+            result = function(**kwargs)
+        self.metrics.add(self.stage, station=self.station, db_round_trips=1, rows_written=rows)
+        return result
+
+    def generate_timeseries_id(self, meta_data):
+        return self.wrapped.generate_timeseries_id(meta_data=meta_data)
+
+    def get_timeseries_id_if_exists(self, meta_data):
+        return self._round_trip(self.wrapped.get_timeseries_id_if_exists, meta_data=meta_data)
+
+    def insert_run(self, run_meta):
+        return self._round_trip(self.wrapped.insert_run, run_meta=run_meta)
+
+    def update_start_date(self, id_, start_date):
+        return self._round_trip(self.wrapped.update_start_date, id_=id_, start_date=start_date)
+
+    def update_latest_fgt(self, id_, fgt):
+        return self._round_trip(self.wrapped.update_latest_fgt, id_=id_, fgt=fgt)
+
+    def insert_data(self, timeseries, tms_id, fgt, upsert=False):
+        return self._round_trip(self.wrapped.insert_data, rows=len(timeseries), timeseries=timeseries, tms_id=tms_id,
+                fgt=fgt, upsert=upsert)
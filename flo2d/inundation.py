@@ -0,0 +1,84 @@
+"""
+Inundation extent of a FLO2D run from TIMDEP.OUT: the number of flooded cells, and their area, at
+every output timestep for a set of depth thresholds.
+
+The extent is reduced from the same parsed blocks as the flood plain series and the flood map, so
+TIMDEP.OUT is still read once.
+"""
+import csv
+from datetime import timedelta
+
+import numpy as np
+
+from .timdep import TIMDEP_DEPTH_COLUMN
+
+# Depths in metres above which a cell counts as flooded
+DEFAULT_THRESHOLDS = (0.1, 0.3, 0.5, 1.0)
+
+
+def cell_area_km2(cell_size):
+    """
+    :param cell_size: grid cell size in meters (250 for FLO2D_250, 150 for FLO2D_150)
+    :return: area of a grid cell in km2
+    """
+    return (cell_size / 1000.0) ** 2
+
+
+class InundationExtent(object):
+    """
+    Flooded cell counts per timestep over the timestep blocks of a TIMDEP.OUT file.
+    """
+
+    def __init__(self, cell_size, thresholds=DEFAULT_THRESHOLDS):
+        """
+        :param cell_size: grid cell size in meters
+        :param thresholds: depths in metres, a cell is flooded above a threshold
+        """
+        self.cell_area = cell_area_km2(cell_size)
+        self.thresholds = np.array(sorted(float(threshold) for threshold in thresholds))
+        self.model_times = []
+        self.counts = []
+
+    def update(self, model_time, block):
+        """
+        Count the flooded cells of one timestep.
+        :param model_time: model time of the block in hours
+        :param block: block array, as returned by flo2d.flood_map.parse_timdep_block()
+        """
+        depth = block[:, TIMDEP_DEPTH_COLUMN]
+        self.model_times.append(model_time)
+        self.counts.append(np.count_nonzero(depth[:, np.newaxis] > self.thresholds, axis=0))
+
+    @property
+    def cells(self):
+        """
+        :return: (timestep, threshold) int array of flooded cell counts
+        """
+        return np.array(self.counts, dtype=np.int64).reshape(-1, len(self.thresholds))
+
+    @property
+    def area(self):
+        """
+        :return: (timestep, threshold) float array of flooded areas in km2
+        """
+        return self.cells * self.cell_area
+
+
+def write_inundation_csv(file_path, extent, base_time):
+    """
+    Write the inundation extent as one row per timestep, with the flooded cells and km2 of each threshold.
+    :param file_path: output CSV file path
+    :param extent: InundationExtent instance
+    :param base_time: datetime of model time 0
+    """
+    header = ['Time', 'ModelTime']
+    for threshold in extent.thresholds:
+        header += ['cells_{:g}m'.format(threshold), 'area_km2_{:g}m'.format(threshold)]
+    with open(file_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for model_time, cells, area in zip(extent.model_times, extent.cells.tolist(), extent.area.tolist()):
+            row = [(base_time + timedelta(hours=model_time)).strftime('%Y-%m-%d %H:%M:%S'), model_time]
+            for count, km2 in zip(cells, area):
+                row += [count, round(km2, 4)]
+            writer.writerow(row)
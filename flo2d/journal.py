@@ -0,0 +1,311 @@
+"""
+Local journal of the series parsed in a run and of what each sink committed.
+
+A run that dies half way, e.g. on a database timeout, can be retried from the journal: once the
+FLO2D outputs of a run have been parsed in full, a retry neither parses them again nor rewrites
+the series a sink already committed, it only replays the rest. While a run is still being parsed,
+series a sink committed in an earlier attempt are skipped for that sink.
+
+The run is dropped once every sink committed every series of it, so running the same key again
+parses and pushes afresh. Run keys carry the size and modification time of the FLO2D outputs
+(output_stamp()), so outputs regenerated in the same directory are a new run, not a retry.
+
+Hourly runs never retry their own key, so the journal is also the disk queue of the series a sink
+failed on: the next run hands them to its sinks again at startup (spilled()), and drops the earlier
+runs left with nothing pending (settle()). Runs older than the maximum age are dropped unsent
+(expire()).
+"""
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from .sinks.base import Series, format_time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS run (
+    run_key TEXT NOT NULL PRIMARY KEY,
+    status TEXT NOT NULL,
+    parsed INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started TEXT NOT NULL,
+    updated TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_key TEXT NOT NULL,
+    series_key TEXT NOT NULL,
+    element TEXT NOT NULL,
+    meta TEXT NOT NULL,
+    timeseries TEXT NOT NULL,
+    fgt TEXT,
+    UNIQUE (run_key, series_key)
+);
+CREATE TABLE IF NOT EXISTS commit_status (
+    series_id INTEGER NOT NULL,
+    sink TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    error TEXT,
+    updated TEXT NOT NULL,
+    PRIMARY KEY (series_id, sink)
+);
+"""
+
+COMMITTED = 'committed'
+FAILED = 'failed'
+
+# Hours the series of a run are kept for later runs to resend
+DEFAULT_MAX_AGE_HOURS = 24
+
+# Series metadata identifying a series within a run, with the element and its first timestamp
+SERIES_KEY_FIELDS = ('variable', 'unit', 'unit_type')
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _cutoff(max_age_hours):
+    return (datetime.now() - timedelta(hours=max_age_hours)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def run_key_for(*parts):
+    """
+    :param parts: values identifying a run, e.g. run name, output directory, run time and sim tag
+    :return: run key string
+    """
+    return '|'.join(str(part) for part in parts)
+
+
+def output_stamp(*paths):
+    """
+    :param paths: FLO2D output files of a run, e.g. HYCHAN.OUT and TIMDEP.OUT
+    :return: string of the size and modification time of each file, '-' for a missing one
+    """
+    stamps = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stamps.append('-')
+            continue
+        stamps.append('{}:{}'.format(stat.st_size, stat.st_mtime_ns))
+    return ','.join(stamps)
+
+
+class RunJournal(object):
+
+    def __init__(self, path):
+        """
+        :param path: SQLite file of the journal, created if missing
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        self.run_key = None
+
+    def start_run(self, run_key):
+        """
+        Start, or resume, the run of the given key.
+        :return: True if the FLO2D outputs of the run were already parsed in full, i.e. the run only
+        needs its pending series replayed
+        """
+        self.run_key = run_key
+        now = _now()
+        with self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO run (run_key, status, started, updated) VALUES (?, ?, ?, ?)",
+                    (run_key, 'running', now, now))
+            self.connection.execute("UPDATE run SET attempts = attempts + 1, updated = ? WHERE run_key = ?",
+                    (now, run_key))
+        parsed, attempts = self.connection.execute("SELECT parsed, attempts FROM run WHERE run_key = ?",
+                (run_key,)).fetchone()
+        if attempts > 1:
+            logger.info("Resuming run {} (attempt {})".format(run_key, attempts),
+                    extra={'event': 'journal_resumed', 'parsed': bool(parsed), 'attempt': attempts,
+                           'failed': self.count_failed()})
+        return bool(parsed)
+
+    def mark_parsed(self):
+        """
+        Record that every series of the run has been journaled.
+        """
+        with self.connection:
+            self.connection.execute("UPDATE run SET parsed = 1, updated = ? WHERE run_key = ?", (_now(), self.run_key))
+
+    def record(self, series):
+        """
+        Journal a parsed series, or find it if an earlier attempt of the run journaled it.
+        :param series: flo2d.sinks.Series
+        :return: (series with its journal_id set, set of the keys of the sinks that committed it)
+        """
+        first_time = format_time(series.timeseries[0][0]) if series.timeseries else ''
+        series_key = '|'.join([str(series.meta.get(field)) for field in SERIES_KEY_FIELDS] +
+                              [str(series.element), first_time])
+        row = self.connection.execute("SELECT id FROM series WHERE run_key = ? AND series_key = ?",
+                (self.run_key, series_key)).fetchone()
+        if row is not None:
+            journal_id = row[0]
+            committed = set(sink for sink, in self.connection.execute(
+                    "SELECT sink FROM commit_status WHERE series_id = ? AND status = ?", (journal_id, COMMITTED)))
+        else:
+            with self.connection:
+                journal_id = self.connection.execute(
+                        "INSERT INTO series (run_key, series_key, element, meta, timeseries, fgt) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (self.run_key, series_key, str(series.element), json.dumps(series.meta),
+                         json.dumps([[format_time(t), v] for t, v in series.timeseries]), series.fgt)).lastrowid
+            committed = set()
+        return series._replace(journal_id=journal_id), committed
+
+    def pending(self, sink):
+        """
+        :param sink: sink key
+        :return: list of the journaled Series of the run the sink has not committed
+        """
+        rows = self.connection.execute(
+                "SELECT s.id, s.element, s.meta, s.timeseries, s.fgt FROM series s "
+                "LEFT JOIN commit_status c ON c.series_id = s.id AND c.sink = ? "
+                "WHERE s.run_key = ? AND (c.status IS NULL OR c.status != ?) ORDER BY s.id",
+                (sink, self.run_key, COMMITTED)).fetchall()
+        return [Series(element, json.loads(meta), json.loads(timeseries), fgt, journal_id)
+                for journal_id, element, meta, timeseries, fgt in rows]
+
+    def spilled(self, sink, max_age_hours=DEFAULT_MAX_AGE_HOURS):
+        """
+        :param sink: sink key
+        :param max_age_hours: hours since an earlier run was last updated within which its series are resent
+        :return: list of the journaled Series of the earlier, finished but incomplete, runs the sink has
+        not committed, oldest first
+        """
+        rows = self.connection.execute(
+                "SELECT s.id, s.element, s.meta, s.timeseries, s.fgt FROM series s "
+                "JOIN run r ON r.run_key = s.run_key "
+                "LEFT JOIN commit_status c ON c.series_id = s.id AND c.sink = ? "
+                "WHERE r.run_key IS NOT ? AND r.status = ? AND r.updated >= ? AND (c.status IS NULL OR c.status != ?) "
+                "ORDER BY s.id", (sink, self.run_key, 'incomplete', _cutoff(max_age_hours), COMMITTED)).fetchall()
+        return [Series(element, json.loads(meta), json.loads(timeseries), fgt, journal_id)
+                for journal_id, element, meta, timeseries, fgt in rows]
+
+    def expire(self, max_age_hours=DEFAULT_MAX_AGE_HOURS):
+        """
+        Drop the earlier runs not updated for max_age_hours, with the series they still had pending.
+        :return: number of runs dropped
+        """
+        expired = [run_key for run_key, in self.connection.execute(
+                "SELECT run_key FROM run WHERE run_key IS NOT ? AND updated < ?", (self.run_key, _cutoff(max_age_hours)))]
+        for run_key in expired:
+            series = self.connection.execute("SELECT COUNT(*) FROM series WHERE run_key = ?", (run_key,)).fetchone()[0]
+            logger.warning("Dropping run {} from the journal after {}h, {} series unsent".format(run_key,
+                    max_age_hours, series), extra={'event': 'journal_expired', 'series': series})
+            self._drop(run_key)
+        return len(expired)
+
+    def settle(self, sinks):
+        """
+        Drop the earlier, finished, runs whose every series the given sinks committed, e.g. once
+        spilled() series were resent.
+        :param sinks: keys of the sinks the spilled series were resent to
+        :return: number of runs dropped
+        """
+        settled = [run_key for run_key, in self.connection.execute(
+                "SELECT run_key FROM run WHERE run_key IS NOT ? AND status = ?", (self.run_key, 'incomplete'))
+                   if self._pending(run_key, sinks)==0]
+        for run_key in settled:
+            self._drop(run_key)
+        if settled:
+            logger.info("Settled {} earlier runs of the journal".format(len(settled)),
+                    extra={'event': 'journal_settled', 'runs': len(settled)})
+        return len(settled)
+
+    def count_failed(self):
+        """
+        :return: number of (series, sink) pairs of the run a sink gave up on
+        """
+        return self.connection.execute(
+                "SELECT COUNT(*) FROM commit_status c JOIN series s ON s.id = c.series_id "
+                "WHERE s.run_key = ? AND c.status != ?", (self.run_key, COMMITTED)).fetchone()[0]
+
+    def written(self, sink, batch):
+        """
+        Sink listener: the sink committed the batch.
+        """
+        self._set_status(sink, batch, COMMITTED, None)
+
+    def failed(self, sink, batch, error):
+        """
+        Sink listener: the sink gave up on the batch.
+        """
+        self._set_status(sink, batch, FAILED, repr(error))
+
+    def _set_status(self, sink, batch, status, error):
+        now = _now()
+        rows = [(series.journal_id, sink.key, status, error, now) for series in batch if series.journal_id is not None]
+        with self.connection:
+            self.connection.executemany(
+                    "INSERT INTO commit_status (series_id, sink, status, error, updated) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (series_id, sink) DO UPDATE SET status = excluded.status, "
+                    "attempts = attempts + 1, error = excluded.error, updated = excluded.updated", rows)
+
+    def station_status(self):
+        """
+        :return: dict of element -> {sink key: status} of the run
+        """
+        status = {}
+        for element, sink, sink_status in self.connection.execute(
+                "SELECT s.element, c.sink, c.status FROM series s JOIN commit_status c ON c.series_id = s.id "
+                "WHERE s.run_key = ? ORDER BY s.id", (self.run_key,)):
+            # A station is only committed for a sink once every series (window) of it is
+            if status.setdefault(element, {}).get(sink)!=FAILED:
+                status[element][sink] = sink_status
+        return status
+
+    def finish(self, sinks):
+        """
+        Close the run: 'ok' if the run was parsed in full and every sink committed every series, the
+        run is then dropped so the key runs afresh next time, else 'incomplete', kept for a retry and
+        for later runs to resend.
+        :param sinks: keys of the sinks of the run
+        :return: run status
+        """
+        pending = self._pending(self.run_key, sinks)
+        parsed = self.connection.execute("SELECT parsed FROM run WHERE run_key = ?", (self.run_key,)).fetchone()[0]
+        # A run that died while parsing keeps its payload even if nothing is pending, the series
+        # journaled so far let the next attempt skip what the sinks already committed
+        status = 'ok' if parsed and pending==0 else 'incomplete'
+        if status=='ok':
+            self._drop(self.run_key)
+        else:
+            with self.connection:
+                self.connection.execute("UPDATE run SET status = ?, updated = ? WHERE run_key = ?",
+                        (status, _now(), self.run_key))
+        failed = [element for element, sinks_status in self.station_status().items()
+                  if FAILED in sinks_status.values()] if status!='ok' else []
+        logger.info("Run {} journaled as {}".format(self.run_key, status),
+                extra={'event': 'journal_finished', 'status': status, 'pending': pending,
+                       'failed_stations': failed[:100]})
+        return status
+
+    def _pending(self, run_key, sinks):
+        pending = 0
+        for sink in sinks:
+            pending += self.connection.execute(
+                    "SELECT COUNT(*) FROM series s LEFT JOIN commit_status c ON c.series_id = s.id AND c.sink = ? "
+                    "WHERE s.run_key = ? AND (c.status IS NULL OR c.status != ?)",
+                    (sink, run_key, COMMITTED)).fetchone()[0]
+        return pending
+
+    def _drop(self, run_key):
+        with self.connection:
+            self.connection.execute("DELETE FROM commit_status WHERE series_id IN "
+                                    "(SELECT id FROM series WHERE run_key = ?)", (run_key,))
+            self.connection.execute("DELETE FROM series WHERE run_key = ?", (run_key,))
+            self.connection.execute("DELETE FROM run WHERE run_key = ?", (run_key,))
+
+    def close(self):
+        self.connection.close()
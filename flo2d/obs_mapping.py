@@ -0,0 +1,147 @@
+"""
+Mapping of observation stations (water level gauges) to the FLO2D_250 and FLO2D_150 grid cells.
+
+Every station is resolved to its nearest cell of each model in one batch (flo2d.spatial), with
+the next nearest cells and the distances kept as diagnostics. Stations farther than a cell from
+their nearest cell are probably outside the model domain and are left out of the cell maps.
+"""
+import csv
+import json
+import logging
+import os
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from .spatial import load_grid_index
+
+logger = logging.getLogger(__name__)
+
+# Model -> (grid CSV, cell size in metres)
+MODELS = OrderedDict([
+        ('FLO2D_250', ('flo2d_250m.csv', 250)),
+        ('FLO2D_150', ('flo2d_150m.csv', 150))
+        ])
+
+ObsStation = namedtuple('ObsStation', ['id', 'name', 'latitude', 'longitude'])
+
+# Diagnostics of the cell of a station in a model
+CellMatch = namedtuple('CellMatch', ['station', 'model', 'grid_id', 'distance', 'alternatives', 'status'])
+
+MAPPED = 'mapped'
+OUTSIDE = 'outside'
+SHARED = 'shared_cell'
+
+DIAGNOSTIC_COLUMNS = ['station_id', 'station', 'latitude', 'longitude', 'model', 'grid_id', 'distance_m',
+                      'alternatives', 'status']
+
+
+def read_station_file(path):
+    """
+    :param path: CSV of the stations, with a header and name, latitude and longitude columns, and
+    optionally id
+    :return: list of ObsStation
+    """
+    with open(path) as f:
+        return [ObsStation(row.get('id') or None, row['name'], float(row['latitude']), float(row['longitude']))
+                for row in csv.DictReader(f)]
+
+
+def fetch_obs_stations(pool, station_type):
+    """
+    Fetch the stations of a station type from curw_obs, in one query.
+    :param pool: curw_obs connection pool
+    :param station_type: db_adapter.curw_obs StationEnum member, its ids are within the curw_obs range of
+    the type (StationEnum.getRange)
+    :return: list of ObsStation
+    """
+    first_id = station_type.value
+    end_id = first_id + type(station_type).getRange(station_type)
+    connection = pool.connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT `id`, `name`, `latitude`, `longitude` FROM `station` WHERE `id` >= %s AND `id` < %s "
+                           "ORDER BY `id`", (first_id, end_id))
+            return [ObsStation(id_, name, float(latitude), float(longitude))
+                    for id_, name, latitude, longitude in cursor.fetchall()]
+    finally:
+        connection.close()
+
+
+def map_stations(stations, grid_dir, max_distance=1.0, alternatives=3):
+    """
+    :param stations: list of ObsStation
+    :param grid_dir: directory of the model grid CSVs, flo2d_250m.csv and flo2d_150m.csv
+    :param max_distance: distance, in cell sizes, beyond which a station is considered outside a model
+    :param alternatives: number of next nearest cells kept as diagnostics
+    :return: dict of model -> list of CellMatch, in the order of the stations
+    """
+    lons = np.array([station.longitude for station in stations])
+    lats = np.array([station.latitude for station in stations])
+    matches = OrderedDict()
+    for model, (grid_csv, cell_size) in MODELS.items():
+        index = load_grid_index(os.path.join(grid_dir, grid_csv))
+        # The nearest cell of every station and the next nearest ones, in one batch
+        nearest, nearest_distances = index.k_nearest_many(lons, lats, alternatives + 1)
+        grid_ids, distances = nearest[:, 0], nearest_distances[:, 0]
+        owners = {}
+        model_matches = []
+        for i, station in enumerate(stations):
+            grid_id = int(grid_ids[i])
+            if distances[i] > max_distance * cell_size:
+                status = OUTSIDE
+            elif grid_id in owners:
+                status = SHARED
+            else:
+                owners[grid_id] = station
+                status = MAPPED
+            model_matches.append(CellMatch(station, model, grid_id, float(distances[i]),
+                    [(int(other), round(float(distance), 1))
+                     for other, distance in zip(nearest[i, 1:], nearest_distances[i, 1:]) if other >= 0], status))
+        matches[model] = model_matches
+        logger.info("{}: {} of {} stations mapped".format(model, len(owners), len(stations)),
+                extra={'event': 'obs_stations_mapped', 'model': model, 'mapped': len(owners),
+                       'outside': [match.station.name for match in model_matches if match.status==OUTSIDE][:100],
+                       'shared': [match.station.name for match in model_matches if match.status==SHARED][:100]})
+    return matches
+
+
+def cell_map(matches):
+    """
+    :param matches: list of CellMatch of a model
+    :return: dict with the CHANNEL_CELL_MAP (grid id -> station name) of the mapped stations, and an
+    empty FLOOD_PLAIN_CELL_MAP, the layout of the model parameter files read by init.py
+    """
+    channel_cell_map = OrderedDict((str(match.grid_id), match.station.name)
+                                   for match in sorted(matches, key=lambda match: match.grid_id)
+                                   if match.status==MAPPED)
+    return OrderedDict([('CHANNEL_CELL_MAP', channel_cell_map), ('FLOOD_PLAIN_CELL_MAP', {})])
+
+
+def write_mapping(matches, output_dir, prefix='obs_water_level'):
+    """
+    Write the candidate cell map of each model, <prefix>_<version>.json, and the diagnostics of every
+    station, <prefix>_diagnostics.csv.
+    :param matches: dict of model -> list of CellMatch, from map_stations()
+    :return: list of the files written
+    """
+    files = []
+    for model, model_matches in matches.items():
+        file_path = os.path.join(output_dir, '{}_{}.json'.format(prefix, model.split('_')[-1]))
+        with open(file_path, 'w') as f:
+            f.write(json.dumps(cell_map(model_matches), indent=2))
+        files.append(file_path)
+
+    file_path = os.path.join(output_dir, '{}_diagnostics.csv'.format(prefix))
+    with open(file_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(DIAGNOSTIC_COLUMNS)
+        for model_matches in matches.values():
+            for match in model_matches:
+                station = match.station
+                writer.writerow([station.id, station.name, station.latitude, station.longitude, match.model,
+                                 match.grid_id, round(match.distance, 1),
+                                 ' '.join('{}:{}'.format(grid_id, distance) for grid_id, distance in match.alternatives),
+                                 match.status])
+    files.append(file_path)
+    return files
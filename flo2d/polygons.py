@@ -0,0 +1,227 @@
+"""
+Flood depth series aggregated over polygons, e.g. administrative areas, from TIMDEP.OUT.
+
+The cells of the model grid (flo2d_250m.csv / flo2d_150m.csv) falling in each polygon of a GeoJSON
+file are found once and cached in a .npz file next to the GeoJSON, as a membership table of
+(cell position, polygon) pairs sorted by polygon. Every timestep block is then reduced to the mean
+and maximum depth of each polygon with one np.bincount and one np.maximum.reduceat over the
+membership table, whatever the number of polygons.
+"""
+import csv
+import json
+import logging
+import os
+from datetime import timedelta
+
+import numpy as np
+
+from .flood_map import read_grid
+from .timdep import TIMDEP_CELL_COLUMN, TIMDEP_DEPTH_COLUMN
+
+logger = logging.getLogger(__name__)
+
+# Cache arrays; the sizes and modification times of the GeoJSON and the grid CSV tell whether a cache is stale
+CACHE_ARRAYS = ('names', 'cells', 'polygons', 'source')
+
+
+def read_polygons(geojson_path, name_property='name'):
+    """
+    Read the Polygon and MultiPolygon features of a GeoJSON file, in lon/lat.
+    :param geojson_path: GeoJSON file path
+    :param name_property: feature property naming the polygon, the feature position if missing
+    :return: list of (name, list of polygons, each a list of rings, the first one the outer ring,
+    each an (n, 2) array of lon/lat)
+    """
+    with open(geojson_path) as f:
+        collection = json.loads(f.read())
+    features = collection['features'] if collection.get('type')=='FeatureCollection' else [collection]
+    polygons = []
+    for position, feature in enumerate(features):
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type')=='Polygon':
+            parts = [geometry['coordinates']]
+        elif geometry.get('type')=='MultiPolygon':
+            parts = geometry['coordinates']
+        else:
+            logger.warning("Skipping feature {} of {}, not a polygon".format(position, geojson_path))
+            continue
+        name = (feature.get('properties') or {}).get(name_property)
+        polygons.append((str(name if name is not None else position),
+                         [[np.asarray(ring, dtype=np.float64)[:, :2] for ring in part] for part in parts]))
+    return polygons
+
+
+def points_in_ring(x, y, ring):
+    """
+    Even-odd ray casting of points against one ring.
+    :param x: array of point longitudes
+    :param y: array of point latitudes
+    :param ring: (n, 2) array of the ring vertices, closed or not
+    :return: boolean array, True for the points inside the ring
+    """
+    inside = np.zeros(len(x), dtype=bool)
+    x1, y1 = ring[:, 0], ring[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    for i in range(len(ring)):
+        crosses = (y1[i] > y)!=(y2[i] > y)
+        if not crosses.any():
+            continue
+        x_cross = x1[i] + (y[crosses] - y1[i]) * (x2[i] - x1[i]) / (y2[i] - y1[i])
+        inside[crosses] ^= x[crosses] < x_cross
+    return inside
+
+
+def build_membership(x, y, polygons):
+    """
+    :param x: array of cell longitudes, in grid CSV order
+    :param y: array of cell latitudes, in grid CSV order
+    :param polygons: polygons as returned by read_polygons()
+    :return: (cell position array, polygon position array) of the cells inside each polygon,
+    sorted by polygon; a cell of overlapping polygons is a member of each
+    """
+    cells = []
+    members = []
+    for position, (_, parts) in enumerate(polygons):
+        inside = np.zeros(len(x), dtype=bool)
+        for rings in parts:
+            outer = rings[0]
+            candidates = np.flatnonzero((x >= outer[:, 0].min()) & (x <= outer[:, 0].max()) &
+                                        (y >= outer[:, 1].min()) & (y <= outer[:, 1].max()))
+            in_part = points_in_ring(x[candidates], y[candidates], outer)
+            for hole in rings[1:]:
+                in_part &= ~points_in_ring(x[candidates], y[candidates], hole)
+            inside[candidates[in_part]] = True
+        in_polygon = np.flatnonzero(inside)
+        cells.append(in_polygon)
+        members.append(np.full(len(in_polygon), position, dtype=np.int64))
+    if not cells:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(cells).astype(np.int64), np.concatenate(members)
+
+
+def _source_stamp(*paths):
+    return np.array([value for path in paths for value in (os.stat(path).st_size, os.stat(path).st_mtime)])
+
+
+def load_membership(geojson_path, grid_csv_path, name_property='name', cache_path=None):
+    """
+    Load the polygon membership of the grid cells from its cache, building (and caching) it if the
+    cache is missing or older than the GeoJSON or the grid CSV.
+    :param geojson_path: GeoJSON file of the polygons
+    :param grid_csv_path: grid CSV, Grid_ID,X,Y
+    :param name_property: feature property naming the polygons
+    :param cache_path: .npz cache file, by default next to the GeoJSON, e.g. areas.flo2d_250m.membership.npz
+    :return: (grid ids, polygon names, cell position array, polygon position array)
+    """
+    if cache_path is None:
+        cache_path = '{}.{}.membership.npz'.format(os.path.splitext(geojson_path)[0],
+                os.path.splitext(os.path.basename(grid_csv_path))[0])
+    source = _source_stamp(geojson_path, grid_csv_path)
+    grid_ids, x, y = read_grid(grid_csv_path)
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as arrays:
+                if np.array_equal(arrays['source'], source) and str(arrays['name_property'])==name_property:
+                    return grid_ids, arrays['names'].tolist(), arrays['cells'], arrays['polygons']
+        except Exception:
+            logger.warning("Ignoring unreadable polygon membership cache {}".format(cache_path), exc_info=True)
+
+    polygons = read_polygons(geojson_path, name_property)
+    cells, members = build_membership(x, y, polygons)
+    names = [name for name, _ in polygons]
+    try:
+        with open(cache_path, 'wb') as f:
+            np.savez(f, source=source, name_property=np.array(name_property), names=np.array(names, dtype=str),
+                    cells=cells, polygons=members)
+    except OSError:
+        logger.warning("Could not cache the polygon membership in {}".format(cache_path), exc_info=True)
+    logger.info("Built the membership of {} grid cells in {} polygons".format(len(cells), len(names)),
+            extra={'event': 'polygon_membership_built', 'polygons': len(names), 'cells': len(cells)})
+    return grid_ids, names, cells, members
+
+
+class PolygonDepths(object):
+    """
+    Mean and maximum depth of each polygon over the timestep blocks of a TIMDEP.OUT file.
+    """
+
+    def __init__(self, grid_ids, names, cells, polygons):
+        """
+        :param grid_ids: Grid_IDs of the model grid, in grid CSV order
+        :param names: polygon names
+        :param cells: grid CSV positions of the member cells, sorted by polygon
+        :param polygons: polygon positions of the member cells
+        """
+        self.grid_ids = np.asarray(grid_ids, dtype=np.int64)
+        self.names = list(names)
+        self.cells = np.asarray(cells, dtype=np.int64)
+        self.polygons = np.asarray(polygons, dtype=np.int64)
+        self.cell_counts = np.bincount(self.polygons, minlength=len(self.names))
+        # Start of the members of each polygon with cells, for the reduceat
+        self.occupied = np.flatnonzero(self.cell_counts)
+        self.starts = np.concatenate(([0], np.cumsum(self.cell_counts)[:-1]))[self.occupied]
+        self.model_times = []
+        self.mean_depth = []
+        self.max_depth = []
+
+        self._position_of = np.full(self.grid_ids.max() + 1 if len(self.grid_ids) else 1, -1, dtype=np.int64)
+        self._position_of[self.grid_ids] = np.arange(len(self.grid_ids))
+        self._block_cells = None
+        self._member_rows = None
+
+    def _rows(self, block_cells):
+        # Blocks list the cells in the same order every timestep, reuse the last mapping
+        if self._block_cells is not None and np.array_equal(block_cells, self._block_cells):
+            return self._member_rows
+        row_of = np.full(len(self.grid_ids), -1, dtype=np.int64)
+        positions = self._position_of[block_cells]
+        if (positions < 0).any():
+            raise ValueError("TIMDEP.OUT has cells that are not in the model grid")
+        row_of[positions] = np.arange(len(block_cells))
+        self._block_cells = block_cells
+        # Block row of each member cell, -1 for the cells the block does not have
+        self._member_rows = row_of[self.cells]
+        return self._member_rows
+
+    def update(self, model_time, block):
+        """
+        Reduce one timestep to the depths of the polygons.
+        :param model_time: model time of the block in hours
+        :param block: block array, as returned by flo2d.flood_map.parse_timdep_block()
+        """
+        rows = self._rows(block[:, TIMDEP_CELL_COLUMN].astype(np.int64))
+        depth = np.append(block[:, TIMDEP_DEPTH_COLUMN], np.nan)[rows]
+        # Cells missing from the block or without a depth are left out of their polygon
+        valid = ~np.isnan(depth)
+        depth = np.where(valid, depth, 0.0)
+        totals = np.bincount(self.polygons, weights=depth, minlength=len(self.names))
+        counts = np.bincount(self.polygons, weights=valid, minlength=len(self.names))
+        maximum = np.full(len(self.names), np.nan)
+        if len(self.occupied):
+            maximum[self.occupied] = np.maximum.reduceat(np.where(valid, depth, -np.inf), self.starts)
+        maximum[np.isinf(maximum)] = np.nan
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.mean_depth.append(totals / counts)
+        self.max_depth.append(maximum)
+        self.model_times.append(model_time)
+
+
+def write_polygon_depths_csv(file_path, polygon_depths, base_time):
+    """
+    Write the polygon depth series as one row per timestep and polygon; polygons without cells of
+    the grid have empty depths.
+    :param file_path: output CSV file path
+    :param polygon_depths: PolygonDepths instance
+    :param base_time: datetime of model time 0
+    """
+    with open(file_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Time', 'ModelTime', 'Polygon', 'Cells', 'MeanDepth', 'MaxDepth'])
+        cell_counts = polygon_depths.cell_counts.tolist()
+        for model_time, means, maxima in zip(polygon_depths.model_times, polygon_depths.mean_depth,
+                                             polygon_depths.max_depth):
+            time_ = (base_time + timedelta(hours=model_time)).strftime('%Y-%m-%d %H:%M:%S')
+            for name, cells, mean, maximum in zip(polygon_depths.names, cell_counts, np.round(means, 3).tolist(),
+                                                  maxima.tolist()):
+                writer.writerow([time_, model_time, name, cells, '' if mean!=mean else mean,
+                                 '' if maximum!=maximum else maximum])
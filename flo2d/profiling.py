@@ -0,0 +1,86 @@
+"""
+Opt-in profiling of extraction runs.
+
+Set FLO2D_PUSHER_PROFILE=1 in the environment of the runner to profile every call of a function
+decorated with @profiled. The cProfile dump (<name>_<time>.prof, for snakeviz / pstats) and a
+summary of the top hot functions (<name>_<time>_top.txt) are written to the run's output
+directory. FLO2D_PUSHER_PROFILE_TOP sets the number of functions listed (30 by default).
+When the variable is not set the decorated function is called straight away.
+"""
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV = 'FLO2D_PUSHER_PROFILE'
+PROFILE_TOP_ENV = 'FLO2D_PUSHER_PROFILE_TOP'
+DEFAULT_TOP = 30
+
+
+def is_enabled():
+    return os.environ.get(PROFILE_ENV, '').lower() not in ('', '0', 'false', 'no')
+
+
+def start_profiler():
+    """
+    :return: an enabled cProfile.Profile
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def dump_profile(profiler, output_dir, name, top=None):
+    """
+    Stop a profiler and write its dump and a top-N hot function summary to output_dir.
+    :param profiler: profiler returned by start_profiler()
+    :param output_dir: directory to write the files to
+    :param name: prefix of the file names
+    :param top: number of functions to list, FLO2D_PUSHER_PROFILE_TOP or 30 by default
+    :return: (dump file path, summary file path)
+    """
+    profiler.disable()
+    if top is None:
+        top = int(os.environ.get(PROFILE_TOP_ENV, DEFAULT_TOP))
+
+    prefix = os.path.join(output_dir, '{}_{}'.format(name, datetime.now().strftime('%Y%m%d_%H%M%S')))
+    dump_path = prefix + '.prof'
+    summary_path = prefix + '_top.txt'
+    profiler.dump_stats(dump_path)
+
+    summary = io.StringIO()
+    for sort_key in ('cumulative', 'tottime'):
+        summary.write('Top {} functions by {}\n'.format(top, sort_key))
+        pstats.Stats(profiler, stream=summary).sort_stats(sort_key).print_stats(top)
+    with open(summary_path, 'w') as f:
+        f.write(summary.getvalue())
+
+    logger.info("Profile written to {} and {}".format(dump_path, summary_path))
+    return dump_path, summary_path
+
+
+def profiled(function):
+    """
+    Profile calls of function(dir_path, ...) when FLO2D_PUSHER_PROFILE is set, writing the
+    profile to dir_path.
+    """
+    @functools.wraps(function)
+    def wrapper(dir_path, *args, **kwargs):
+        if not is_enabled():
+            return function(dir_path, *args, **kwargs)
+
+        profiler = start_profiler()
+        try:
+            return function(dir_path, *args, **kwargs)
+        finally:
+            try:
+                dump_profile(profiler, dir_path, function.__name__)
+            except Exception:
+                logger.exception("Unable to write profile")
+
+    return wrapper
@@ -0,0 +1,234 @@
+"""
+Prometheus metrics for the pusher.
+
+Every run is a separate process, so histogram and counter values are carried between runs in a
+small JSON state file kept next to the textfile. Runs updating it at the same time, e.g. the water
+level and discharge runs, take turns on a lock file next to it. After each run the textfile is
+rewritten atomically, ready for the node_exporter textfile collector, or it can be served over HTTP with
+
+    python -m flo2d.prometheus -f /var/lib/node_exporter/textfile/flo2d_pusher.prom -p 9101
+"""
+import fcntl
+import getopt
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from .hychan import HYCHAN_PARSE_STAGE
+from .timdep import TIMDEP_PARSE_STAGE
+
+# stages the engine reads and parses the FLO2D output files under
+PARSE_STAGES = (HYCHAN_PARSE_STAGE, TIMDEP_PARSE_STAGE)
+
+LABELS = ('run', 'model', 'version', 'sim_tag', 'variable')
+
+METRICS = OrderedDict([
+        ('flo2d_pusher_run_duration_seconds',
+         ('histogram', 'Wall time of a pusher run.', (30, 60, 120, 300, 600, 900, 1800, 3600))),
+        ('flo2d_pusher_station_upload_seconds',
+         ('histogram', 'Time spent writing one station\'s series in a run.', (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))),
+        ('flo2d_pusher_parse_throughput_bytes_per_second',
+         ('histogram', 'FLO2D output parse throughput of a run.', tuple(mb * 1048576 for mb in (1, 2, 5, 10, 20, 50, 100, 200)))),
+        ('flo2d_pusher_rows_pushed_total',
+         ('counter', 'Timeseries rows written.', None)),
+        ('flo2d_pusher_failures_total',
+         ('counter', 'Failed runs (kind="run") and failed station writes (kind="station").', None)),
+        ('flo2d_pusher_last_run_timestamp_seconds',
+         ('gauge', 'Unix time the last run finished.', None))
+        ])
+
+
+def _series_key(labels):
+    return json.dumps(labels, sort_keys=True)
+
+
+class MetricsState(object):
+    """
+    Metric values carried between runs.
+    """
+
+    def __init__(self, state=None):
+        self.state = state if state is not None else {}
+
+    def _series(self, name, labels, initial):
+        return self.state.setdefault(name, {}).setdefault(_series_key(labels), initial)
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        series = self._series(name, labels, {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0})
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                series['buckets'][i] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+    def inc(self, name, labels, amount=1):
+        series = self._series(name, labels, {'value': 0})
+        series['value'] += amount
+
+    def set(self, name, labels, value):
+        self._series(name, labels, {'value': 0})['value'] = value
+
+    def render(self):
+        """
+        :return: metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for name, (metric_type, help_text, buckets) in METRICS.items():
+            if name not in self.state:
+                continue
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(name, metric_type))
+            for key, series in sorted(self.state[name].items()):
+                labels = json.loads(key)
+                if metric_type=='histogram':
+                    for bound, count in zip(buckets, series['buckets']):
+                        lines.append('{}_bucket{} {}'.format(name, _format_labels(labels, le=_format_value(bound)), count))
+                    lines.append('{}_bucket{} {}'.format(name, _format_labels(labels, le='+Inf'), series['count']))
+                    lines.append('{}_sum{} {}'.format(name, _format_labels(labels), _format_value(series['sum'])))
+                    lines.append('{}_count{} {}'.format(name, _format_labels(labels), series['count']))
+                else:
+                    lines.append('{}{} {}'.format(name, _format_labels(labels), _format_value(series['value'])))
+        return '\n'.join(lines) + '\n'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                          for k, v in sorted(labels.items())) + '}'
+
+
+def record_run(state, summary, finished):
+    """
+    Fold a run summary (flo2d.instrumentation.RunMetrics.summary()) into the metric state.
+    :param state: MetricsState instance
+    :param summary: run summary dict
+    :param finished: unix time the run finished
+    """
+    labels = {'run': summary['run']}
+    labels.update((k, v) for k, v in summary['labels'].items() if k in LABELS)
+
+    state.observe('flo2d_pusher_run_duration_seconds', labels, summary['totals']['wall_time'])
+    for station, counters in summary['stations'].items():
+        if counters['db_round_trips']:
+            state.observe('flo2d_pusher_station_upload_seconds', labels, counters['wall_time'])
+
+    bytes_read = sum(summary['stages'][stage]['bytes_read'] for stage in PARSE_STAGES if stage in summary['stages'])
+    parse_time = sum(summary['stages'][stage]['wall_time'] for stage in PARSE_STAGES if stage in summary['stages'])
+    if bytes_read and parse_time:
+        state.observe('flo2d_pusher_parse_throughput_bytes_per_second', labels, bytes_read / parse_time)
+
+    state.inc('flo2d_pusher_rows_pushed_total', labels, summary['totals']['rows_written'])
+    state.inc('flo2d_pusher_failures_total', dict(labels, kind='station'), summary['totals']['failures'])
+    state.inc('flo2d_pusher_failures_total', dict(labels, kind='run'), 0 if summary['status']=='ok' else 1)
+    state.set('flo2d_pusher_last_run_timestamp_seconds', labels, finished)
+
+
+def export_run_metrics(textfile_path, summary, finished=None):
+    """
+    Record a run in the metric state kept next to textfile_path and rewrite the textfile.
+    :param textfile_path: Prometheus textfile, e.g. /var/lib/node_exporter/textfile/flo2d_pusher.prom
+    :param summary: run summary dict
+    :param finished: unix time the run finished, now by default
+    """
+    state_path = textfile_path + '.state.json'
+    # The state file itself is replaced on every write, so the lock is held on a file of its own
+    with open(state_path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            state = MetricsState()
+            if os.path.exists(state_path):
+                with open(state_path) as f:
+                    state = MetricsState(json.loads(f.read()))
+
+            record_run(state, summary, finished if finished is not None else time.time())
+
+            for path, content in ((state_path, json.dumps(state.state)), (textfile_path, state.render())):
+                _replace(path, content)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _replace(path, content):
+    # write a temporary file of this process and rename it, so the collector never reads a half
+    # written file
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+            dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def serve(textfile_path, port):
+    """
+    Serve the textfile on http://0.0.0.0:<port>/metrics.
+    """
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            content = b''
+            if os.path.exists(textfile_path):
+                with open(textfile_path, 'rb') as f:
+                    content = f.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    HTTPServer(('', port), Handler).serve_forever()
+
+
+def usage():
+    usageText = """
+    Usage: python -m flo2d.prometheus -f TEXTFILE [-p PORT]
+
+    -h  --help          Show usage
+    -f  --file          Prometheus textfile written by the pusher runs.
+    -p  --port          Port to serve /metrics on. Default 9101.
+    """
+    print(usageText)
+
+
+if __name__=="__main__":
+    textfile_path = None
+    port = 9101
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hf:p:", ["help", "file=", "port="])
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            usage()
+            sys.exit()
+        elif opt in ("-f", "--file"):
+            textfile_path = arg.strip()
+        elif opt in ("-p", "--port"):
+            port = int(arg)
+    if textfile_path is None:
+        usage()
+        sys.exit(1)
+    serve(textfile_path, port)
@@ -0,0 +1,126 @@
+"""
+Resampling of the extracted series to a regular time grid, e.g. every 15 minutes on the quarter
+hour, by linear interpolation or by carrying the last value forward, chosen per variable.
+
+Series are buffered and resampled in batches: the series of a batch sharing the same output times,
+e.g. the hydrographs of every HYCHAN.OUT element, are stacked into one (station, time) matrix and
+interpolated in a single NumPy operation. The flood plain series arrive in time windows; the last
+sample of each station is carried into its next window so the grid is filled across windows too.
+
+Missing samples (MISSING_VALUE) are masked, not interpolated: a grid time next to a missing sample,
+other than one falling on a sample, is written out as missing.
+"""
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from .timeseries import MISSING_VALUE
+
+logger = logging.getLogger(__name__)
+
+LINEAR = 'linear'
+LAST = 'last'
+METHODS = (LINEAR, LAST)
+
+
+def resample_matrix(times, values, grid, method):
+    """
+    :param times: int64 array of the output times of the series, in seconds, increasing
+    :param values: (station, time) float array, NaN where a sample is missing
+    :param grid: int64 array of the grid times, in seconds, within times[0] and times[-1]
+    :param method: 'linear' or 'last'
+    :return: (station, grid time) float array, NaN where interpolated from a missing sample
+    """
+    after = np.searchsorted(times, grid, side='right') - 1
+    if method==LAST or len(times)==1:
+        return values[:, after]
+    before = np.clip(after, 0, len(times) - 2)
+    weight = (grid - times[before]) / (times[before + 1] - times[before])
+    matrix = values[:, before] + (values[:, before + 1] - values[:, before]) * weight
+    # Grid times on a sample take it as is, whether its neighbour is missing or not
+    on_sample = weight==0
+    matrix[:, on_sample] = values[:, before[on_sample]]
+    on_sample = weight==1
+    matrix[:, on_sample] = values[:, before[on_sample] + 1]
+    return matrix
+
+
+class Resampler(object):
+    """
+    Sits between the parsing of a FLO2D output file and save_series(spec, element, timeseries),
+    handing over resampled series instead.
+    """
+
+    def __init__(self, save_series, step_minutes=15, methods=None, default_method=LINEAR, decimals=3, batch_size=256):
+        """
+        :param save_series: function(spec, element number, timeseries) the resampled series are pushed to
+        :param step_minutes: grid step, the grid is aligned on multiples of it since midnight
+        :param methods: dict of variable -> 'linear' or 'last'
+        :param default_method: method of the variables not in methods
+        :param decimals: decimals the resampled values are rounded to, FLO2D writes 3
+        :param batch_size: series buffered before resampling them together
+        """
+        methods = dict(methods or {})
+        for method in list(methods.values()) + [default_method]:
+            if method not in METHODS:
+                raise ValueError("Unknown resampling method {}. Should be one of {}".format(method, ', '.join(METHODS)))
+        self.save_series = save_series
+        self.step = int(step_minutes * 60)
+        self.methods = methods
+        self.default_method = default_method
+        self.decimals = decimals
+        self.batch_size = batch_size
+        self.batch = []
+        # (spec id, element) -> (time, value) of the last sample handed over, for the next window
+        self.carried = {}
+        self.series_resampled = 0
+
+    def __call__(self, spec, elementNo, timeseries):
+        """
+        Buffer a series, with the save_series signature.
+        """
+        if timeseries:
+            self.batch.append((spec, elementNo, timeseries))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Resample the buffered series and push them.
+        """
+        batch, self.batch = self.batch, []
+        # (spec id, output times) -> list of (spec, element, value array)
+        groups = OrderedDict()
+        for spec, elementNo, timeseries in batch:
+            times = np.array([time_ for time_, _ in timeseries], dtype='datetime64[s]').astype(np.int64)
+            values = np.array([value for _, value in timeseries], dtype=np.float64)
+            values[values==MISSING_VALUE] = np.nan
+            carried = self.carried.get((id(spec), elementNo))
+            if carried is not None:
+                times = np.concatenate(([carried[0]], times))
+                values = np.concatenate(([carried[1]], values))
+            # A repeated output time keeps its last value
+            unique = np.r_[times[1:]!=times[:-1], True]
+            if not unique.all():
+                times, values = times[unique], values[unique]
+            self.carried[(id(spec), elementNo)] = (times[-1], values[-1])
+            key = (id(spec), carried is not None, times.tobytes())
+            groups.setdefault(key, (spec, carried is not None, times, []))[3].append((elementNo, values))
+
+        for spec, is_carried, times, members in groups.values():
+            first = -(-times[0] // self.step) * self.step
+            grid = np.arange(first, times[-1] + 1, self.step, dtype=np.int64)
+            if is_carried:
+                # Grid times up to the carried sample went out with the previous window
+                grid = grid[grid > times[0]]
+            if not len(grid):
+                continue
+            matrix = resample_matrix(times, np.vstack([values for _, values in members]), grid,
+                    self.methods.get(spec['variable'], self.default_method))
+            matrix = np.round(matrix, self.decimals)
+            matrix[np.isnan(matrix)] = MISSING_VALUE
+            grid_times = np.char.replace(np.datetime_as_string(grid.astype('datetime64[s]'), unit='s'), 'T', ' ').tolist()
+            for (elementNo, _), row in zip(members, matrix.tolist()):
+                self.save_series(spec, elementNo, [[time_, value] for time_, value in zip(grid_times, row)])
+                self.series_resampled += 1
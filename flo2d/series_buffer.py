@@ -0,0 +1,64 @@
+"""
+Bounded buffering of per-station timeseries rows.
+
+Rather than holding every station's full series until the end of the output file, rows are
+handed to a flush function in fixed-size time windows. The window size is derived from a memory
+ceiling, so memory use stays flat however long the forecast horizon is.
+"""
+
+# Approximate memory held by one buffered [date_time, value] row of strings, in bytes
+ROW_SIZE = 200
+
+DEFAULT_MEMORY_LIMIT_MB = 64
+
+
+def window_size_for(memory_limit_mb, station_count):
+    """
+    Number of timesteps that fit within the memory ceiling for the given number of stations.
+    :param memory_limit_mb: memory ceiling of the buffer in MB
+    :param station_count: number of stations buffered side by side
+    :return: window size in timesteps, at least 1
+    """
+    return max(1, int(memory_limit_mb * 1024 * 1024 / (ROW_SIZE * max(1, station_count))))
+
+
+class SeriesBuffer(object):
+    """
+    Buffers [date_time, value] rows per station and flushes all stations every window_size
+    timesteps. Since each window is upserted on its own, flushing in windows leaves the database
+    in the same state as inserting the full series at once.
+    """
+
+    def __init__(self, stations, flush_function, window_size):
+        """
+        :param stations: station keys (element numbers) to buffer
+        :param flush_function: called as flush_function(station, rows) for each non empty series
+        :param window_size: number of timesteps to buffer before flushing
+        """
+        self.series = {station: [] for station in stations}
+        self.flush_function = flush_function
+        self.capacity = window_size * max(1, len(self.series))
+        self.size = 0
+        self.flushes = 0
+
+    def append(self, station, row):
+        """
+        Buffer a row of a station, flushing every station once the window is full.
+        :param station: station key
+        :param row: [date_time, value] row
+        """
+        self.series[station].append(row)
+        self.size += 1
+        if self.size >= self.capacity:
+            self.flush()
+
+    def flush(self):
+        """
+        Hand over the buffered rows of every station and clear the buffer.
+        """
+        for station, rows in self.series.items():
+            if rows:
+                self.flush_function(station, rows)
+                self.series[station] = []
+        self.size = 0
+        self.flushes += 1
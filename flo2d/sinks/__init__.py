@@ -0,0 +1,74 @@
+import os
+
+from .alerts import AlertSink
+from .base import Sink, Series, SinkWriteError
+from .curw_fcst import TimeseriesSink
+from .fan_out import FanOut
+from .files import CsvSink, ParquetSink
+from .netcdf import NetcdfSink
+from .retry import CircuitBreaker, CircuitOpenError, CallTimeoutError
+from .stream import JsonLinesSink
+from .summary import SummarySink
+from .verification import VerificationSink
+
+SINKS = {
+        'curw_fcst'   : TimeseriesSink,
+        'csv'         : CsvSink,
+        'parquet'     : ParquetSink,
+        'netcdf'      : NetcdfSink,
+        'stdout'      : JsonLinesSink,
+        'summary'     : SummarySink,
+        'verification': VerificationSink
+        }
+
+# Sink options that are file paths, resolved against the FLO2D output directory unless the sink
+# keeps them across runs (Sink.config_paths)
+PATH_OPTIONS = ('path', 'fingerprint_file', 'station_map')
+
+# Sinks of a config without SINKS: the timeseries backend only
+DEFAULT_SINKS = [{'type': 'curw_fcst'}]
+
+
+def get_sink(spec, backend, output_dir, metrics=None, config_dir=None):
+    """
+    Create the sink of a SINKS config entry.
+    :param spec: dict of the sink type and its keyword arguments,
+    e.g. {"type": "csv", "path": "series.csv", "batch_size": 500, "retries": 2}, or for the database
+    {"type": "curw_fcst", "retries": 3, "retry_delay": 0.5, "timeout": 30, "breaker_threshold": 5}; add
+    "fingerprint_file": "fingerprints.db" to only send the values that changed since the last write;
+    {"type": "verification", "path": "verification.db", "station_map": "/.../obs_water_level.json",
+    "observations": {"type": "curw_obs"}} verifies the gauged stations against their observations;
+    {"type": "summary", "path": "hydrograph_summary.db"} stores the peak, time to peak and volume of each station
+    :param backend: timeseries backend written to by the curw_fcst sink
+    :param output_dir: directory relative file paths are resolved against, the FLO2D output directory
+    :param metrics: RunMetrics of the run, used by the curw_fcst sink
+    :param config_dir: directory the relative paths of the stores kept across runs are resolved against,
+    e.g. the summary table or the fingerprints; output_dir if None
+    :return: Sink instance
+    """
+    options = dict(spec)
+    name = options.pop('type', None)
+    if name not in SINKS:
+        raise ValueError("Unknown sink {}. Should be one of {}".format(name, ', '.join(SINKS)))
+    for option in PATH_OPTIONS:
+        if option in options:
+            base_dir = config_dir if config_dir is not None and option in SINKS[name].config_paths else output_dir
+            options[option] = os.path.join(base_dir, options[option])
+    if name=='curw_fcst':
+        sink = TimeseriesSink(backend, metrics=metrics, **options)
+    else:
+        sink = SINKS[name](**options)
+    if 'path' in spec:
+        sink.key = '{}:{}'.format(name, spec['path'])
+    return sink
+
+
+def get_sinks(specs, backend, output_dir, metrics=None, journal=None, config_dir=None):
+    """
+    :param specs: SINKS config list, DEFAULT_SINKS if None
+    :param journal: flo2d.journal RunJournal recording what each sink committed
+    :param config_dir: directory the stores kept across runs are resolved against, see get_sink()
+    :return: FanOut over the sinks
+    """
+    return FanOut([get_sink(spec, backend, output_dir, metrics, config_dir) for spec in (specs or DEFAULT_SINKS)],
+            metrics, journal)
@@ -0,0 +1,95 @@
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from ..alerts import first_crossings
+from .base import Sink, format_time
+
+logger = logging.getLogger(__name__)
+
+
+class AlertSink(Sink):
+    """
+    Checks every series against the alert thresholds of its element as it is parsed, and emits an
+    alert to each channel the first time the forecast of an element reaches a level. The engine
+    hands it the series straight from the parser, in a fan-out of its own, so alerts go out before
+    the series are resampled and batched for the database.
+
+    A channel failing is logged and does not stop the other channels, nor fail the series. The
+    channels are closed with the sink, letting queued webhooks go out.
+    """
+
+    name = 'alerts'
+    stage = 'alerts'
+
+    def __init__(self, thresholds, channels, station_names=None, variable='WaterLevel'):
+        """
+        :param thresholds: dict of element -> (level name array, threshold array), see flo2d.alerts.read_thresholds()
+        :param channels: dict of channel name -> channel with an emit(alert) method
+        :param station_names: dict of element -> station name, e.g. the merged cell maps of the model
+        :param variable: variable the thresholds apply to
+        """
+        super(AlertSink, self).__init__()
+        self.thresholds = thresholds
+        self.channels = channels
+        self.station_names = station_names or {}
+        self.variable = variable
+        # (element, level) of the levels already alerted in the run, the flood plain series come in windows
+        self.alerted = set()
+        self.alerts = 0
+
+    def _write_batch(self, batch):
+        for series in batch:
+            element = str(series.element)
+            if element not in self.thresholds or series.meta.get('variable')!=self.variable or not series.timeseries:
+                continue
+            levels, thresholds = self.thresholds[element]
+            values = np.array([float(value) for _, value in series.timeseries])
+            first, reached = first_crossings(values, thresholds)
+            for i in np.flatnonzero(reached):
+                if (element, levels[i]) in self.alerted:
+                    continue
+                self.alerted.add((element, levels[i]))
+                self._emit(self._alert(series, str(levels[i]), float(thresholds[i]), int(first[i]), values))
+
+    def _alert(self, series, level, threshold, index, values):
+        peak = int(values.argmax())
+        meta = series.meta
+        return {
+                'event'     : 'flood_alert',
+                'level'     : level,
+                'element'   : str(series.element),
+                'station'   : self.station_names.get(str(series.element)),
+                'station_id': meta.get('station_id'),
+                'variable'  : meta.get('variable'),
+                'threshold' : threshold,
+                'time'      : format_time(series.timeseries[index][0]),
+                'value'     : float(values[index]),
+                'peak_time' : format_time(series.timeseries[peak][0]),
+                'peak'      : float(values[peak]),
+                'fgt'       : str(series.fgt),
+                'sim_tag'   : meta.get('sim_tag'),
+                'model'     : meta.get('model'),
+                'version'   : meta.get('version'),
+                'emitted'   : datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                }
+
+    def _emit(self, alert):
+        self.alerts += 1
+        logger.warning("{} level reached at {} on {}".format(alert['level'], alert['station'] or alert['element'],
+                alert['time']), extra={'event': 'flood_alert', 'alert': alert})
+        for name, channel in self.channels.items():
+            try:
+                channel.emit(alert)
+            except Exception:
+                logger.exception("Exception occurred while emitting an alert to {}".format(name),
+                        extra={'event': 'alert_emit_failed', 'channel': name})
+
+    def _close(self):
+        for name, channel in self.channels.items():
+            try:
+                channel.close()
+            except Exception:
+                logger.exception("Exception occurred while closing the {} alert channel".format(name),
+                        extra={'event': 'alert_emit_failed', 'channel': name})
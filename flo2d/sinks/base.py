@@ -0,0 +1,192 @@
+import logging
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from .retry import CircuitOpenError, backoff_delay
+
+logger = logging.getLogger(__name__)
+
+# One parsed series on its way to the sinks: the FLO2D element number, the timeseries metadata
+# (tms_meta with station_id, latitude and longitude), the [time, value] rows and the forecast
+# generated time of the run
+Series = namedtuple('Series', ['element', 'meta', 'timeseries', 'fgt', 'journal_id'])
+# journal_id: id of the series in the run journal (flo2d.journal), None when not journaled
+Series.__new__.__defaults__ = (None,)
+
+# Timeseries metadata copied onto every record written by the file and stream sinks
+RECORD_FIELDS = ('station_id', 'latitude', 'longitude', 'sim_tag', 'variable', 'unit', 'unit_type')
+
+
+class SinkWriteError(Exception):
+
+    def __init__(self, sink, batch, cause):
+        super(SinkWriteError, self).__init__("{} sink failed to write {} series: {!r}".format(sink.name, len(batch),
+                cause))
+        self.sink = sink
+        self.batch = batch
+        self.cause = cause
+
+
+class Sink(object):
+    """
+    Destination of parsed series. Series are written in batches of `batch_size`; a batch that fails
+    is retried `retries` times with a jittered exponential backoff, from `retry_delay` up to
+    `max_retry_delay` seconds, before a SinkWriteError is raised and the batch dropped.
+
+    A sink may also have a circuit breaker (flo2d.sinks.retry.CircuitBreaker), batches are then
+    failed without calling the sink while the circuit is open, and a timed caller, bounding how
+    long each write is waited on.
+
+    Listeners (e.g. the run journal) are told which series a sink committed and which it failed on,
+    through their written(sink, batch) and failed(sink, batch, error) methods.
+    """
+
+    name = None
+    # Stage of the run metrics the writes are timed and counted under
+    stage = None
+    # Whether the sink counts its rows written and round trips itself
+    measures_writes = False
+    # Whether written batches are only persisted when the sink is closed, e.g. a file written at once
+    commits_on_close = False
+    # Path options of stores kept across runs, resolved against the config directory instead of the
+    # FLO2D output directory of the run
+    config_paths = ()
+
+    def __init__(self, batch_size=1, retries=0, retry_delay=1.0, max_retry_delay=30.0):
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.breaker = None
+        self.caller = None
+        # Identifies the sink across runs, e.g. in the journal; set to type and path by get_sink()
+        self.key = self.name
+        self.listeners = []
+        self.batch = []
+        self.uncommitted = []
+        self.series_written = 0
+        self.rows_written = 0
+        self.series_failed = 0
+
+    def write(self, series):
+        """
+        :param series: Series to write, written once the batch is full
+        """
+        self.batch.append(series)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the pending batch.
+        :return: number of rows written
+        """
+        if not self.batch:
+            return 0
+        batch, self.batch = self.batch, []
+        attempt = 0
+        while True:
+            try:
+                self._attempt(batch)
+                break
+            except Exception as e:
+                if attempt >= self.retries or isinstance(e, CircuitOpenError):
+                    self.series_failed += len(batch)
+                    self._notify('failed', batch, e)
+                    raise SinkWriteError(self, batch, e)
+                attempt += 1
+                delay = backoff_delay(attempt, self.retry_delay, self.max_retry_delay)
+                logger.warning("Retrying {} sink write ({} of {}) in {:.2f}s".format(self.name, attempt, self.retries,
+                        delay), extra={'event': 'sink_retry', 'sink': self.name, 'attempt': attempt, 'delay': delay,
+                                       'error': repr(e)})
+                time.sleep(delay)
+        rows = sum(len(series.timeseries) for series in batch)
+        self.series_written += len(batch)
+        self.rows_written += rows
+        if self.commits_on_close:
+            self.uncommitted.extend(batch)
+        else:
+            self._notify('written', batch)
+        return rows
+
+    def close(self):
+        """
+        Write the pending batch and release the sink.
+        """
+        try:
+            self.flush()
+        finally:
+            if self.caller is not None:
+                self.caller.shutdown()
+            self._commit()
+
+    def _attempt(self, batch):
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpenError("{} circuit is open".format(self.name))
+        try:
+            if self.caller is None:
+                self._write_batch(batch)
+            else:
+                self._write_timed(batch)
+        except Exception:
+            if self.breaker is not None:
+                self.breaker.failure()
+            raise
+        if self.breaker is not None:
+            self.breaker.success()
+
+    def _commit(self):
+        uncommitted, self.uncommitted = self.uncommitted, []
+        try:
+            self._close()
+        except Exception as e:
+            if uncommitted:
+                self._notify('failed', uncommitted, e)
+                raise SinkWriteError(self, uncommitted, e)
+            raise
+        if uncommitted:
+            self._notify('written', uncommitted)
+
+    def _notify(self, event, batch, *args):
+        for listener in self.listeners:
+            getattr(listener, event)(self, batch, *args)
+
+    def _write_batch(self, batch):
+        """
+        :param batch: list of Series
+        """
+        raise NotImplementedError
+
+    def _write_timed(self, batch):
+        """
+        Write a batch through the timed caller.
+        """
+        self.caller(self._write_batch, batch)
+
+    def _close(self):
+        pass
+
+
+def format_time(value):
+    """
+    :param value: series timestamp, a datetime once shifted by the UTC offset, else a string
+    :return: 'YYYY-MM-DD HH:MM:SS' string
+    """
+    return value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else value
+
+
+def records(series):
+    """
+    Flatten a series into one dict per row.
+    :param series: Series
+    :return: generator of dicts with the element, RECORD_FIELDS, fgt, time and value
+    """
+    meta = series.meta
+    fields = [('element', series.element)] + [(field, meta.get(field)) for field in RECORD_FIELDS] + \
+             [('fgt', series.fgt)]
+    for time_, value in series.timeseries:
+        record = dict(fields)
+        record['time'] = format_time(time_)
+        record['value'] = float(value)
+        yield record
@@ -0,0 +1,98 @@
+from .base import Sink
+from .delta import FingerprintStore
+from .retry import CircuitBreaker, TimedCaller, call_cancelled, check_cancelled
+
+
+class TimeseriesSink(Sink):
+    """
+    Writes series to a timeseries backend (flo2d.backends), curw_fcst by default: looks up or creates
+    the run of each series, inserts its data and moves the latest fgt.
+
+    Every write is idempotent (the data is upserted), so a batch can be retried, also after a
+    timeout of a write that went through. A write that timed out stops before its next round trip,
+    and is left out of the run metrics: with a timeout the round trips are measured on the worker
+    thread and only counted once the write returned in time.
+
+    In delta mode, with a fingerprint_file, only the chunks of a series whose values changed since
+    they were last written for the tms_id, by this run or an earlier one, are sent, see
+    flo2d.sinks.delta.
+    """
+
+    name = 'curw_fcst'
+    stage = 'db_write'
+    measures_writes = True
+    config_paths = ('fingerprint_file',)
+
+    def __init__(self, backend, metrics=None, batch_size=1, retries=0, retry_delay=1.0, max_retry_delay=30.0,
+                 timeout=None, breaker_threshold=None, breaker_reset=60.0, fingerprint_file=None, delta_chunk=24):
+        """
+        :param backend: flo2d.backends TimeseriesBackend
+        :param metrics: RunMetrics the round trips are counted in, per station
+        :param timeout: seconds a batch write is waited on, unbounded if None
+        :param breaker_threshold: consecutive failed writes opening the circuit breaker, no breaker if None
+        :param breaker_reset: seconds the circuit stays open before a trial write
+        :param fingerprint_file: SQLite file of the chunk fingerprints kept across runs, enables delta mode
+        :param delta_chunk: number of rows per fingerprinted chunk
+        """
+        super(TimeseriesSink, self).__init__(batch_size=batch_size, retries=retries, retry_delay=retry_delay,
+                max_retry_delay=max_retry_delay)
+        self.backend = backend
+        self.metrics = metrics
+        if timeout is not None:
+            self.caller = TimedCaller(self.name, timeout)
+        if breaker_threshold is not None:
+            self.breaker = CircuitBreaker(self.name, breaker_threshold, breaker_reset)
+        self.fingerprints = FingerprintStore(fingerprint_file, delta_chunk) if fingerprint_file else None
+        self.rows_skipped = 0
+
+    def _write_batch(self, batch):
+        for series in batch:
+            self._write_series(series)
+
+    def _write_timed(self, batch):
+        if self.metrics is None:
+            return super(TimeseriesSink, self)._write_timed(batch)
+        self.metrics.merge(self.caller(self._write_deferred, batch))
+
+    def _write_deferred(self, batch):
+        with self.metrics.deferred() as records:
+            self._write_batch(batch)
+        return records
+
+    def _write_series(self, series):
+        TS = self.backend
+        if self.metrics is not None:
+            TS = self.metrics.backend(TS, station=series.element, stage=self.stage)
+
+        check_cancelled()
+        tms_meta = series.meta
+        tms_id = TS.get_timeseries_id_if_exists(meta_data=tms_meta)
+
+        if tms_id is None:
+            tms_id = TS.generate_timeseries_id(meta_data=tms_meta)
+            tms_meta['tms_id'] = tms_id
+            check_cancelled()
+            TS.insert_run(run_meta=tms_meta)
+            TS.update_start_date(id_=tms_id, start_date=series.fgt)
+
+        timeseries = series.timeseries
+        digests = None
+        if self.fingerprints is not None:
+            timeseries, digests = self.fingerprints.changed(tms_id, series.timeseries)
+            skipped = len(series.timeseries) - len(timeseries)
+            self.rows_skipped += skipped
+            if self.metrics is not None and skipped:
+                self.metrics.add(self.stage, station=series.element, rows_skipped=skipped)
+            if not timeseries:
+                return
+
+        check_cancelled()
+        TS.insert_data(timeseries=timeseries, tms_id=tms_id, fgt=series.fgt, upsert=True)
+        check_cancelled()
+        TS.update_latest_fgt(id_=tms_id, fgt=series.fgt)
+        if digests and not call_cancelled():
+            self.fingerprints.commit(tms_id, series.fgt, digests)
+
+    def _close(self):
+        if self.fingerprints is not None:
+            self.fingerprints.close()
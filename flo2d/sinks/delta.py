@@ -0,0 +1,95 @@
+import hashlib
+import sqlite3
+from datetime import datetime, timedelta
+
+from .base import format_time
+
+# fgt: forecast generated time the values of the chunk were last written under
+SCHEMA = """
+DROP TABLE IF EXISTS fingerprint;
+CREATE TABLE IF NOT EXISTS chunk_fingerprint (
+    tms_id TEXT NOT NULL,
+    chunk_start TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    fgt TEXT NOT NULL,
+    updated TEXT NOT NULL,
+    PRIMARY KEY (tms_id, chunk_start)
+);
+"""
+
+
+def chunk_digest(rows):
+    """
+    :param rows: [time, value] rows of a chunk
+    :return: hex digest of the times and values of the chunk
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for time_, value in rows:
+        digest.update('{}={!r};'.format(format_time(time_), float(value)).encode())
+    return digest.hexdigest()
+
+
+class FingerprintStore(object):
+    """
+    Fingerprints of the chunks of series written to curw_fcst, per tms_id and chunk start time, kept
+    in a local SQLite file. Lets the next run, a re-run or a backfill only send the chunks whose values
+    changed since they were last written, whatever the fgt they were written under.
+
+    A chunk left unchanged by a run is therefore not stored again under that run's fgt: in delta mode
+    the value of a time is the one of its latest fgt, not necessarily of the run's latest_fgt.
+
+    The fingerprints only describe what this store saw written; rows changed or deleted in
+    curw_fcst by other means are not detected, remove the file to write everything again.
+    """
+
+    def __init__(self, path, chunk_size=24, keep_days=30):
+        """
+        :param path: SQLite file of the fingerprints, created if missing
+        :param chunk_size: number of rows hashed together
+        :param keep_days: fingerprints not updated for that many days are dropped
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        # Written from the sink's worker thread when the sink has a timeout, one call at a time
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+        with self.connection:
+            self.connection.execute("DELETE FROM chunk_fingerprint WHERE updated < ?",
+                    ((datetime.now() - timedelta(days=keep_days)).strftime('%Y-%m-%d %H:%M:%S'),))
+
+    def changed(self, tms_id, timeseries):
+        """
+        :param tms_id: timeseries id
+        :param timeseries: [time, value] rows
+        :return: (rows of the chunks whose values changed, or are new, dict of chunk start -> digest of
+        those chunks, to commit() once written)
+        """
+        known = dict(self.connection.execute("SELECT chunk_start, digest FROM chunk_fingerprint WHERE tms_id = ?",
+                (str(tms_id),)))
+        rows = []
+        digests = {}
+        for start in range(0, len(timeseries), self.chunk_size):
+            chunk = timeseries[start:start + self.chunk_size]
+            chunk_start = format_time(chunk[0][0])
+            digest = chunk_digest(chunk)
+            if known.get(chunk_start)!=digest:
+                rows.extend(chunk)
+                digests[chunk_start] = digest
+        return rows, digests
+
+    def commit(self, tms_id, fgt, digests):
+        """
+        Record the chunks of a series as written.
+        :param fgt: forecast generated time the chunks were written under
+        :param digests: dict of chunk start -> digest, returned by changed()
+        """
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.connection:
+            self.connection.executemany(
+                    "INSERT OR REPLACE INTO chunk_fingerprint (tms_id, chunk_start, digest, fgt, updated) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(str(tms_id), chunk_start, digest, str(fgt), now) for chunk_start, digest in digests.items()])
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,149 @@
+import logging
+
+from logger import EventSampler
+
+from .base import SinkWriteError
+from .retry import OPEN
+
+logger = logging.getLogger(__name__)
+
+sink_failures = EventSampler()
+
+
+class FanOut(object):
+    """
+    Hands every parsed series to several sinks. Each sink batches and retries on its own; a sink
+    that fails only loses its own batch, the other sinks carry on.
+
+    With a run journal, every series is recorded before it is handed out, sinks that already
+    committed a series in an earlier attempt of the run are skipped, and replay() hands each sink
+    the journaled series it has not committed yet. The journal is then the disk queue of the series
+    a sink failed on: they are retried once when the sinks are closed, unless the sink's circuit is
+    still open, and otherwise kept for the next attempt of the run, and resent by recover() at the
+    start of later runs.
+    """
+
+    def __init__(self, sinks, metrics=None, journal=None):
+        """
+        :param sinks: list of Sink
+        :param metrics: RunMetrics the writes are timed and counted in, under each sink's stage
+        :param journal: flo2d.journal RunJournal of the run, started with start_run()
+        """
+        self.sinks = sinks
+        self.metrics = metrics
+        self.journal = journal
+        # Keys of the sinks recover() resent the series of earlier runs to
+        self.recovered = []
+        if journal is not None:
+            for sink in sinks:
+                sink.listeners.append(journal)
+
+    def add(self, sink, index=None):
+        """
+        Add a sink once the fan-out is set up, e.g. one needing the model parameters.
+        :param index: position of the sink, last if None; sinks are written to in order
+        """
+        if self.journal is not None:
+            sink.listeners.append(self.journal)
+        self.sinks.insert(len(self.sinks) if index is None else index, sink)
+
+    def write(self, series):
+        """
+        :param series: flo2d.sinks.Series
+        """
+        committed = ()
+        if self.journal is not None:
+            series, committed = self.journal.record(series)
+        for sink in self.sinks:
+            if sink.key not in committed:
+                self._call(sink, sink.write, series)
+
+    def replay(self):
+        """
+        Hand each sink the series of the journaled run it has not committed.
+        :return: number of series replayed, over all sinks
+        """
+        replayed = 0
+        for sink in self.sinks:
+            for series in self.journal.pending(sink.key):
+                self._call(sink, sink.write, series)
+                replayed += 1
+        return replayed
+
+    def recover(self, max_age_hours):
+        """
+        Hand each sink the series earlier runs of the journal left uncommitted, oldest first, as long
+        as its circuit lets writes through. Sinks committing on close, e.g. per run files, only take
+        the series of their own run and are skipped.
+        :param max_age_hours: runs last updated longer ago are dropped unsent
+        :return: number of series resent, over all sinks
+        """
+        self.journal.expire(max_age_hours)
+        recovered = 0
+        for sink in self.sinks:
+            if sink.commits_on_close:
+                continue
+            self.recovered.append(sink.key)
+            spilled = self.journal.spilled(sink.key, max_age_hours)
+            if spilled:
+                recovered += self._drain(sink, spilled, 'earlier runs')
+                self._call(sink, sink.flush)
+        return recovered
+
+    def flush(self):
+        for sink in self.sinks:
+            self._call(sink, sink.flush)
+
+    def close(self):
+        for sink in self.sinks:
+            if self.journal is not None and not sink.commits_on_close:
+                self._call(sink, sink.flush)
+                if sink.series_failed:
+                    self._drain(sink, self.journal.pending(sink.key), 'this run')
+            self._call(sink, sink.close)
+        if self.journal is not None and self.recovered:
+            self.journal.settle(self.recovered)
+
+    def _drain(self, sink, pending, origin):
+        """
+        Write journaled series to a sink, stopping once its circuit opens.
+        :param pending: list of Series
+        :param origin: runs the series come from, for the log
+        :return: number of series handed to the sink
+        """
+        if sink.breaker is not None and not sink.breaker.allow():
+            return 0
+        logger.info("Retrying {} series of {} spilled by the {} sink".format(len(pending), origin, sink.name),
+                extra={'event': 'sink_drain', 'sink': sink.name, 'series': len(pending)})
+        drained = 0
+        for series in pending:
+            self._call(sink, sink.write, series)
+            drained += 1
+            if sink.breaker is not None and sink.breaker.state==OPEN:
+                break
+        return drained
+
+    def _call(self, sink, function, *args):
+        rows_written = sink.rows_written
+        try:
+            if self.metrics is None:
+                function(*args)
+            else:
+                with self.metrics.stage(sink.stage):
+                    function(*args)
+        except SinkWriteError as e:
+            self._failed(e)
+        if self.metrics is not None and not sink.measures_writes and sink.rows_written > rows_written:
+            self.metrics.add(sink.stage, rows_written=sink.rows_written - rows_written)
+
+    def _failed(self, error):
+        if self.metrics is not None:
+            for series in error.batch:
+                self.metrics.add(error.sink.stage, station=series.element, failures=1)
+        # Sampled, so an unreachable sink doesn't flood the log with one traceback per batch
+        occurrence = sink_failures(error.sink.name)
+        if occurrence:
+            logger.error("Exception occurred while pushing data to the {} sink".format(error.sink.name),
+                    exc_info=(type(error.cause), error.cause, error.cause.__traceback__),
+                    extra={'event': 'sink_write_failed', 'sink': error.sink.name,
+                           'stations': [series.element for series in error.batch], 'occurrence': occurrence})
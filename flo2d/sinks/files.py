@@ -0,0 +1,74 @@
+import csv
+import os
+
+from .base import Sink, records, RECORD_FIELDS
+
+COLUMNS = ('element',) + RECORD_FIELDS + ('fgt', 'time', 'value')
+
+
+class CsvSink(Sink):
+    """
+    Appends series to a CSV file, one row per value.
+    """
+
+    name = 'csv'
+    stage = 'sink_csv'
+
+    def __init__(self, path, batch_size=100, retries=0, retry_delay=1.0):
+        """
+        :param path: CSV file, the header is written when the file is created
+        """
+        super(CsvSink, self).__init__(batch_size=batch_size, retries=retries, retry_delay=retry_delay)
+        self.path = path
+        self.is_header_written = os.path.exists(path) and os.path.getsize(path) > 0
+
+    def _write_batch(self, batch):
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            if not self.is_header_written:
+                writer.writeheader()
+                self.is_header_written = True
+            for series in batch:
+                writer.writerows(records(series))
+
+
+class ParquetSink(Sink):
+    """
+    Writes series to a Parquet file, one row group per batch. Needs pyarrow.
+    """
+
+    name = 'parquet'
+    stage = 'sink_parquet'
+
+    def __init__(self, path, batch_size=1000, retries=0, retry_delay=1.0):
+        """
+        :param path: Parquet file, replaced if it exists
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("The parquet sink needs pyarrow, install it with `pip install pyarrow`")
+        super(ParquetSink, self).__init__(batch_size=batch_size, retries=retries, retry_delay=retry_delay)
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.schema = pyarrow.schema([(column, pyarrow.float64() if column=='value' else pyarrow.string())
+                                      for column in COLUMNS])
+        self.writer = None
+
+    def _write_batch(self, batch):
+        columns = {column: [] for column in COLUMNS}
+        for series in batch:
+            for record in records(series):
+                for column in COLUMNS:
+                    value = record[column]
+                    columns[column].append(value if column=='value' or value is None else str(value))
+        table = self.pa.Table.from_pydict(columns, schema=self.schema)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(table)
+
+    def _close(self):
+        if self.writer is not None:
+            self.writer.close()
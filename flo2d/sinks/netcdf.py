@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from .base import Sink, format_time
+
+FILL_VALUE = -9999.0
+
+
+class NetcdfSink(Sink):
+    """
+    Collects the series of a run and writes them to one NetCDF file on close: a (station, time)
+    variable per FLO2D variable, with the station ids and coordinates alongside. Needs netCDF4.
+    """
+
+    name = 'netcdf'
+    stage = 'sink_netcdf'
+    commits_on_close = True
+
+    def __init__(self, path, batch_size=1, retries=0, retry_delay=1.0):
+        """
+        :param path: NetCDF file, replaced on close
+        """
+        super(NetcdfSink, self).__init__(batch_size=batch_size, retries=retries, retry_delay=retry_delay)
+        self.path = path
+        # element -> (station_id, latitude, longitude), variable -> {element: {time: value}}
+        self.stations = {}
+        self.variables = {}
+        self.units = {}
+
+    def _write_batch(self, batch):
+        for series in batch:
+            meta = series.meta
+            self.stations[series.element] = (meta.get('station_id'), meta.get('latitude'), meta.get('longitude'))
+            self.units[meta['variable']] = meta.get('unit')
+            values = self.variables.setdefault(meta['variable'], {}).setdefault(series.element, {})
+            for time_, value in series.timeseries:
+                values[format_time(time_)] = float(value)
+
+    def _close(self):
+        if not self.variables:
+            return
+        from netCDF4 import Dataset
+        import numpy as np
+
+        elements = sorted(self.stations, key=lambda element: int(element) if str(element).isdigit() else element)
+        station_index = {element: i for i, element in enumerate(elements)}
+        times = sorted(set(time_ for values in self.variables.values() for series in values.values()
+                           for time_ in series))
+        time_index = {time_: i for i, time_ in enumerate(times)}
+        base_time = datetime.strptime(times[0], '%Y-%m-%d %H:%M:%S')
+
+        with Dataset(self.path, 'w') as nc:
+            nc.createDimension('station', len(elements))
+            nc.createDimension('time', len(times))
+
+            time_var = nc.createVariable('time', 'f8', ('time',))
+            time_var.units = 'minutes since {}'.format(times[0])
+            time_var[:] = [(datetime.strptime(time_, '%Y-%m-%d %H:%M:%S') - base_time).total_seconds() / 60
+                           for time_ in times]
+
+            element_var = nc.createVariable('element', 'i4', ('station',))
+            element_var[:] = [int(element) for element in elements]
+            station_var = nc.createVariable('station_id', 'i4', ('station',))
+            station_var[:] = [int(self.stations[element][0]) for element in elements]
+            for i, name in ((1, 'latitude'), (2, 'longitude')):
+                coordinate = nc.createVariable(name, 'f8', ('station',))
+                coordinate[:] = [float(self.stations[element][i]) for element in elements]
+
+            for variable, series in self.variables.items():
+                grid = np.full((len(elements), len(times)), FILL_VALUE, dtype=np.float32)
+                for element, values in series.items():
+                    row = station_index[element]
+                    for time_, value in values.items():
+                        grid[row, time_index[time_]] = value
+                nc_var = nc.createVariable(variable, 'f4', ('station', 'time'), fill_value=FILL_VALUE)
+                nc_var.units = self.units[variable] or ''
+                nc_var[:] = grid
@@ -0,0 +1,150 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Per TimedCaller worker thread: event set once the call running on it was given up on
+_worker = threading.local()
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a sink whose circuit breaker is open.
+    """
+
+
+class CallTimeoutError(Exception):
+    """
+    Raised when a sink call did not return within its timeout.
+    """
+
+
+def backoff_delay(attempt, base, cap):
+    """
+    Exponential backoff with equal jitter: half of the delay is fixed, the other half random, so
+    stations retried together spread out instead of hitting the database again at once.
+    :param attempt: retry number, from 1
+    :param base: delay of the first retry, in seconds
+    :param cap: longest delay, in seconds
+    :return: delay in seconds
+    """
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def call_cancelled():
+    """
+    :return: True on a TimedCaller worker whose call timed out, False anywhere else
+    """
+    cancelled = getattr(_worker, 'cancelled', None)
+    return cancelled is not None and cancelled.is_set()
+
+
+def check_cancelled():
+    """
+    Raise CallTimeoutError on a TimedCaller worker whose call timed out, so the late call stops
+    before its next round trip instead of writing what its caller already counted as failed.
+    """
+    if call_cancelled():
+        raise CallTimeoutError("Call given up on after its timeout")
+
+
+class CircuitBreaker(object):
+    """
+    Stops calling a failing sink. After `threshold` consecutive failed calls the circuit opens and
+    calls are refused for `reset_timeout` seconds; the first call after that is a trial (half open),
+    closing the circuit if it succeeds and opening it again if it fails.
+    """
+
+    def __init__(self, name, threshold=5, reset_timeout=60.0):
+        """
+        :param name: name of the sink, for the log
+        :param threshold: consecutive failures opening the circuit
+        :param reset_timeout: seconds the circuit stays open before a trial call
+        """
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+
+    def allow(self):
+        """
+        :return: True if a call may be made
+        """
+        if self.state==OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        return self.state!=OPEN
+
+    def success(self):
+        if self.state!=CLOSED:
+            logger.info("{} circuit closed".format(self.name),
+                    extra={'event': 'circuit_closed', 'sink': self.name})
+        self.state = CLOSED
+        self.failures = 0
+
+    def failure(self):
+        self.failures += 1
+        if self.state==HALF_OPEN or (self.state==CLOSED and self.failures >= self.threshold):
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+            logger.warning("{} circuit opened after {} consecutive failures, retrying in {}s".format(
+                    self.name, self.failures, self.reset_timeout),
+                    extra={'event': 'circuit_opened', 'sink': self.name, 'failures': self.failures,
+                           'reset_timeout': self.reset_timeout})
+
+
+class TimedCaller(object):
+    """
+    Runs calls on a single worker thread and gives up waiting on them after `timeout` seconds. A
+    call that timed out keeps the worker (and its connection) until it returns, so later calls time
+    out too instead of blocking more connections; the circuit breaker then stops them. The late call
+    can tell it was given up on with call_cancelled() / check_cancelled().
+    """
+
+    def __init__(self, name, timeout):
+        """
+        :param name: name of the sink, for the worker thread
+        :param timeout: seconds to wait on a call
+        """
+        self.name = name
+        self.timeout = timeout
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def __call__(self, function, *args):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='{}-sink'.format(self.name))
+        cancelled = threading.Event()
+        future = self.executor.submit(self._run, cancelled, function, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            cancelled.set()
+            future.cancel()
+            raise CallTimeoutError("{} sink call timed out after {}s".format(self.name, self.timeout))
+
+    @staticmethod
+    def _run(cancelled, function, *args):
+        _worker.cancelled = cancelled
+        try:
+            return function(*args)
+        finally:
+            _worker.cancelled = None
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
@@ -0,0 +1,34 @@
+import json
+import sys
+
+from .base import Sink, format_time, RECORD_FIELDS
+
+
+class JsonLinesSink(Sink):
+    """
+    Writes each series as one JSON line, to stdout by default, e.g. for a dashboard cache feeder
+    reading the pusher's output.
+    """
+
+    name = 'stdout'
+    stage = 'sink_stdout'
+
+    def __init__(self, stream=None, batch_size=1, retries=0, retry_delay=1.0):
+        """
+        :param stream: text stream written to, sys.stdout if None
+        """
+        super(JsonLinesSink, self).__init__(batch_size=batch_size, retries=retries, retry_delay=retry_delay)
+        self.stream = stream
+
+    def _write_batch(self, batch):
+        stream = self.stream if self.stream is not None else sys.stdout
+        lines = []
+        for series in batch:
+            record = {'element': series.element}
+            for field in RECORD_FIELDS:
+                record[field] = series.meta.get(field)
+            record['fgt'] = series.fgt
+            record['timeseries'] = [[format_time(time_), float(value)] for time_, value in series.timeseries]
+            lines.append(json.dumps(record))
+        stream.write('\n'.join(lines) + '\n')
+        stream.flush()
@@ -0,0 +1,143 @@
+import logging
+import sqlite3
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from ..timeseries import MISSING_VALUE
+from .base import Sink, format_time
+
+logger = logging.getLogger(__name__)
+
+# Units of the flow variables a volume is integrated for, in m3
+FLOW_UNITS = ('m3/s', 'm3s-1', 'cumecs')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hydrograph_summary (
+    fgt TEXT NOT NULL,
+    sim_tag TEXT NOT NULL,
+    model TEXT NOT NULL,
+    version TEXT NOT NULL,
+    variable TEXT NOT NULL,
+    unit TEXT,
+    element TEXT NOT NULL,
+    station_id TEXT,
+    start TEXT,
+    end TEXT,
+    n INTEGER NOT NULL,
+    peak REAL,
+    peak_time TEXT,
+    time_to_peak REAL,
+    mean REAL,
+    volume REAL,
+    created TEXT NOT NULL,
+    PRIMARY KEY (fgt, sim_tag, model, version, variable, element)
+);
+"""
+# time_to_peak: hours from the start of the series to its peak; volume: m3, for flow variables only
+
+
+class _Statistics(object):
+    """
+    Running statistics of one station's series, which may arrive in time windows.
+    """
+
+    def __init__(self, series):
+        meta = series.meta
+        self.key = (str(series.fgt), str(meta.get('sim_tag')), str(meta.get('model')), str(meta.get('version')),
+                    meta.get('variable'), meta.get('unit'), str(series.element), meta.get('station_id'))
+        self.is_flow = meta.get('unit') in FLOW_UNITS
+        self.n = 0
+        self.start = None
+        self.peak = -np.inf
+        self.peak_time = None
+        self.total = 0.0
+        self.volume = 0.0
+        # (seconds, value) of the last sample, to integrate across windows
+        self.last = None
+
+    def update(self, times, values):
+        """
+        :param times: datetime64[s] array of a window, increasing
+        :param values: value array of the window
+        """
+        if self.start is None:
+            self.start = times[0]
+        peak = values.argmax()
+        if values[peak] > self.peak:
+            self.peak, self.peak_time = float(values[peak]), times[peak]
+        self.n += len(values)
+        self.total += float(values.sum())
+        if self.is_flow:
+            seconds = times.astype(np.int64).astype(np.float64)
+            if self.last is not None:
+                seconds = np.concatenate(([self.last[0]], seconds))
+                values = np.concatenate(([self.last[1]], values))
+            self.volume += float(np.sum((values[1:] + values[:-1]) * np.diff(seconds)) / 2)
+            self.last = (seconds[-1], values[-1])
+
+    def record(self, end):
+        return self.key + (str(self.start).replace('T', ' '), str(end).replace('T', ' '), self.n, self.peak,
+                           str(self.peak_time).replace('T', ' '),
+                           float((self.peak_time - self.start) / np.timedelta64(1, 'h')), self.total / self.n,
+                           self.volume if self.is_flow else None)
+
+
+class SummarySink(Sink):
+    """
+    Summary statistics of the hydrograph of every station of a run: peak, time and time to peak,
+    mean, and volume for discharges. Stored on close as one row per station and variable in a
+    small SQLite table, so dashboards need not scan the full series. The table is shared by every
+    run, its path is relative to the config directory.
+    """
+
+    name = 'summary'
+    stage = 'sink_summary'
+    commits_on_close = True
+    config_paths = ('path',)
+
+    def __init__(self, path, batch_size=1, retries=0, retry_delay=1.0):
+        """
+        :param path: SQLite file of the hydrograph_summary table; rows of a run written again are replaced
+        """
+        super(SummarySink, self).__init__(batch_size=batch_size, retries=retries, retry_delay=retry_delay)
+        self.path = path
+        # (variable, element) -> _Statistics, and the last time of each
+        self.statistics = OrderedDict()
+        self.ends = {}
+
+    def _write_batch(self, batch):
+        for series in batch:
+            if not series.timeseries:
+                continue
+            key = (series.meta.get('variable'), series.element)
+            statistics = self.statistics.get(key)
+            if statistics is None:
+                statistics = self.statistics[key] = _Statistics(series)
+            times = np.array([format_time(time_) for time_, _ in series.timeseries], dtype='datetime64[s]')
+            values = np.array([float(value) for _, value in series.timeseries])
+            self.ends[key] = times[-1]
+            # Missing values are left out of the statistics, the volume is integrated over the gaps
+            present = (values!=MISSING_VALUE) & ~np.isnan(values)
+            if present.any():
+                statistics.update(times[present], values[present])
+
+    def _close(self):
+        if not self.statistics:
+            return
+        created = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = [statistics.record(self.ends[key]) + (created,) for key, statistics in self.statistics.items()
+                if statistics.n]
+        if not rows:
+            return
+        connection = sqlite3.connect(self.path)
+        try:
+            connection.executescript(SCHEMA)
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO hydrograph_summary VALUES ({})".format(
+                        ', '.join('?' * len(rows[0]))), rows)
+        finally:
+            connection.close()
+        logger.info("Hydrograph summary of {} stations written to {}".format(len(rows), self.path),
+                extra={'event': 'hydrograph_summary', 'stations': len(rows)})
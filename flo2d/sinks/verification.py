@@ -0,0 +1,76 @@
+import json
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from ..verification import VerificationStore, get_observations, to_datetime64, verify
+from .base import Sink, format_time
+
+logger = logging.getLogger(__name__)
+
+
+class VerificationSink(Sink):
+    """
+    Collects the forecast series of the gauged elements of a run and, on close, verifies them
+    against the observations of their gauges (flo2d.verification), storing the scores of the run.
+    The scores of every run go to one store, its path and the station map are relative to the config
+    directory.
+    """
+
+    name = 'verification'
+    stage = 'verification'
+    commits_on_close = True
+    config_paths = ('path', 'station_map')
+
+    def __init__(self, path, station_map, observations, variable='WaterLevel', tolerance=0, batch_size=1, retries=0,
+                 retry_delay=1.0):
+        """
+        :param path: SQLite file the scores are stored in
+        :param station_map: JSON file of CHANNEL_CELL_MAP / FLOOD_PLAIN_CELL_MAP of element -> observation
+        station name, e.g. flo2d_stations/obs_water_level.json
+        :param observations: observation source spec, see flo2d.verification.get_observations()
+        :param variable: verified variable
+        :param tolerance: seconds an observation may be away from the forecast time
+        """
+        super(VerificationSink, self).__init__(batch_size=batch_size, retries=retries, retry_delay=retry_delay)
+        self.path = path
+        self.variable = variable
+        self.tolerance = tolerance
+        self.observations = get_observations(observations)
+        with open(station_map) as f:
+            cell_maps = json.loads(f.read())
+        # element -> station name
+        self.gauges = {}
+        for map_name in ('CHANNEL_CELL_MAP', 'FLOOD_PLAIN_CELL_MAP'):
+            self.gauges.update((str(element), name) for element, name in (cell_maps.get(map_name) or {}).items())
+        # station name -> {time: value}
+        self.series = OrderedDict()
+        self.run = None
+        self.scores = []
+
+    def _write_batch(self, batch):
+        for series in batch:
+            station = self.gauges.get(str(series.element))
+            if station is None or series.meta.get('variable')!=self.variable:
+                continue
+            if self.run is None:
+                self.run = {'fgt'    : series.fgt, 'sim_tag': series.meta.get('sim_tag'),
+                            'model'  : series.meta.get('model'), 'version': series.meta.get('version')}
+            values = self.series.setdefault(station, {})
+            for time_, value in series.timeseries:
+                values[format_time(time_)] = float(value)
+
+    def _close(self):
+        if not self.series:
+            return
+        series = OrderedDict()
+        for station, values in self.series.items():
+            times = sorted(values)
+            series[station] = (to_datetime64(times), np.array([values[time_] for time_ in times]))
+        self.scores = verify(series, self.observations, self.variable, self.tolerance)
+        elements = dict((station, element) for element, station in self.gauges.items())
+        VerificationStore(self.path).save(self.run, self.variable, self.scores, elements)
+        logger.info("Verified {} stations against observations".format(len(self.scores)),
+                extra={'event': 'verification', 'fgt': str(self.run['fgt']), 'variable': self.variable,
+                       'scores': [dict(score._asdict()) for score in self.scores]})
@@ -0,0 +1,293 @@
+"""
+Spatial index over the FLO2D grid cells (flo2d_250m.csv, flo2d_150m.csv), for nearest cell,
+k-nearest cells and within-radius lookups of lat/lon points.
+
+The cells are projected to metres around the mean latitude of the grid and hashed into square
+buckets of about one cell, sorted by bucket so the cells of a row of buckets are one slice of the
+index. A query only looks at the buckets around the point, growing the searched box until no
+cell outside it can be closer. The index is cached in a .npz file next to the grid CSV.
+"""
+import logging
+import os
+
+import numpy as np
+
+from .flood_map import read_grid
+
+logger = logging.getLogger(__name__)
+
+METRES_PER_DEGREE = 111320.0
+
+# Cache arrays; the size and modification time of the grid CSV tell whether a cache is stale
+CACHE_ARRAYS = ('grid_ids', 'x', 'y', 'px', 'py', 'order', 'starts', 'shape', 'projection', 'source')
+
+
+class GridIndex(object):
+
+    def __init__(self, grid_ids, x, y, bucket_size=None):
+        """
+        :param grid_ids: array of grid ids
+        :param x: array of cell longitudes
+        :param y: array of cell latitudes
+        :param bucket_size: bucket side in metres, about the cell size of the grid by default
+        """
+        self.grid_ids = np.asarray(grid_ids, dtype=np.int64)
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        if not len(self.grid_ids):
+            raise ValueError("Empty grid")
+        # (origin longitude, origin latitude, metres per degree of longitude, bucket size)
+        kx = METRES_PER_DEGREE * np.cos(np.radians(self.y.mean()))
+        x0 = self.x.min()
+        y0 = self.y.min()
+        self.px = (self.x - x0) * kx
+        self.py = (self.y - y0) * METRES_PER_DEGREE
+        if bucket_size is None:
+            area = max(self.px.max(), 1.0) * max(self.py.max(), 1.0)
+            bucket_size = max(np.sqrt(area / len(self.grid_ids)), 1.0)
+        self.projection = np.array([x0, y0, kx, bucket_size])
+
+        ncols = int(self.px.max() // bucket_size) + 1
+        nrows = int(self.py.max() // bucket_size) + 1
+        self.shape = np.array([nrows, ncols], dtype=np.int64)
+        buckets = (self.py // bucket_size).astype(np.int64) * ncols + (self.px // bucket_size).astype(np.int64)
+        self.order = np.argsort(buckets, kind='stable')
+        self.starts = np.searchsorted(buckets[self.order], np.arange(nrows * ncols + 1))
+        self._unpack()
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        index = cls.__new__(cls)
+        for name in CACHE_ARRAYS[:-1]:
+            setattr(index, name, arrays[name])
+        index._unpack()
+        return index
+
+    def _unpack(self):
+        # Plain Python scalars, indexing numpy arrays costs more than the bucket lookups themselves
+        self.nrows, self.ncols = int(self.shape[0]), int(self.shape[1])
+        self.x0, self.y0, self.kx, self.bucket_size = (float(value) for value in self.projection)
+        self.starts_list = self.starts.tolist()
+
+    def __len__(self):
+        return len(self.grid_ids)
+
+    def project(self, lon, lat):
+        """
+        :return: (x, y) of the points in the metres of the index
+        """
+        return (np.asarray(lon, dtype=np.float64) - self.x0) * self.kx, \
+               (np.asarray(lat, dtype=np.float64) - self.y0) * METRES_PER_DEGREE
+
+    def _box(self, row_lo, row_hi, col_lo, col_hi):
+        """
+        :return: positions of the cells in the buckets of the box, clipped to the grid
+        """
+        ncols = self.ncols
+        starts = self.starts_list
+        row_lo, row_hi = max(row_lo, 0), min(row_hi, self.nrows - 1)
+        col_lo, col_hi = max(col_lo, 0), min(col_hi, ncols - 1)
+        if row_lo > row_hi or col_lo > col_hi:
+            return np.empty(0, dtype=np.int64)
+        slices = [self.order[starts[row * ncols + col_lo]:starts[row * ncols + col_hi + 1]]
+                  for row in range(row_lo, row_hi + 1)]
+        return np.concatenate(slices) if len(slices) > 1 else slices[0]
+
+    def _covers(self, row_lo, row_hi, col_lo, col_hi):
+        return row_lo <= 0 and col_lo <= 0 and row_hi >= self.nrows - 1 and col_hi >= self.ncols - 1
+
+    def k_nearest(self, lon, lat, k):
+        """
+        :param lon: longitude of the point
+        :param lat: latitude of the point
+        :param k: number of cells
+        :return: (array of the grid ids of the k nearest cells, array of their distances in metres),
+        nearest first
+        """
+        qx = (lon - self.x0) * self.kx
+        qy = (lat - self.y0) * METRES_PER_DEGREE
+        bucket_size = self.bucket_size
+        row, col = int(qy // bucket_size), int(qx // bucket_size)
+        # A point off the grid starts with the box reaching the nearest edge of the grid
+        radius = max(0, -row, row - self.nrows + 1, -col, col - self.ncols + 1)
+        while True:
+            box = (row - radius, row + radius, col - radius, col + radius)
+            positions = self._box(*box)
+            covers = self._covers(*box)
+            if len(positions) >= k or covers:
+                distances = np.hypot(self.px[positions] - qx, self.py[positions] - qy)
+                if len(positions) > k:
+                    nearest = np.argpartition(distances, k - 1)[:k]
+                    positions, distances = positions[nearest], distances[nearest]
+                # Cells outside the box are more than radius buckets away from the point
+                if covers or distances.max() <= radius * bucket_size:
+                    nearest = np.argsort(distances, kind='stable')
+                    return self.grid_ids[positions[nearest]], distances[nearest]
+            radius += 1
+
+    def nearest(self, lon, lat):
+        """
+        :return: (grid id of the cell nearest to the point, distance in metres)
+        """
+        grid_ids, distances = self.k_nearest(lon, lat, 1)
+        return int(grid_ids[0]), float(distances[0])
+
+    def nearest_many(self, lons, lats):
+        """
+        :param lons: longitudes of the points
+        :param lats: latitudes of the points
+        :return: (array of the grid ids of the nearest cells, array of their distances in metres)
+        """
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        qx, qy = self.project(lons, lats)
+        rows = np.floor(qy / self.bucket_size).astype(np.int64)
+        cols = np.floor(qx / self.bucket_size).astype(np.int64)
+
+        # Candidates of every point at once: the cells of the 3 x 3 buckets around it, one slice of
+        # the index per row of buckets
+        points = []
+        positions = []
+        col_lo = np.clip(cols - 1, 0, self.ncols - 1)
+        col_hi = np.clip(cols + 1, 0, self.ncols - 1)
+        spans_grid = (cols + 1 >= 0) & (cols - 1 <= self.ncols - 1)
+        for offset in (-1, 0, 1):
+            row = rows + offset
+            valid = spans_grid & (row >= 0) & (row <= self.nrows - 1)
+            first = self.starts[row[valid] * self.ncols + col_lo[valid]]
+            counts = self.starts[row[valid] * self.ncols + col_hi[valid] + 1] - first
+            points.append(np.repeat(np.flatnonzero(valid), counts))
+            positions.append(np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum()))
+        points = np.concatenate(points)
+        positions = self.order[np.concatenate(positions)]
+
+        grid_ids = np.empty(len(lons), dtype=np.int64)
+        distances = np.full(len(lons), np.inf)
+        if len(points):
+            candidate_distances = np.hypot(self.px[positions] - qx[points], self.py[positions] - qy[points])
+            # Nearest candidate of each point: sort by point, then distance, and keep the first of each point
+            by_point = np.lexsort((candidate_distances, points))
+            points, positions = points[by_point], positions[by_point]
+            first = np.ones(len(points), dtype=bool)
+            first[1:] = points[1:]!=points[:-1]
+            distances[points[first]] = candidate_distances[by_point][first]
+            grid_ids[points[first]] = self.grid_ids[positions[first]]
+
+        # Points without a candidate, or whose nearest candidate is farther than a cell outside the
+        # 3 x 3 buckets could be, are looked up one by one
+        for i in np.flatnonzero(distances > self.bucket_size).tolist():
+            grid_ids[i], distances[i] = self.nearest(lons[i], lats[i])
+        return grid_ids, distances
+
+    def k_nearest_many(self, lons, lats, k):
+        """
+        k_nearest() of many points at once: the box of buckets searched grows for all the points still
+        unresolved together, with the candidates of every point gathered and ranked in one pass.
+        :param lons: longitudes of the points
+        :param lats: latitudes of the points
+        :param k: number of cells per point
+        :return: (array (points x k) of the grid ids of the k nearest cells of each point, array of their
+        distances in metres), nearest first; -1 and inf beyond the number of cells of the grid
+        """
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        qx, qy = self.project(lons, lats)
+        bucket_size = self.bucket_size
+        nrows, ncols = self.nrows, self.ncols
+        rows = np.floor(qy / bucket_size).astype(np.int64)
+        cols = np.floor(qx / bucket_size).astype(np.int64)
+
+        grid_ids = np.full((len(lons), k), -1, dtype=np.int64)
+        distances = np.full((len(lons), k), np.inf)
+        # A point off the grid starts with the box reaching the nearest edge of the grid
+        radius = np.maximum.reduce([np.zeros(len(lons), dtype=np.int64), -rows, rows - nrows + 1, -cols,
+                                    cols - ncols + 1])
+        pending = np.arange(len(lons))
+        while len(pending):
+            row, col, r = rows[pending], cols[pending], radius[pending]
+            row_lo, row_hi = np.maximum(row - r, 0), np.minimum(row + r, nrows - 1)
+            col_lo, col_hi = np.maximum(col - r, 0), np.minimum(col + r, ncols - 1)
+            covers = (row - r <= 0) & (col - r <= 0) & (row + r >= nrows - 1) & (col + r >= ncols - 1)
+
+            # One slice of the index per row of buckets of the box of each point
+            box_rows = np.where((row_lo <= row_hi) & (col_lo <= col_hi), row_hi - row_lo + 1, 0)
+            slice_points = np.repeat(np.arange(len(pending)), box_rows)
+            slice_rows = np.repeat(row_lo - np.cumsum(box_rows) + box_rows, box_rows) + np.arange(box_rows.sum())
+            first = self.starts[slice_rows * ncols + col_lo[slice_points]]
+            counts = self.starts[slice_rows * ncols + col_hi[slice_points] + 1] - first
+            points = np.repeat(slice_points, counts)
+            positions = self.order[np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())]
+            candidate_distances = np.hypot(self.px[positions] - qx[pending][points],
+                    self.py[positions] - qy[pending][points])
+
+            # Rank the candidates of each point by distance
+            by_point = np.lexsort((candidate_distances, points))
+            points, positions, candidate_distances = points[by_point], positions[by_point], \
+                                                     candidate_distances[by_point]
+            found = np.bincount(points, minlength=len(pending))
+            point_starts = np.cumsum(found) - found
+            ranks = np.arange(len(points)) - np.repeat(point_starts, found)
+            kth = np.full(len(pending), np.inf)
+            kth[found >= k] = candidate_distances[point_starts[found >= k] + k - 1]
+            # Cells outside the box are more than r buckets away from the point
+            done = covers | (kth <= r * bucket_size)
+
+            kept = (ranks < k) & done[points]
+            grid_ids[pending[points[kept]], ranks[kept]] = self.grid_ids[positions[kept]]
+            distances[pending[points[kept]], ranks[kept]] = candidate_distances[kept]
+            # A point with k candidates is resolved by the box reaching its k-th one, the others double theirs
+            reach = np.where(np.isfinite(kth), np.ceil(np.minimum(kth, 1e15) / bucket_size), 2 * r)
+            radius[pending] = np.maximum(r + 1, reach)
+            pending = pending[~done]
+        return grid_ids, distances
+
+    def within(self, lon, lat, radius):
+        """
+        :param radius: radius in metres
+        :return: (array of the grid ids of the cells within radius of the point, array of their
+        distances in metres), nearest first
+        """
+        qx = (lon - self.x0) * self.kx
+        qy = (lat - self.y0) * METRES_PER_DEGREE
+        bucket_size = self.bucket_size
+        positions = self._box(int((qy - radius) // bucket_size), int((qy + radius) // bucket_size),
+                int((qx - radius) // bucket_size), int((qx + radius) // bucket_size))
+        distances = np.hypot(self.px[positions] - qx, self.py[positions] - qy)
+        inside = distances <= radius
+        positions, distances = positions[inside], distances[inside]
+        nearest = np.argsort(distances, kind='stable')
+        return self.grid_ids[positions[nearest]], distances[nearest]
+
+
+def _source_stamp(grid_csv_path):
+    stat = os.stat(grid_csv_path)
+    return np.array([stat.st_size, stat.st_mtime])
+
+
+def load_grid_index(grid_csv_path, cache_path=None):
+    """
+    Load the spatial index of a grid CSV from its cache, building (and caching) it if the cache is
+    missing or older than the CSV.
+    :param grid_csv_path: grid CSV, Grid_ID,X,Y
+    :param cache_path: .npz cache file, the grid CSV path with a .index.npz extension by default
+    :return: GridIndex
+    """
+    if cache_path is None:
+        cache_path = os.path.splitext(grid_csv_path)[0] + '.index.npz'
+    source = _source_stamp(grid_csv_path)
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as arrays:
+                if np.array_equal(arrays['source'], source):
+                    return GridIndex.from_arrays(dict((name, arrays[name]) for name in CACHE_ARRAYS))
+        except Exception:
+            logger.warning("Ignoring unreadable grid index cache {}".format(cache_path), exc_info=True)
+
+    grid_ids, x, y = read_grid(grid_csv_path)
+    index = GridIndex(grid_ids, x, y)
+    try:
+        with open(cache_path, 'wb') as f:
+            np.savez(f, source=source, **dict((name, getattr(index, name)) for name in CACHE_ARRAYS[:-1]))
+    except OSError:
+        logger.warning("Could not cache the grid index in {}".format(cache_path), exc_info=True)
+    return index
@@ -0,0 +1,157 @@
+"""
+Sync of the FLO2D output stations of curw_fcst with the CHANNEL_CELL_MAP and FLOOD_PLAIN_CELL_MAP
+of the model parameter files (flo2d_250.json, flo2d_150.json).
+
+The stations of a model are fetched in one query and diffed against the maps: only stations of new
+cells are inserted and only stations whose name changed are updated, in one transaction. Stations
+of cells no longer in the maps are reported but kept, their timeseries may still be in use, and
+cells with more than one station are reported and left alone.
+
+Station ids are allocated the way db_adapter's add_station does, after the last id within the id
+range of the station type (StationEnum.getRange). The stations of the type are read with a locking
+read, so a sync running at the same time waits for this one to commit before it diffs.
+"""
+import logging
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Maps of a model parameter file, with the description suffix of their stations
+CELL_MAPS = (('CHANNEL_CELL_MAP', 'channel_cell_map_element'), ('FLOOD_PLAIN_CELL_MAP', 'flood_plain_cell_map_element'))
+
+Station = namedtuple('Station', ['element', 'name', 'latitude', 'longitude', 'description'])
+
+StationDiff = namedtuple('StationDiff', ['new', 'renamed', 'unchanged', 'unmapped', 'duplicated'])
+
+
+def id_range(station_type):
+    """
+    :param station_type: db_adapter StationEnum member, of curw_fcst or curw_obs
+    :return: (first id, last id + 1) of the stations of the type, as allocated by db_adapter
+    """
+    return station_type.value, station_type.value + type(station_type).getRange(station_type)
+
+
+def element_of(name):
+    """
+    :param name: station name, '<grid id>_<place name>'
+    :return: grid id of the station, as a string
+    """
+    return name.split('_', 1)[0]
+
+
+def mapped_stations(params, grids, model):
+    """
+    :param params: model parameter dict, with CHANNEL_CELL_MAP and FLOOD_PLAIN_CELL_MAP
+    :param grids: rows of the model grid CSV, [grid id, longitude, latitude]
+    :param model: model name prefixing the station descriptions
+    :return: OrderedDict of grid id -> Station
+    """
+    stations = OrderedDict()
+    for map_name, description in CELL_MAPS:
+        for element, place in (params.get(map_name) or {}).items():
+            if element in stations:
+                logger.warning("Cell {} is mapped more than once, keeping {}".format(element, stations[element].name),
+                        extra={'event': 'station_duplicate', 'model': model, 'element': element})
+                continue
+            grid = grids[int(element) - 1]
+            stations[element] = Station(element, "{}_{}".format(element, place), "%.6f" % float(grid[2]),
+                    "%.6f" % float(grid[1]), "{}_{}".format(model, description))
+    return stations
+
+
+def fetch_stations(cursor, station_type, lock=False):
+    """
+    Fetch the stations of a station type in one query.
+    :param cursor: curw_fcst cursor
+    :param station_type: db_adapter StationEnum member
+    :param lock: lock the id range of the type until the transaction ends (SELECT ... FOR UPDATE)
+    :return: OrderedDict of grid id -> list of (station id, name), more than one if the cell has
+    several stations
+    """
+    cursor.execute("SELECT `id`, `name` FROM `station` WHERE `id` >= %s AND `id` < %s ORDER BY `id`" +
+                   (" FOR UPDATE" if lock else ""), id_range(station_type))
+    existing = OrderedDict()
+    for id_, name in cursor.fetchall():
+        existing.setdefault(element_of(name), []).append((id_, name))
+    return existing
+
+
+def diff_stations(mapped, existing):
+    """
+    :param mapped: OrderedDict of grid id -> Station, from mapped_stations()
+    :param existing: dict of grid id -> list of (station id, name), from fetch_stations()
+    :return: StationDiff of the new Stations, the (station id, Station) renamed, the number of stations
+    unchanged, the grid ids of existing stations no longer mapped and the dict of grid id -> list of
+    (station id, name) of the cells with more than one station, neither renamed nor added to
+    """
+    new = []
+    renamed = []
+    unchanged = 0
+    duplicated = OrderedDict((element, rows) for element, rows in existing.items() if len(rows) > 1)
+    for element, station in mapped.items():
+        if element not in existing:
+            new.append(station)
+        elif element in duplicated:
+            continue
+        elif existing[element][0][1]!=station.name:
+            renamed.append((existing[element][0][0], station))
+        else:
+            unchanged += 1
+    unmapped = [element for element in existing if element not in mapped]
+    return StationDiff(new, renamed, unchanged, unmapped, duplicated)
+
+
+def sync_stations(pool, models, dry_run=False):
+    """
+    Bring the FLO2D output stations of curw_fcst in line with the cell maps, in one transaction.
+    :param pool: curw_fcst connection pool
+    :param models: list of (StationEnum member, model name prefixing the station descriptions, e.g. FLO2D_250
+    of db_adapter.curw_sim.constants, model parameter dict, grid CSV rows)
+    :param dry_run: only log the diff
+    :return: dict of station type name -> StationDiff
+    """
+    diffs = OrderedDict()
+    connection = pool.connection()
+    try:
+        with connection.cursor() as cursor:
+            for station_type, model, params, grids in models:
+                existing = fetch_stations(cursor, station_type, lock=not dry_run)
+                diff = diff_stations(mapped_stations(params, grids, model), existing)
+                diffs[station_type.name] = diff
+                logger.info("{}: {} new, {} renamed, {} unchanged, {} no longer mapped stations".format(
+                        station_type.name, len(diff.new), len(diff.renamed), diff.unchanged, len(diff.unmapped)),
+                        extra={'event': 'station_diff', 'station_type': station_type.name, 'new': len(diff.new),
+                               'renamed': len(diff.renamed), 'unchanged': diff.unchanged,
+                               'unmapped': diff.unmapped[:100]})
+                if diff.duplicated:
+                    logger.error("{}: {} cells have more than one station, they are left as they are: {}".format(
+                            station_type.name, len(diff.duplicated), ', '.join(
+                                    '{} ({})'.format(element, ', '.join(str(id_) for id_, name in rows))
+                                    for element, rows in list(diff.duplicated.items())[:20])),
+                            extra={'event': 'station_duplicated', 'station_type': station_type.name,
+                                   'duplicated': dict(list(diff.duplicated.items())[:100])})
+                if dry_run:
+                    continue
+
+                first_id, end_id = id_range(station_type)
+                next_id = max([id_ for rows in existing.values() for id_, name in rows] + [first_id - 1]) + 1
+                if next_id + len(diff.new) > end_id:
+                    raise ValueError("No room left for {} new {} stations".format(len(diff.new), station_type.name))
+                if diff.new:
+                    cursor.executemany(
+                            "INSERT INTO `station` (`id`, `name`, `latitude`, `longitude`, `description`) "
+                            "VALUES (%s, %s, %s, %s, %s)",
+                            [(next_id + i, station.name, station.latitude, station.longitude, station.description)
+                             for i, station in enumerate(diff.new)])
+                if diff.renamed:
+                    cursor.executemany("UPDATE `station` SET `name`=%s, `description`=%s WHERE `id`=%s",
+                            [(station.name, station.description, id_) for id_, station in diff.renamed])
+        if not dry_run:
+            connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return diffs
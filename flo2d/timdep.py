@@ -0,0 +1,104 @@
+"""
+Readers for the FLO2D TIMDEP.OUT output file.
+
+TIMDEP.OUT holds one block per output timestep. A block starts with a line that carries only the
+model time (hours since the start of the simulation), followed by one row per grid cell:
+
+    <grid_id> <depth> ... <water surface elevation>
+
+FLO2D writes the cell rows in the same order in every block, so the position of a cell learnt from
+one block can be reused to read that cell straight out of every later block.
+"""
+
+BUFSIZE = 65536
+
+# Column positions within a TIMDEP.OUT cell row
+TIMDEP_CELL_COLUMN = 0
+TIMDEP_DEPTH_COLUMN = 1
+TIMDEP_ELEVATION_COLUMN = 5
+
+# Stage of the run metrics the reading and parsing of TIMDEP.OUT is recorded under
+TIMDEP_PARSE_STAGE = 'timdep_parse'
+
+
+def iter_timdep_blocks(infile, bufsize=BUFSIZE):
+    """
+    Iterate over the timestep blocks of an open TIMDEP.OUT file.
+    Rows following a blank line within a block are ignored.
+    :param infile: TIMDEP.OUT file object opened in text mode
+    :param bufsize: size hint passed to readlines()
+    :return: generator of (model_time, rows) tuples, model_time being the model time in hours and
+    rows the raw cell lines of the block
+    """
+    model_time = None
+    rows = []
+    is_block_ended = False
+    while True:
+        lines = infile.readlines(bufsize)
+        if not lines:
+            break
+        for line in lines:
+            tokens = line.split(None, 1)
+            if len(tokens)==1:
+                if model_time is not None:
+                    yield model_time, rows
+                model_time = float(tokens[0])
+                rows = []
+                is_block_ended = False
+            elif not tokens:
+                is_block_ended = True
+            elif model_time is not None and not is_block_ended:
+                rows.append(line)
+
+    if model_time is not None:
+        yield model_time, rows
+
+
+class TimdepRowIndex(object):
+    """
+    Row positions of a fixed set of grid cells within a TIMDEP.OUT block.
+
+    The positions are learnt from the first block with a full scan. Later blocks are read by jumping
+    straight to the learnt rows; if a block has a different number of rows or a learnt row holds
+    some other cell, the block is scanned in full and the positions are learnt again.
+    """
+
+    def __init__(self, cells):
+        """
+        :param cells: grid ids (as strings) of the cells to read
+        """
+        self.cells = set(cells)
+        self.offsets = None
+        self.row_count = None
+        self.full_scans = 0
+
+    def _scan(self, rows):
+        values = {}
+        offsets = {}
+        for position, row in enumerate(rows):
+            cell = row.split(None, 1)[0]
+            if cell in self.cells:
+                values[cell] = row.split()
+                offsets[cell] = position
+
+        self.offsets = offsets
+        self.row_count = len(rows)
+        self.full_scans += 1
+        return values
+
+    def lookup(self, rows):
+        """
+        Read the indexed cells from a block.
+        :param rows: cell rows of one block, as yielded by iter_timdep_blocks()
+        :return: dict of grid id -> split cell row, for the indexed cells present in the block
+        """
+        if self.offsets is None or len(rows)!=self.row_count:
+            return self._scan(rows)
+
+        values = {}
+        for cell, position in self.offsets.items():
+            v = rows[position].split()
+            if v[TIMDEP_CELL_COLUMN]!=cell:
+                return self._scan(rows)
+            values[cell] = v
+        return values
@@ -0,0 +1,99 @@
+"""
+Time handling shared by the FLO2D output readers and the timeseries writer.
+"""
+import logging
+import re
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+DATE_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Value pushed for a time a station has no output for, e.g. a flood plain cell missing from a TIMDEP.OUT block
+MISSING_VALUE = -999
+
+
+def getUTCOffset(utcOffset, default=False):
+    """
+    Get timedelta instance of given UTC offset string.
+    E.g. Given UTC offset string '+05:30' will return
+    datetime.timedelta(hours=5, minutes=30))
+
+    :param string utcOffset: UTC offset in format of [+/1][HH]:[MM]
+    :param boolean default: If True then return 00:00 time offset on invalid format.
+    Otherwise return False on invalid format.
+    """
+    offset_pattern = re.compile("[+-]\d\d:\d\d")
+    match = offset_pattern.match(utcOffset)
+    if match:
+        utcOffset = match.group()
+    else:
+        if default:
+            logger.warning("UTC_OFFSET : {} not in correct format. Using +00:00".format(utcOffset))
+            return timedelta()
+        else:
+            return False
+
+    if utcOffset[0]=="+":  # If timestamp in positive zone, add it to current time
+        offset_str = utcOffset[1:].split(':')
+        return timedelta(hours=int(offset_str[0]), minutes=int(offset_str[1]))
+    if utcOffset[0]=="-":  # If timestamp in negative zone, deduct it from current time
+        offset_str = utcOffset[1:].split(':')
+        return timedelta(hours=-1 * int(offset_str[0]), minutes=-1 * int(offset_str[1]))
+
+
+def isfloat(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def extractForecastTimeseries(timeseries, extract_date, extract_time, by_day=False):
+    """
+    Extracted timeseries upward from given date and time
+    E.g. Consider timeseries 2017-09-01 to 2017-09-03
+    date: 2017-09-01 and time: 14:00:00 will extract a timeseries which contains
+    values that timestamp onwards
+    """
+    if not timeseries:
+        return []
+
+    if by_day:
+        extract_date_time = datetime.strptime(extract_date, '%Y-%m-%d')
+    else:
+        extract_date_time = datetime.strptime('%s %s' % (extract_date, extract_time), DATE_TIME_FORMAT)
+
+    is_date_time = isinstance(timeseries[0][0], datetime)
+    new_timeseries = []
+    for i, tt in enumerate(timeseries):
+        tt_date_time = tt[0] if is_date_time else datetime.strptime(tt[0], DATE_TIME_FORMAT)
+        if tt_date_time >= extract_date_time:
+            new_timeseries = timeseries[i:]
+            break
+
+    return new_timeseries
+
+
+class StepTimes(dict):
+    """
+    Timestamps of model output times, formatted once per run. Every element of a FLO2D output file
+    shares the same output times, so each timestamp is computed for the first element only.
+    """
+
+    def __init__(self, base_time):
+        """
+        :param base_time: datetime of model time 0, i.e. the timeseries start
+        """
+        super(StepTimes, self).__init__()
+        self.base_time = base_time
+
+    def __missing__(self, model_time):
+        """
+        :param model_time: model time in hours, as a float or as read from the file
+        :return: 'YYYY-MM-DD HH:MM:SS' timestamp of the model time
+        """
+        date_and_time = (self.base_time + timedelta(hours=float(model_time))).strftime(DATE_TIME_FORMAT)
+        self[model_time] = date_and_time
+        return date_and_time
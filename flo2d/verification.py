@@ -0,0 +1,318 @@
+"""
+Verification of forecast series against observations: RMSE, bias, Nash-Sutcliffe efficiency and
+peak timing error per station.
+
+The forecast and observed series of all stations are concatenated and joined on (station, time) in
+one sorted search, and the scores of every station are reduced at once with bincount, so verifying
+a run costs a few array operations whatever the number of stations. Missing values (MISSING_VALUE or
+NaN) on either side are dropped before the join, so they never make a pair.
+
+Observations are read from curw_obs, or from a CSV or SQLite stand-in with station, time and value
+columns (see OBSERVATION_SOURCES). Scores are stored per run in a SQLite file, see VerificationStore.
+"""
+import csv
+import logging
+import sqlite3
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from .timeseries import MISSING_VALUE
+
+logger = logging.getLogger(__name__)
+
+# (station, time) join key: station index in the high bits, seconds since the epoch in the low ones
+STATION_SHIFT = 2 ** 40
+
+Score = namedtuple('Score', ['station', 'n', 'rmse', 'bias', 'nse', 'peak_timing_error', 'forecast_peak',
+                             'observed_peak'])
+# peak_timing_error: hours from the observed peak to the forecast peak, positive when the forecast peaks late
+
+
+def to_datetime64(times):
+    """
+    :param times: 'YYYY-MM-DD HH:MM:SS' strings or datetimes
+    :return: datetime64[s] array
+    """
+    return np.array([str(time_) for time_ in times], dtype='datetime64[s]')
+
+
+class CsvObservations(object):
+    """
+    Observations in a CSV file with station, time ('YYYY-MM-DD HH:MM:SS') and value columns.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self, stations, start, end, variable=None):
+        """
+        :param stations: station names
+        :param start: first time, 'YYYY-MM-DD HH:MM:SS'
+        :param end: last time, 'YYYY-MM-DD HH:MM:SS'
+        :param variable: observed variable, e.g. 'WaterLevel'; unused by the file stand-ins
+        :return: list of (station, time, value) rows
+        """
+        stations = set(stations)
+        with open(self.path) as f:
+            return [(row['station'], row['time'], float(row['value'])) for row in csv.DictReader(f)
+                    if row['station'] in stations and start <= row['time'] <= end and row['value']!='']
+
+
+class SqliteObservations(object):
+    """
+    Observations in a SQLite table, `observation` by default, with station, time and value columns.
+    """
+
+    def __init__(self, path, table='observation'):
+        self.path = path
+        self.table = table
+
+    def load(self, stations, start, end, variable=None):
+        stations = list(stations)
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute(
+                    "SELECT station, time, value FROM {} WHERE station IN ({}) AND time BETWEEN ? AND ? "
+                    "AND value IS NOT NULL".format(self.table, ', '.join('?' * len(stations))),
+                    stations + [start, end]).fetchall()
+        finally:
+            connection.close()
+
+
+class CurwObsObservations(object):
+    """
+    Observations in curw_obs, looked up by station name and variable through the run table.
+    """
+
+    def __init__(self, pool=None):
+        """
+        :param pool: curw_obs connection pool, one to the curw_obs of db_adapter.constants is made if None
+        """
+        self.pool = pool
+
+    def load(self, stations, start, end, variable=None):
+        stations = list(stations)
+        pool = self.pool
+        if pool is None:
+            from db_adapter.base import get_Pool
+            from db_adapter.constants import CURW_OBS_HOST, CURW_OBS_USERNAME, CURW_OBS_PASSWORD, CURW_OBS_PORT, \
+                CURW_OBS_DATABASE
+            pool = get_Pool(host=CURW_OBS_HOST, port=CURW_OBS_PORT, user=CURW_OBS_USERNAME, password=CURW_OBS_PASSWORD,
+                    db=CURW_OBS_DATABASE)
+        connection = pool.connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                        "SELECT `station`.`name`, `data`.`time`, `data`.`value` FROM `data` "
+                        "JOIN `run` ON `run`.`id` = `data`.`id` "
+                        "JOIN `station` ON `station`.`id` = `run`.`station` "
+                        "JOIN `variable` ON `variable`.`id` = `run`.`variable` "
+                        "WHERE `station`.`name` IN ({}) AND `variable`.`variable` = %s "
+                        "AND `data`.`time` BETWEEN %s AND %s".format(', '.join(['%s'] * len(stations))),
+                        stations + [variable, start, end])
+                return [(name, str(time_), float(value)) for name, time_, value in cursor.fetchall()
+                        if value is not None]
+        finally:
+            connection.close()
+            if self.pool is None:
+                from db_adapter.base import destroy_Pool
+                destroy_Pool(pool=pool)
+
+
+OBSERVATION_SOURCES = {
+        'curw_obs': CurwObsObservations,
+        'csv'     : CsvObservations,
+        'sqlite'  : SqliteObservations
+        }
+
+
+def get_observations(spec):
+    """
+    :param spec: dict of the observation source type and its keyword arguments,
+    e.g. {"type": "csv", "path": "/data/obs_water_level.csv"} or {"type": "curw_obs"}
+    :return: observation source, with a load(stations, start, end, variable) method
+    """
+    options = dict(spec)
+    name = options.pop('type', None)
+    if name not in OBSERVATION_SOURCES:
+        raise ValueError("Unknown observation source {}. Should be one of {}".format(name,
+                ', '.join(OBSERVATION_SOURCES)))
+    return OBSERVATION_SOURCES[name](**options)
+
+
+def _keys(station_index, times):
+    return station_index.astype(np.int64) * STATION_SHIFT + times.astype('datetime64[s]').astype(np.int64)
+
+
+def _present(station, time_, value):
+    """
+    :return: the (station index, time, value) arrays without the missing values
+    """
+    present = (value!=MISSING_VALUE) & ~np.isnan(value)
+    return station[present], time_[present], value[present]
+
+
+def align(forecast, observed, tolerance=0):
+    """
+    Pair every forecast value with the observation of the same station nearest in time, within the
+    tolerance. Missing forecast and observed values are left out.
+    :param forecast: (station index array, datetime64 array, value array) of all stations
+    :param observed: (station index array, datetime64 array, value array) of all stations
+    :param tolerance: seconds an observation may be away from the forecast time
+    :return: (station index, time, forecast value, observed value) arrays of the pairs
+    """
+    f_station, f_time, f_value = _present(*forecast)
+    o_station, o_time, o_value = _present(*observed)
+    f_keys = _keys(f_station, f_time)
+    o_keys = _keys(o_station, o_time)
+    order = np.argsort(o_keys, kind='stable')
+    o_keys, o_value = o_keys[order], o_value[order]
+    if not len(o_keys):
+        empty = np.empty(0)
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype='datetime64[s]'), empty, empty
+
+    after = np.clip(np.searchsorted(o_keys, f_keys), 0, len(o_keys) - 1)
+    before = np.clip(after - 1, 0, len(o_keys) - 1)
+    is_before = np.abs(o_keys[before] - f_keys) < np.abs(o_keys[after] - f_keys)
+    nearest = np.where(is_before, before, after)
+    paired = np.abs(o_keys[nearest] - f_keys) <= tolerance
+    return f_station[paired], f_time[paired], f_value[paired], o_value[nearest[paired]]
+
+
+def _peaks(station, time_, value, size):
+    """
+    :return: (time, value) of the first maximum of each station, NaT/NaN for stations without values
+    """
+    order = np.lexsort((-np.arange(len(value)), value, station))
+    station, time_, value = station[order], time_[order], value[order]
+    last = np.flatnonzero(np.r_[station[1:]!=station[:-1], True]) if len(station) else np.empty(0, dtype=np.int64)
+    peak_time = np.full(size, np.datetime64('NaT'), dtype='datetime64[s]')
+    peak_value = np.full(size, np.nan)
+    peak_time[station[last]] = time_[last]
+    peak_value[station[last]] = value[last]
+    return peak_time, peak_value
+
+
+def skill_scores(stations, station, time_, forecast, observed):
+    """
+    Scores of every station from the aligned pairs, in one pass.
+    :param stations: station names, by station index
+    :param station: station index array of the pairs
+    :param time_: datetime64 array of the pairs
+    :param forecast: forecast value array of the pairs
+    :param observed: observed value array of the pairs
+    :return: list of Score, by station index; NaN scores for stations without pairs
+    """
+    size = len(stations)
+    n = np.bincount(station, minlength=size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        error = forecast - observed
+        bias = np.bincount(station, error, minlength=size) / n
+        sse = np.bincount(station, error ** 2, minlength=size)
+        rmse = np.sqrt(sse / n)
+        mean_observed = np.bincount(station, observed, minlength=size) / n
+        variance = np.bincount(station, (observed - mean_observed[station]) ** 2, minlength=size)
+        nse = np.where(variance > 0, 1 - sse / variance, np.nan)
+    forecast_peak_time, forecast_peak = _peaks(station, time_, forecast, size)
+    observed_peak_time, observed_peak = _peaks(station, time_, observed, size)
+    peak_timing_error = (forecast_peak_time - observed_peak_time).astype('timedelta64[s]').astype(np.float64) / 3600
+    peak_timing_error[np.isnat(forecast_peak_time) | np.isnat(observed_peak_time)] = np.nan
+    return [Score(stations[i], int(n[i]), float(rmse[i]), float(bias[i]), float(nse[i]), float(peak_timing_error[i]),
+                  float(forecast_peak[i]), float(observed_peak[i])) for i in range(size)]
+
+
+def verify(series, observations, variable, tolerance=0):
+    """
+    :param series: OrderedDict of station name -> (datetime64 array, value array) of the forecast
+    :param observations: observation source, see get_observations()
+    :param variable: observed variable, e.g. 'WaterLevel'
+    :param tolerance: seconds an observation may be away from the forecast time
+    :return: list of Score, in the order of the stations
+    """
+    stations = list(series)
+    if not stations:
+        return []
+    f_station = np.concatenate([np.full(len(times), i, dtype=np.int64) for i, (times, _) in enumerate(series.values())])
+    f_time = np.concatenate([times for times, _ in series.values()])
+    f_value = np.concatenate([values for _, values in series.values()])
+    start = str(f_time.min() - np.timedelta64(tolerance, 's')).replace('T', ' ')
+    end = str(f_time.max() + np.timedelta64(tolerance, 's')).replace('T', ' ')
+
+    rows = observations.load(stations, start, end, variable)
+    index_of = dict((station, i) for i, station in enumerate(stations))
+    o_station = np.array([index_of[row[0]] for row in rows], dtype=np.int64)
+    o_time = to_datetime64([row[1] for row in rows])
+    o_value = np.array([row[2] for row in rows], dtype=np.float64)
+
+    return skill_scores(stations, *align((f_station, f_time, f_value), (o_station, o_time, o_value), tolerance))
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verification (
+    fgt TEXT NOT NULL,
+    sim_tag TEXT NOT NULL,
+    model TEXT NOT NULL,
+    version TEXT NOT NULL,
+    variable TEXT NOT NULL,
+    station TEXT NOT NULL,
+    element TEXT,
+    n INTEGER NOT NULL,
+    rmse REAL,
+    bias REAL,
+    nse REAL,
+    peak_timing_error REAL,
+    forecast_peak REAL,
+    observed_peak REAL,
+    created TEXT NOT NULL,
+    PRIMARY KEY (fgt, sim_tag, model, version, variable, station)
+);
+"""
+
+
+class VerificationStore(object):
+    """
+    Scores of each run (fgt, sim tag, model and version) and station, in a SQLite file. Verifying a
+    run again replaces its scores.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def save(self, run, variable, scores, elements=None):
+        """
+        :param run: dict with the fgt, sim_tag, model and version of the run
+        :param variable: verified variable
+        :param scores: list of Score
+        :param elements: dict of station name -> FLO2D element
+        """
+        elements = elements or {}
+        created = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        connection = sqlite3.connect(self.path)
+        try:
+            connection.executescript(SCHEMA)
+            with connection:
+                connection.executemany(
+                        "INSERT OR REPLACE INTO verification VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(str(run['fgt']), str(run['sim_tag']), str(run['model']), str(run['version']), variable,
+                          score.station, elements.get(score.station), score.n) +
+                         tuple(None if np.isnan(value) else value for value in score[2:]) + (created,)
+                         for score in scores])
+        finally:
+            connection.close()
+
+    def load(self, fgt=None):
+        """
+        :param fgt: forecast generated time of the run, all runs if None
+        :return: list of the stored score rows, as OrderedDicts
+        """
+        connection = sqlite3.connect(self.path)
+        try:
+            connection.executescript(SCHEMA)
+            cursor = connection.execute("SELECT * FROM verification" + (" WHERE fgt = ?" if fgt else "") +
+                                        " ORDER BY fgt, station", (fgt,) if fgt else ())
+            columns = [column[0] for column in cursor.description]
+            return [OrderedDict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            connection.close()
@@ -0,0 +1,69 @@
+"""
+Writes extracted FLO2D series to the sinks of a run (flo2d.sinks).
+"""
+from datetime import datetime
+
+from .backends import get_backend
+from .sinks import Series, FanOut, TimeseriesSink
+from .timeseries import extractForecastTimeseries, DATE_TIME_FORMAT
+
+
+def save_forecast_timeseries_to_db(pool, timeseries, run_date, run_time, opts, flo2d_stations, fgt, backend=None,
+        metrics=None, sink=None):
+    """
+    Cut a series at the run time (after shifting it by opts['utcOffset'], if given) and hand it to
+    the sink, or write it straight to the timeseries backend when no sink is given.
+    :param sink: flo2d.sinks FanOut (or Sink) of the run
+    """
+    # {
+    #         'tms_id'     : '',
+    #         'sim_tag'    : '',
+    #         'station_id' : '',
+    #         'source_id'  : '',
+    #         'unit_id'    : '',
+    #         'variable_id': ''
+    #         }
+
+    # Convert date time with offset
+    date_time = datetime.strptime('%s %s' % (run_date, run_time), DATE_TIME_FORMAT)
+    if 'utcOffset' in opts:
+        date_time = date_time + opts['utcOffset']
+        run_date = date_time.strftime('%Y-%m-%d')
+        run_time = date_time.strftime('%H:%M:%S')
+
+    # If there is an offset, shift by offset before proceed
+    forecast_timeseries = []
+    if 'utcOffset' in opts:
+        for item in timeseries:
+            forecast_timeseries.append(
+                    [datetime.strptime(item[0], DATE_TIME_FORMAT) + opts['utcOffset'], item[1]])
+
+        forecast_timeseries = extractForecastTimeseries(timeseries=forecast_timeseries, extract_date=run_date,
+                extract_time=run_time)
+    else:
+        forecast_timeseries = extractForecastTimeseries(timeseries=timeseries, extract_date=run_date,
+                extract_time=run_time)
+
+    if len(forecast_timeseries)==0:
+        # Nothing at or after the run time, e.g. an early window of a chunked series
+        return
+
+    elementNo = opts.get('elementNo')
+
+    # Copied, as sinks may hold on to the metadata of a series until their batch is written
+    tms_meta = dict(opts.get('tms_meta'))
+
+    tms_meta['latitude'] = str(flo2d_stations.get(elementNo)[1])
+    tms_meta['longitude'] = str(flo2d_stations.get(elementNo)[2])
+    tms_meta['station_id'] = flo2d_stations.get(elementNo)[0]
+
+    series = Series(elementNo, tms_meta, forecast_timeseries, fgt)
+    if sink is not None:
+        sink.write(series)
+        return
+
+    # Timeseries backend, the curw_fcst database unless configured otherwise
+    sinks = FanOut([TimeseriesSink(backend if backend is not None else get_backend('curw_fcst', pool), metrics)],
+            metrics)
+    sinks.write(series)
+    sinks.close()
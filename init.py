@@ -1,24 +1,55 @@
 import traceback
 import json
+import sys
+import getopt
 
 from db_adapter.base import get_Pool, destroy_Pool
 
 from db_adapter.curw_fcst.source import get_source_id, add_source
 from db_adapter.curw_fcst.variable import get_variable_id, add_variable
 from db_adapter.curw_fcst.unit import get_unit_id, add_unit, UnitType
-from db_adapter.curw_fcst.station import add_station, StationEnum
+from db_adapter.curw_fcst.station import StationEnum
 from db_adapter.constants import CURW_FCST_HOST, CURW_FCST_USERNAME, CURW_FCST_PASSWORD, CURW_FCST_PORT, CURW_FCST_DATABASE
 from db_adapter.curw_sim.constants import FLO2D_250, FLO2D_150
 
 from db_adapter.csv_utils import read_csv
 
 from logger import logger
+from flo2d.stations import sync_stations
+
+
+def usage():
+    usageText = """
+    Usage: python init.py [-n]
+
+    Adds the FLO2D sources, variable and unit to curw_fcst (unless -n), and syncs the FLO2D_250 and FLO2D_150
+    output stations with the CHANNEL_CELL_MAP and FLOOD_PLAIN_CELL_MAP of flo2d_250.json and
+    flo2d_150.json: stations of new cells are added and renamed cells are updated.
+
+    -h  --help          Show usage
+    -n  --dry-run       Only log the station changes, without writing them.
+    """
+    print(usageText)
 
 
 if __name__=="__main__":
 
     try:
 
+        dry_run = False
+
+        try:
+            opts, args = getopt.getopt(sys.argv[1:], "hn", ["help", "dry-run"])
+        except getopt.GetoptError:
+            usage()
+            sys.exit(2)
+        for opt, arg in opts:
+            if opt in ("-h", "--help"):
+                usage()
+                sys.exit()
+            elif opt in ("-n", "--dry-run"):
+                dry_run = True
+
         #####################################################
         # Initialize parameters for FLO2D_250 and FLO2D_150 #
         #####################################################
@@ -56,47 +87,17 @@ if __name__=="__main__":
         #
         # pool = get_Pool(host=HOST, port=PORT, user=USERNAME, password=PASSWORD, db=DATABASE)
 
-        add_source(pool=pool, model=FLO2D_model, version=FLO2D_250_version, parameters=FLO2D_250_params)
-        add_source(pool=pool, model=FLO2D_model, version=FLO2D_150_version, parameters=FLO2D_150_params)
-        add_variable(pool=pool, variable=variable)
-        add_unit(pool=pool, unit=unit, unit_type=unit_type)
-
-        # add flo2d 250 output stations
-
-        channel_cell_map_250 = FLO2D_250_params.get('CHANNEL_CELL_MAP')
-
-        for channel_cell_map_250_key in channel_cell_map_250.keys():
-            add_station(pool=pool, name="{}_{}".format(channel_cell_map_250_key, channel_cell_map_250.get(channel_cell_map_250_key)),
-                    latitude="%.6f" % float(flo2d_250_grids[int(channel_cell_map_250_key)-1][2]),
-                    longitude="%.6f" % float(flo2d_250_grids[int(channel_cell_map_250_key)-1][1]),
-                    station_type=StationEnum.FLO2D_250, description="{}_channel_cell_map_element".format(FLO2D_250))
-
-        flood_plain_cell_map_250 = FLO2D_250_params.get('FLOOD_PLAIN_CELL_MAP')
-
-        for flood_plain_cell_map_250_key in flood_plain_cell_map_250.keys():
-            add_station(pool=pool, name="{}_{}".format(flood_plain_cell_map_250_key, flood_plain_cell_map_250.get(flood_plain_cell_map_250_key)),
-                    latitude="%.6f" % float(flo2d_250_grids[int(flood_plain_cell_map_250_key)-1][2]),
-                    longitude="%.6f" % float(flo2d_250_grids[int(flood_plain_cell_map_250_key)-1][1]),
-                    station_type=StationEnum.FLO2D_250, description="{}_flood_plain_cell_map_element".format(FLO2D_250))
-
-        # add flo2d 150 output stations
-
-        channel_cell_map_150 = FLO2D_150_params.get('CHANNEL_CELL_MAP')
-
-        for channel_cell_map_150_key in channel_cell_map_150.keys():
-            add_station(pool=pool, name="{}_{}".format(channel_cell_map_150_key, channel_cell_map_150.get(channel_cell_map_150_key)),
-                    latitude="%.6f" % float(flo2d_150_grids[int(channel_cell_map_150_key) - 1][2]),
-                    longitude="%.6f" % float(flo2d_150_grids[int(channel_cell_map_150_key) - 1][1]),
-                    station_type=StationEnum.FLO2D_150, description="{}_channel_cell_map_element".format(FLO2D_150))
+        if not dry_run:
+            add_source(pool=pool, model=FLO2D_model, version=FLO2D_250_version, parameters=FLO2D_250_params)
+            add_source(pool=pool, model=FLO2D_model, version=FLO2D_150_version, parameters=FLO2D_150_params)
+            add_variable(pool=pool, variable=variable)
+            add_unit(pool=pool, unit=unit, unit_type=unit_type)
 
-        flood_plain_cell_map_150 = FLO2D_150_params.get('FLOOD_PLAIN_CELL_MAP')
+        # sync flo2d 250 and flo2d 150 output stations with their cell maps
 
-        for flood_plain_cell_map_150_key in flood_plain_cell_map_150.keys():
-            add_station(pool=pool,
-                    name="{}_{}".format(flood_plain_cell_map_150_key, flood_plain_cell_map_150.get(flood_plain_cell_map_150_key)),
-                    latitude="%.6f" % float(flo2d_150_grids[int(flood_plain_cell_map_150_key) - 1][2]),
-                    longitude="%.6f" % float(flo2d_150_grids[int(flood_plain_cell_map_150_key) - 1][1]),
-                    station_type=StationEnum.FLO2D_150, description="{}_flood_plain_cell_map_element".format(FLO2D_150))
+        sync_stations(pool=pool, models=[(StationEnum.FLO2D_250, FLO2D_250, FLO2D_250_params, flo2d_250_grids),
+                                         (StationEnum.FLO2D_150, FLO2D_150, FLO2D_150_params, flo2d_150_grids)],
+                dry_run=dry_run)
 
         destroy_Pool(pool=pool)
 
@@ -1 +1 @@
-from .logger import logger
+from .logger import logger, EventSampler
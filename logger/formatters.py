@@ -0,0 +1,28 @@
+import json
+import logging
+
+# LogRecord attributes that are not structured fields of an event
+RECORD_ATTRIBUTES = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line. Values passed with extra={...} become fields
+    of the object, e.g. logger.info("Station pushed", extra={'event': 'db_write', 'station': '179'}).
+    """
+
+    def format(self, record):
+        entry = {
+                'time'   : self.formatTime(record, self.datefmt),
+                'level'  : record.levelname,
+                'logger' : record.name,
+                'message': record.getMessage()
+                }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
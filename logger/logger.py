@@ -1,10 +1,69 @@
+import atexit
+import copy
 import logging
 import logging.config
+import os
+import queue
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener
+
 import yaml
 
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logger_config.yaml')
 
-with open('logger_config.yaml', 'r') as f:
+with open(CONFIG_PATH, 'r') as f:
     config = yaml.safe_load(f.read())
     logging.config.dictConfig(config)
 
-logger = logging.getLogger(__name__)
\ No newline at end of file
+
+
+class StructuredQueueHandler(QueueHandler):
+    """
+    QueueHandler that keeps the extra fields and the traceback of a record apart from its
+    message, instead of flattening everything into the message like QueueHandler.prepare does.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# Hand the configured handlers to a background listener, so callers only pay for a queue put
+# and file I/O stays off the parse and upload path
+root = logging.getLogger()
+handlers = root.handlers[:]
+for handler in handlers:
+    root.removeHandler(handler)
+log_queue = queue.Queue(-1)
+root.addHandler(StructuredQueueHandler(log_queue))
+listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)
+
+logger = logging.getLogger(__name__)
+
+
+class EventSampler(object):
+    """
+    Rate limits repetitive log events: lets the first `first` occurrences of an event through,
+    then one in every `every`.
+    """
+
+    def __init__(self, first=5, every=100):
+        self.first = first
+        self.every = every
+        self.counts = Counter()
+
+    def __call__(self, event):
+        """
+        :param event: event name, e.g. 'db_write_failed'
+        :return: occurrence number of the event if it should be logged, else 0
+        """
+        self.counts[event] += 1
+        count = self.counts[event]
+        return count if count <= self.first or count % self.every==0 else 0
@@ -0,0 +1,81 @@
+import traceback
+import sys
+import os
+import getopt
+
+from logger import logger
+from flo2d.obs_mapping import read_station_file, fetch_obs_stations, map_stations, write_mapping
+
+
+def usage():
+    usageText = """
+    Usage: python map_obs_stations.py [-f stations.csv | -t CUrW_WaterLevelGauge] [-o output_dir] [-m 1.0]
+
+    Resolves observation stations to their nearest FLO2D_250 and FLO2D_150 grid cells, and writes
+    candidate cell maps (obs_water_level_250.json, obs_water_level_150.json, in the layout of the
+    model parameter files read by init.py) with the distances in obs_water_level_diagnostics.csv.
+
+    -h  --help          Show usage
+    -f  --file          CSV of the stations, with name, latitude and longitude columns (and optionally id).
+    -t  --station_type  curw_obs station type of the stations, used when no file is given
+                        (default: CUrW_WaterLevelGauge).
+    -o  --output_dir    Directory the cell maps and diagnostics are written to (default: current directory).
+    -m  --max_distance  Distance, in cell sizes, beyond which a station is left out of a model (default: 1.0).
+    """
+    print(usageText)
+
+
+if __name__=="__main__":
+
+    try:
+
+        station_file = None
+        station_type = 'CUrW_WaterLevelGauge'
+        output_dir = os.getcwd()
+        max_distance = 1.0
+
+        try:
+            opts, args = getopt.getopt(sys.argv[1:], "hf:t:o:m:",
+                                       ["help", "file=", "station_type=", "output_dir=", "max_distance="])
+        except getopt.GetoptError:
+            usage()
+            sys.exit(2)
+        for opt, arg in opts:
+            if opt in ("-h", "--help"):
+                usage()
+                sys.exit()
+            elif opt in ("-f", "--file"):
+                station_file = arg.strip()
+            elif opt in ("-t", "--station_type"):
+                station_type = arg.strip()
+            elif opt in ("-o", "--output_dir"):
+                output_dir = arg.strip()
+            elif opt in ("-m", "--max_distance"):
+                max_distance = float(arg.strip())
+
+        if station_file is not None:
+            stations = read_station_file(station_file)
+        else:
+            from db_adapter.base import get_Pool, destroy_Pool
+            from db_adapter.curw_obs.station import StationEnum
+            from db_adapter.constants import CURW_OBS_HOST, CURW_OBS_USERNAME, CURW_OBS_PASSWORD, CURW_OBS_PORT, \
+                CURW_OBS_DATABASE
+
+            pool = get_Pool(host=CURW_OBS_HOST, port=CURW_OBS_PORT, user=CURW_OBS_USERNAME, password=CURW_OBS_PASSWORD,
+                    db=CURW_OBS_DATABASE)
+            try:
+                stations = fetch_obs_stations(pool, StationEnum.getType(station_type))
+            finally:
+                destroy_Pool(pool=pool)
+
+        # grid CSVs are next to this script
+        matches = map_stations(stations, os.path.dirname(os.path.abspath(__file__)), max_distance)
+
+        for file_path in write_mapping(matches, output_dir):
+            print("Written {}".format(file_path))
+
+    except Exception:
+        logger.info("Station mapping failed.")
+        traceback.print_exc()
+    finally:
+        logger.info("Station mapping finished.")
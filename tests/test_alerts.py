@@ -0,0 +1,134 @@
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flo2d.alerts import ALERT_CHANNELS, WebhookAlerts, read_thresholds
+from flo2d.sinks import AlertSink, Series
+
+HAS_DB_ADAPTER = importlib.util.find_spec('db_adapter') is not None
+
+
+class SlowWebhook(BaseHTTPRequestHandler):
+    received = []
+
+    def do_POST(self):
+        time.sleep(0.2)
+        SlowWebhook.received.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RecordingChannel(object):
+    # Rows in the stand-in database when each alert was emitted
+    rows_at_emit = []
+    db = None
+
+    def emit(self, alert):
+        RecordingChannel.rows_at_emit.append(len(RecordingChannel.db.backend.data))
+
+    def close(self):
+        pass
+
+
+def water_level(element, values):
+    return Series(element, {'variable': 'WaterLevel', 'station_id': 1},
+            [['2019-05-24 0{}:00:00'.format(i), value] for i, value in enumerate(values)], '2019-05-24 06:00:00')
+
+
+class AlertSinkTest(unittest.TestCase):
+
+    def test_first_crossing_of_each_level_once(self):
+        emitted = []
+        channel = type('Channel', (), {'emit': lambda self, alert: emitted.append(alert), 'close': lambda self: None})
+        sink = AlertSink(read_thresholds({'179': {'alert': 1.2, 'major': 2.0}}), {'test': channel()})
+        sink.write(water_level('179', ['1.0', '1.5', '1.3']))
+        sink.write(water_level('179', ['1.4', '2.1', '2.5']))
+        sink.write(water_level('180', ['9.0']))
+        sink.close()
+        self.assertEqual([(alert['level'], alert['time'], alert['value']) for alert in emitted],
+                [('alert', '2019-05-24 01:00:00', 1.5), ('major', '2019-05-24 01:00:00', 2.1)])
+
+
+class WebhookAlertsTest(unittest.TestCase):
+
+    def setUp(self):
+        SlowWebhook.received = []
+        self.server = HTTPServer(('127.0.0.1', 0), SlowWebhook)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_alerts_are_posted_off_the_caller_thread(self):
+        webhook = WebhookAlerts('http://127.0.0.1:{}/alerts'.format(self.server.server_port))
+        start = time.monotonic()
+        for i in range(3):
+            webhook.emit({'level': 'alert', 'element': str(i)})
+        self.assertLess(time.monotonic() - start, 0.1)
+        webhook.close()
+        self.assertEqual([alert['element'] for alert in SlowWebhook.received], ['0', '1', '2'])
+
+    def test_close_gives_up_after_its_timeout(self):
+        webhook = WebhookAlerts('http://127.0.0.1:{}/alerts'.format(self.server.server_port), close_timeout=0.1)
+        for i in range(5):
+            webhook.emit({'level': 'alert', 'element': str(i)})
+        start = time.monotonic()
+        webhook.close()
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertLess(len(SlowWebhook.received), 5)
+
+
+@unittest.skipUnless(HAS_DB_ADAPTER, 'needs db_adapter')
+class EngineAlertsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        ALERT_CHANNELS['recording'] = RecordingChannel
+        RecordingChannel.rows_at_emit = []
+
+    def tearDown(self):
+        del ALERT_CHANNELS['recording']
+        shutil.rmtree(self.work_dir)
+
+    def test_alerts_go_out_before_the_resampled_series(self):
+        import flo2d.engine
+        from benchmarks import run
+        from benchmarks.stand_in_db import StandInDatabase, install
+
+        output_dir, db_args, _ = run.prepare_workspace(self.work_dir, 250, 20, 8, 4, 0.0)
+        config_path = os.path.join(self.work_dir, 'extract', 'config.json')
+        with open(config_path) as f:
+            config = json.loads(f.read())
+        config['JOURNAL_FILE'] = ''
+        config['SINKS'] = [{'type': 'curw_fcst'}]
+        config['RESAMPLE'] = {'step_minutes': 15}
+        config['ALERTS'] = [{'type': 'recording'}]
+        config['ALERT_THRESHOLDS'] = dict((element, {'alert': -100}) for element in db_args[0])
+        with open(config_path, 'w') as f:
+            f.write(json.dumps(config))
+
+        db = StandInDatabase(*db_args)
+        install(flo2d.engine, db)
+        RecordingChannel.db = db
+        summary = flo2d.engine.extract_and_upload(config_path, output_dir, run.TS_START_DATE, run.TS_START_TIME,
+                run.TS_START_DATE, run.TS_START_TIME, 'upload_waterlevels')
+        self.assertEqual(summary['status'], 'ok')
+        self.assertEqual(RecordingChannel.rows_at_emit, [0] * len(db_args[0]))
+        self.assertGreater(len(db.backend.data), 0)
+
+
+if __name__=='__main__':
+    unittest.main()
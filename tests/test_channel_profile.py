@@ -0,0 +1,55 @@
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flo2d.channel_profile import ChannelProfile
+
+HAS_NETCDF4 = importlib.util.find_spec('netCDF4') is not None
+
+
+def hydrograph(peak_at):
+    return [[str(hour), str(10.0 + (hour==peak_at))] for hour in (0.0, 1.0, 2.0)]
+
+
+@unittest.skipUnless(HAS_NETCDF4, 'needs netCDF4')
+class ChannelProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.work_dir, 'channel_profile.nc')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_complete_profile_replaces_the_file(self):
+        from netCDF4 import Dataset
+
+        profile = ChannelProfile(self.path, datetime(2019, 5, 24), chunk_elements=2)
+        for element, peak_at in ((101, 0.0), (102, 2.0), (103, 1.0)):
+            profile.add(element, hydrograph(peak_at))
+        profile.close()
+        self.assertEqual(os.listdir(self.work_dir), ['channel_profile.nc'])
+        with Dataset(self.path) as nc:
+            self.assertEqual(list(nc.variables['element'][:]), [101, 102, 103])
+            self.assertEqual(list(nc.variables['time_of_max_water_surface_elevation'][:]), [0.0, 2.0, 1.0])
+
+    def test_incomplete_profile_leaves_the_previous_file(self):
+        with open(self.path, 'w') as f:
+            f.write('previous run')
+        profile = ChannelProfile(self.path, datetime(2019, 5, 24), chunk_elements=2)
+        for element, peak_at in ((101, 0.0), (102, 2.0), (103, 1.0)):
+            profile.add(element, hydrograph(peak_at))
+        profile.close(complete=False)
+        self.assertEqual(os.listdir(self.work_dir), ['channel_profile.nc'])
+        with open(self.path) as f:
+            self.assertEqual(f.read(), 'previous run')
+
+
+if __name__=='__main__':
+    unittest.main()
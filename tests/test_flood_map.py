@@ -0,0 +1,50 @@
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flo2d.flood_map import FILL_VALUE, FloodMap, parse_timdep_block, write_flood_map_netcdf
+
+HAS_NETCDF4 = importlib.util.find_spec('netCDF4') is not None
+
+
+@unittest.skipUnless(HAS_NETCDF4, 'needs netCDF4')
+class WriteFloodMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_every_variable_on_the_same_raster(self):
+        from netCDF4 import Dataset
+
+        # 2 x 3 cells of 250 m with a slight jitter of the centres; cell 6 never flooded
+        step = 250 / 111320.0
+        x = 80.0 + step * np.array([0, 1, 2, 0, 1, 2]) + np.array([0, 1e-6, 0, -1e-6, 0, 1e-6])
+        y = 7.0 + step * np.array([0, 0, 0, 1, 1, 1])
+        flood_map = FloodMap([1, 2, 3, 4, 5, 6])
+        flood_map.update(1.0, parse_timdep_block(['1 0.5 0 0 0 10.5\n', '2 0.2 0 0 0 10.2\n', '4 0.1 0 0 0 9.1\n']))
+        flood_map.update(2.0, parse_timdep_block(['1 0.3 0 0 0 10.3\n', '2 0.4 0 0 0 10.4\n', '4 0.0 0 0 0 9.0\n']))
+        path = os.path.join(self.work_dir, 'flood_map.nc')
+        write_flood_map_netcdf(path, flood_map, x, y, 250, datetime(2019, 5, 24))
+
+        with Dataset(path) as nc:
+            self.assertEqual((len(nc.dimensions['lat']), len(nc.dimensions['lon'])), (2, 3))
+            np.testing.assert_array_equal(nc.variables['grid_id'][:], [[1, 2, 3], [4, 5, 6]])
+            np.testing.assert_allclose(nc.variables['max_depth'][:].filled(FILL_VALUE),
+                    [[0.5, 0.4, FILL_VALUE], [0.1, FILL_VALUE, FILL_VALUE]], rtol=1e-6)
+            np.testing.assert_array_equal(nc.variables['time_of_max'][:].filled(FILL_VALUE),
+                    [[1.0, 2.0, FILL_VALUE], [1.0, FILL_VALUE, FILL_VALUE]])
+
+
+if __name__=='__main__':
+    unittest.main()
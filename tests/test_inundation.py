@@ -0,0 +1,40 @@
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flo2d.flood_map import parse_timdep_block
+from flo2d.inundation import InundationExtent, write_inundation_csv
+
+
+class InundationExtentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_flooded_cells_above_each_threshold(self):
+        extent = InundationExtent(250, thresholds=(0.5, 0.1))
+        extent.update(0.5, parse_timdep_block(['1 0.05 0 0 0 10\n', '2 0.2 0 0 0 10\n', '3 0.7 0 0 0 10\n']))
+        extent.update(1.0, parse_timdep_block(['1 0.1 0 0 0 10\n', '2 0.6 0 0 0 10\n', '3 0.9 0 0 0 10\n']))
+        self.assertEqual(extent.cells.tolist(), [[2, 1], [2, 2]])
+
+        path = os.path.join(self.work_dir, 'inundation.csv')
+        write_inundation_csv(path, extent, datetime(2019, 5, 24))
+        with open(path) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows, [
+                ['Time', 'ModelTime', 'cells_0.1m', 'area_km2_0.1m', 'cells_0.5m', 'area_km2_0.5m'],
+                ['2019-05-24 00:30:00', '0.5', '2', '0.125', '1', '0.0625'],
+                ['2019-05-24 01:00:00', '1.0', '2', '0.125', '2', '0.125']])
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flo2d.journal import RunJournal, output_stamp, run_key_for
+from flo2d.sinks.base import Series
+
+StubSink = namedtuple('StubSink', ['key'])
+
+HAS_DB_ADAPTER = importlib.util.find_spec('db_adapter') is not None
+
+
+class RunJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.journal = RunJournal(os.path.join(self.work_dir, 'journal.db'))
+        self.sink = StubSink('curw_fcst')
+        self.series = Series('1', {'variable': 'WaterLevel', 'unit': 'm', 'unit_type': 'Instantaneous'},
+                [['2019-05-24 00:15:00', '1.0']], '2019-05-24 01:00:00')
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.work_dir)
+
+    def test_rerun_after_ok_parses_and_pushes(self):
+        self.assertFalse(self.journal.start_run('run'))
+        series, committed = self.journal.record(self.series)
+        self.journal.written(self.sink, [series])
+        self.journal.mark_parsed()
+        self.assertEqual(self.journal.finish([self.sink.key]), 'ok')
+
+        # Not a retry: the outputs are parsed again and every series pushed again
+        self.assertFalse(self.journal.start_run('run'))
+        _, committed = self.journal.record(self.series)
+        self.assertEqual(committed, set())
+        self.assertEqual(len(self.journal.pending(self.sink.key)), 1)
+
+    def test_retry_after_incomplete_replays(self):
+        self.journal.start_run('run')
+        self.journal.record(self.series)
+        self.journal.mark_parsed()
+        self.assertEqual(self.journal.finish([self.sink.key]), 'incomplete')
+
+        self.assertTrue(self.journal.start_run('run'))
+        self.assertEqual(len(self.journal.pending(self.sink.key)), 1)
+
+    def test_regenerated_outputs_change_the_run_key(self):
+        output = os.path.join(self.work_dir, 'HYCHAN.OUT')
+        with open(output, 'w') as f:
+            f.write('first\n')
+        first = run_key_for('upload_waterlevels', self.work_dir, output_stamp(output))
+        time.sleep(0.01)
+        with open(output, 'w') as f:
+            f.write('second run\n')
+        self.assertNotEqual(first, run_key_for('upload_waterlevels', self.work_dir, output_stamp(output)))
+
+    def test_later_run_resends_and_settles_spilled_series(self):
+        self.journal.start_run('run 1')
+        series, _ = self.journal.record(self.series)
+        self.journal.failed(self.sink, [series], IOError('unreachable'))
+        self.journal.mark_parsed()
+        self.assertEqual(self.journal.finish([self.sink.key]), 'incomplete')
+
+        self.journal.start_run('run 2')
+        spilled = self.journal.spilled(self.sink.key)
+        self.assertEqual([s.journal_id for s in spilled], [series.journal_id])
+        self.assertEqual(self.journal.settle([self.sink.key]), 0)
+        self.journal.written(self.sink, spilled)
+        self.assertEqual(self.journal.settle([self.sink.key]), 1)
+        self.assertEqual(self.journal.spilled(self.sink.key), [])
+
+    def test_old_runs_expire_unsent(self):
+        self.journal.start_run('run 1')
+        self.journal.record(self.series)
+        self.journal.mark_parsed()
+        self.journal.finish([self.sink.key])
+        with self.journal.connection:
+            self.journal.connection.execute("UPDATE run SET updated = '2000-01-01 00:00:00'")
+
+        self.journal.start_run('run 2')
+        self.assertEqual(self.journal.spilled(self.sink.key, max_age_hours=24), [])
+        self.assertEqual(self.journal.expire(max_age_hours=24), 1)
+        self.assertEqual(self.journal.connection.execute("SELECT COUNT(*) FROM series").fetchone()[0], 0)
+
+
+@unittest.skipUnless(HAS_DB_ADAPTER, 'needs db_adapter')
+class EngineRerunTest(unittest.TestCase):
+
+    def setUp(self):
+        import flo2d.engine
+        from benchmarks import run
+        from benchmarks.stand_in_db import StandInDatabase, install
+
+        self.work_dir = tempfile.mkdtemp()
+        self.engine = flo2d.engine
+        self.run = run
+        self.output_dir, db_args, _ = run.prepare_workspace(self.work_dir, 250, 20, 8, 4, 0.0)
+        self.config_path = os.path.join(self.work_dir, 'extract', 'config.json')
+        with open(self.config_path) as f:
+            config = json.loads(f.read())
+        config['JOURNAL_FILE'] = 'journal.db'
+        config['SINKS'] = [{'type': 'curw_fcst', 'breaker_threshold': 2, 'breaker_reset': 60}]
+        with open(self.config_path, 'w') as f:
+            f.write(json.dumps(config))
+        self.db = StandInDatabase(*db_args)
+        install(flo2d.engine, self.db)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def extract(self, run_time, fgt=None):
+        return self.engine.extract_and_upload(self.config_path, self.output_dir, self.run.TS_START_DATE,
+                self.run.TS_START_TIME, self.run.TS_START_DATE, run_time, 'upload_waterlevels', fgt=fgt)
+
+    def test_rerun_after_ok_parses_and_pushes(self):
+        rows_written = []
+        for _ in range(2):
+            summary = self.extract(self.run.TS_START_TIME)
+            self.assertEqual(summary['status'], 'ok')
+            rows_written.append(self.db.rows_written - sum(rows_written))
+        self.assertGreater(rows_written[0], 0)
+        self.assertEqual(rows_written[1], rows_written[0])
+
+    def test_next_run_commits_the_spill_of_a_failed_run(self):
+        insert_data = self.db.backend.insert_data
+
+        def unreachable(*args, **kwargs):
+            raise IOError('unreachable')
+
+        # Run N: the database is down, its circuit opens and every series is spilled to the journal
+        self.db.backend.insert_data = unreachable
+        self.extract('00:00:00', fgt='2019-05-24 05:30:00')
+        journal = RunJournal(os.path.join(self.work_dir, 'extract', 'journal.db'))
+        spilled_rows = sum(len(series.timeseries) for series in journal.spilled('curw_fcst'))
+        journal.close()
+        self.assertGreater(spilled_rows, 0)
+        self.assertEqual(len(self.db.backend.data), 0)
+
+        # Run N+1, an hour later: the spill of run N goes out before its own series
+        self.db.backend.insert_data = insert_data
+        summary = self.extract('01:00:00', fgt='2019-05-24 06:30:00')
+        self.assertEqual(summary['status'], 'ok')
+        fgts = [fgt for _, _, fgt in self.db.backend.data]
+        self.assertEqual(fgts.count('2019-05-24 05:30:00'), spilled_rows)
+        self.assertGreater(fgts.count('2019-05-24 06:30:00'), 0)
+        journal = RunJournal(os.path.join(self.work_dir, 'extract', 'journal.db'))
+        self.assertEqual(journal.connection.execute("SELECT COUNT(*) FROM run").fetchone()[0], 0)
+        journal.close()
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flo2d.flood_map import parse_timdep_block
+from flo2d.polygons import PolygonDepths, load_membership
+
+
+def square(name, lon, lat, size):
+    ring = [[lon, lat], [lon + size, lat], [lon + size, lat + size], [lon, lat + size], [lon, lat]]
+    return {'type': 'Feature', 'properties': {'name': name}, 'geometry': {'type': 'Polygon', 'coordinates': [ring]}}
+
+
+class PolygonDepthsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.geojson_path = os.path.join(self.work_dir, 'areas.geojson')
+        with open(self.geojson_path, 'w') as f:
+            f.write(json.dumps({'type': 'FeatureCollection', 'features': [
+                    square('Kolonnawa', 79.9, 6.9, 0.1), square('Kaduwela', 80.0, 6.9, 0.1),
+                    square('Galle', 80.2, 6.0, 0.1)]}))
+        self.grid_csv_path = os.path.join(self.work_dir, 'flo2d_250m.csv')
+        with open(self.grid_csv_path, 'w') as f:
+            f.write('Grid_ID,X,Y\n1,79.95,6.95\n2,79.96,6.95\n3,80.05,6.95\n4,80.5,6.5\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_depths_of_each_polygon(self):
+        depths = PolygonDepths(*load_membership(self.geojson_path, self.grid_csv_path))
+        self.assertEqual((depths.names, depths.cell_counts.tolist()), (['Kolonnawa', 'Kaduwela', 'Galle'], [2, 1, 0]))
+        # Cell 2 is missing from the block, cell 4 is outside every polygon
+        depths.update(1.0, parse_timdep_block(['1 0.5 0 0 0 10\n', '3 0.2 0 0 0 10\n', '4 3.0 0 0 0 10\n']))
+        depths.update(2.0, parse_timdep_block(['1 0.4 0 0 0 10\n', '2 0.8 0 0 0 10\n', '3 0.1 0 0 0 10\n']))
+        np.testing.assert_allclose(depths.mean_depth, [[0.5, 0.2, np.nan], [0.6, 0.1, np.nan]])
+        np.testing.assert_allclose(depths.max_depth, [[0.5, 0.2, np.nan], [0.8, 0.1, np.nan]])
+
+    def test_membership_is_read_back_from_its_cache(self):
+        built = load_membership(self.geojson_path, self.grid_csv_path)
+        self.assertTrue(os.path.exists(os.path.join(self.work_dir, 'areas.flo2d_250m.membership.npz')))
+        with mock.patch('flo2d.polygons.read_polygons', side_effect=AssertionError('GeoJSON read again')):
+            cached = load_membership(self.geojson_path, self.grid_csv_path)
+        self.assertEqual(cached[1], built[1])
+        np.testing.assert_array_equal(cached[2], built[2])
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flo2d.hychan import HYCHAN_PARSE_STAGE
+from flo2d.prometheus import MetricsState, record_run, export_run_metrics
+from flo2d.timdep import TIMDEP_PARSE_STAGE
+
+
+def run_summary(run='upload_waterlevels', status='ok', stages=None):
+    return {'run': run, 'status': status, 'labels': {'model': 'FLO2D', 'version': '250'},
+            'totals': {'wall_time': 45.0, 'rows_written': 10, 'failures': 1},
+            'stations': {'101': {'db_round_trips': 2, 'wall_time': 0.2}},
+            'stages': stages or {}}
+
+
+def export(args):
+    textfile_path, run = args
+    export_run_metrics(textfile_path, run_summary(run), finished=1.0)
+
+
+class RecordRunTest(unittest.TestCase):
+
+    def test_parse_throughput_over_the_engine_parse_stages(self):
+        state = MetricsState()
+        record_run(state, run_summary(stages={
+                HYCHAN_PARSE_STAGE: {'bytes_read': 3 * 1048576, 'wall_time': 1.0},
+                TIMDEP_PARSE_STAGE: {'bytes_read': 1048576, 'wall_time': 1.0},
+                'db_write'        : {'bytes_read': 0, 'wall_time': 30.0}}), 1.0)
+        throughput, = state.state['flo2d_pusher_parse_throughput_bytes_per_second'].values()
+        self.assertEqual(throughput['sum'], 2 * 1048576)
+
+    def test_counters_add_up_over_runs(self):
+        state = MetricsState()
+        record_run(state, run_summary(), 1.0)
+        record_run(state, run_summary(status='failed'), 2.0)
+        text = state.render()
+        self.assertIn('flo2d_pusher_rows_pushed_total{model="FLO2D",run="upload_waterlevels",version="250"} 20', text)
+        self.assertIn('flo2d_pusher_failures_total{kind="run",model="FLO2D",run="upload_waterlevels",version="250"} 1',
+                text)
+        self.assertIn('flo2d_pusher_run_duration_seconds_bucket{le="60",model="FLO2D",run="upload_waterlevels",'
+                      'version="250"} 2', text)
+
+
+class ExportRunMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.textfile_path = os.path.join(self.work_dir, 'flo2d_pusher.prom')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_concurrent_runs_keep_every_update(self):
+        runs = ['upload_waterlevels', 'upload_discharges'] * 20
+        with Pool(4) as pool:
+            pool.map(export, [(self.textfile_path, run) for run in runs])
+        with open(self.textfile_path) as f:
+            text = f.read()
+        for run in ('upload_waterlevels', 'upload_discharges'):
+            self.assertIn('flo2d_pusher_rows_pushed_total{{model="FLO2D",run="{}",version="250"}} 200'.format(run),
+                    text)
+        self.assertEqual(sorted(os.listdir(self.work_dir)),
+                ['flo2d_pusher.prom', 'flo2d_pusher.prom.state.json', 'flo2d_pusher.prom.state.json.lock'])
+
+
+if __name__=='__main__':
+    unittest.main()
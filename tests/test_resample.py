@@ -0,0 +1,52 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flo2d.resample import Resampler
+from flo2d.timeseries import MISSING_VALUE
+
+SPEC = {'variable': 'WaterLevel'}
+
+
+class ResamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = []
+        self.resampler = Resampler(lambda spec, elementNo, timeseries: self.saved.append((elementNo, timeseries)),
+                step_minutes=15)
+
+    def test_linear_interpolation_on_the_quarter_hour(self):
+        self.resampler(SPEC, '1', [['2019-05-24 00:10:00', '1.0'], ['2019-05-24 00:40:00', '4.0']])
+        self.resampler.flush()
+        self.assertEqual(self.saved, [('1', [['2019-05-24 00:15:00', 1.5], ['2019-05-24 00:30:00', 3.0]])])
+
+    def test_missing_samples_are_not_interpolated(self):
+        self.resampler(SPEC, '1', [['2019-05-24 00:00:00', '1.0'], ['2019-05-24 00:30:00', MISSING_VALUE],
+                                   ['2019-05-24 01:00:00', '3.0'], ['2019-05-24 01:30:00', '5.0']])
+        self.resampler.flush()
+        (_, timeseries), = self.saved
+        self.assertEqual(timeseries, [
+                ['2019-05-24 00:00:00', 1.0],
+                ['2019-05-24 00:15:00', MISSING_VALUE],
+                ['2019-05-24 00:30:00', MISSING_VALUE],
+                ['2019-05-24 00:45:00', MISSING_VALUE],
+                ['2019-05-24 01:00:00', 3.0],
+                ['2019-05-24 01:15:00', 4.0],
+                ['2019-05-24 01:30:00', 5.0]])
+
+    def test_last_value_across_windows(self):
+        resampler = Resampler(lambda spec, elementNo, timeseries: self.saved.append((elementNo, timeseries)),
+                step_minutes=15, default_method='last')
+        resampler(SPEC, '1', [['2019-05-24 00:00:00', '1.0'], ['2019-05-24 00:20:00', '2.0']])
+        resampler.flush()
+        resampler(SPEC, '1', [['2019-05-24 00:40:00', MISSING_VALUE]])
+        resampler.flush()
+        self.assertEqual([timeseries for _, timeseries in self.saved], [
+                [['2019-05-24 00:00:00', 1.0], ['2019-05-24 00:15:00', 1.0]],
+                [['2019-05-24 00:30:00', 2.0]]])
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flo2d.backends.memory import MemoryBackend
+from flo2d.sinks import CallTimeoutError, CircuitBreaker, CircuitOpenError, Series, Sink, SinkWriteError, \
+    TimeseriesSink, get_sinks
+from flo2d.timeseries import MISSING_VALUE
+
+
+def discharge(element, fgt, values):
+    return Series(element, {'variable': 'Discharge', 'unit': 'm3/s', 'sim_tag': 'hourly_run', 'model': 'FLO2D',
+                            'version': '250', 'unit_type': 'Instantaneous', 'latitude': 6.9, 'longitude': 80.1,
+                            'source_id': 1, 'station_id': 1, 'variable_id': 1, 'unit_id': 1},
+            [['2019-05-24 0{}:00:00'.format(i), value] for i, value in enumerate(values)], fgt)
+
+
+class FlakySink(Sink):
+    name = 'flaky'
+
+    def __init__(self, failures, **kwargs):
+        super(FlakySink, self).__init__(**kwargs)
+        self.failures = failures
+        self.calls = 0
+        self.written = []
+
+    def _write_batch(self, batch):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise IOError("write {} failed".format(self.calls))
+        self.written.extend(series.element for series in batch)
+
+
+class RetryTest(unittest.TestCase):
+
+    def test_batch_is_retried_until_it_goes_through(self):
+        sink = FlakySink(2, batch_size=2, retries=2, retry_delay=0.001)
+        for element in ('179', '180'):
+            sink.write(discharge(element, '2019-05-24 06:00:00', ['1.0']))
+        self.assertEqual((sink.calls, sink.written, sink.series_failed), (3, ['179', '180'], 0))
+
+    def test_open_circuit_refuses_writes_until_its_reset(self):
+        sink = FlakySink(2)
+        sink.breaker = CircuitBreaker(sink.name, threshold=2, reset_timeout=0.05)
+        errors = []
+        for element in ('179', '180', '181'):
+            with self.assertRaises(SinkWriteError) as context:
+                sink.write(discharge(element, '2019-05-24 06:00:00', ['1.0']))
+            errors.append(type(context.exception.cause))
+        self.assertEqual(errors, [IOError, IOError, CircuitOpenError])
+        self.assertEqual(sink.calls, 2)
+        time.sleep(0.05)
+        sink.write(discharge('182', '2019-05-24 06:00:00', ['1.0']))
+        self.assertEqual((sink.written, sink.breaker.failures), (['182'], 0))
+
+    def test_write_given_up_on_stops_before_its_next_round_trip(self):
+        backend = MemoryBackend(latency=0.1)
+        sink = TimeseriesSink(backend, timeout=0.05)
+        with self.assertRaises(SinkWriteError) as context:
+            sink.write(discharge('179', '2019-05-24 06:00:00', ['1.0', '2.0']))
+        self.assertIsInstance(context.exception.cause, CallTimeoutError)
+        time.sleep(0.2)
+        sink.close()
+        self.assertEqual((backend.runs, backend.data), ({}, {}))
+
+
+class SummarySinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_runs_share_one_store_next_to_the_config(self):
+        specs = [{'type': 'summary', 'path': 'hydrograph_summary.db'}]
+        for run, fgt in enumerate(['2019-05-24 06:00:00', '2019-05-24 12:00:00']):
+            output_dir = os.path.join(self.work_dir, 'output_{}'.format(run))
+            os.mkdir(output_dir)
+            sinks = get_sinks(specs, None, output_dir, config_dir=self.work_dir)
+            sinks.write(discharge('179', fgt, ['1.0', '3.0', '2.0']))
+            sinks.close()
+            self.assertEqual(os.listdir(output_dir), [])
+        connection = sqlite3.connect(os.path.join(self.work_dir, 'hydrograph_summary.db'))
+        rows = connection.execute("SELECT fgt, peak, peak_time, volume FROM hydrograph_summary ORDER BY fgt").fetchall()
+        connection.close()
+        self.assertEqual(rows, [('2019-05-24 06:00:00', 3.0, '2019-05-24 01:00:00', 4.5 * 3600),
+                                ('2019-05-24 12:00:00', 3.0, '2019-05-24 01:00:00', 4.5 * 3600)])
+
+    def test_missing_values_are_left_out(self):
+        sinks = get_sinks([{'type': 'summary', 'path': 'hydrograph_summary.db'}], None, self.work_dir)
+        sinks.write(discharge('179', '2019-05-24 06:00:00', ['1.0', str(MISSING_VALUE), '3.0']))
+        sinks.write(discharge('180', '2019-05-24 06:00:00', [str(MISSING_VALUE)] * 3))
+        sinks.close()
+        connection = sqlite3.connect(os.path.join(self.work_dir, 'hydrograph_summary.db'))
+        rows = connection.execute("SELECT element, n, mean, volume FROM hydrograph_summary").fetchall()
+        connection.close()
+        self.assertEqual(rows, [('179', 2, 2.0, 4.0 * 3600)])
+
+
+class DeltaModeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_next_run_only_sends_the_chunks_that_changed(self):
+        backend = MemoryBackend()
+        specs = [{'type': 'curw_fcst', 'fingerprint_file': 'fingerprints.db', 'delta_chunk': 2}]
+        runs = [('2019-05-24 06:00:00', ['1.0', '2.0', '3.0', '4.0']),
+                ('2019-05-24 07:00:00', ['1.0', '2.0', '3.0', '5.0'])]
+        for run, (fgt, values) in enumerate(runs):
+            output_dir = os.path.join(self.work_dir, 'output_{}'.format(run))
+            os.mkdir(output_dir)
+            sinks = get_sinks(specs, backend, output_dir, config_dir=self.work_dir)
+            sinks.write(discharge('179', fgt, values))
+            sinks.close()
+        self.assertTrue(os.path.exists(os.path.join(self.work_dir, 'fingerprints.db')))
+        self.assertEqual(sorted(time_[-8:] + ' ' + fgt[-8:] for _, time_, fgt in backend.data), [
+                '00:00:00 06:00:00', '01:00:00 06:00:00', '02:00:00 06:00:00', '02:00:00 07:00:00',
+                '03:00:00 06:00:00', '03:00:00 07:00:00'])
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flo2d.obs_mapping import map_stations, ObsStation, MAPPED, OUTSIDE
+from flo2d.spatial import GridIndex, load_grid_index
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class GridIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(3)
+        # A ragged grid of about 250 m cells, with a hole in the middle
+        lons, lats = np.meshgrid(79.85 + np.arange(40) * 0.00226, 6.90 + np.arange(30) * 0.00226)
+        keep = (np.abs(lons - 79.9) > 0.01) | (np.abs(lats - 6.93) > 0.01)
+        self.x, self.y = lons[keep], lats[keep]
+        self.grid_ids = np.arange(1, len(self.x) + 1)
+        self.index = GridIndex(self.grid_ids, self.x, self.y)
+        self.lons = random.uniform(79.80, 80.00, 200)
+        self.lats = random.uniform(6.85, 7.00, 200)
+
+    def brute_force(self, lon, lat):
+        px, py = self.index.project(self.x, self.y)
+        qx, qy = self.index.project(lon, lat)
+        return np.sort(np.hypot(px - qx, py - qy))
+
+    def test_k_nearest_many_matches_brute_force(self):
+        grid_ids, distances = self.index.k_nearest_many(self.lons, self.lats, 5)
+        self.assertEqual(grid_ids.shape, (200, 5))
+        for i in range(len(self.lons)):
+            np.testing.assert_allclose(distances[i], self.brute_force(self.lons[i], self.lats[i])[:5])
+            self.assertEqual(grid_ids[i, 0], self.index.nearest(self.lons[i], self.lats[i])[0])
+
+    def test_nearest_many_matches_brute_force(self):
+        grid_ids, distances = self.index.nearest_many(self.lons, self.lats)
+        np.testing.assert_allclose(distances, [self.brute_force(lon, lat)[0] for lon, lat in zip(self.lons, self.lats)])
+
+    def test_more_cells_than_the_grid_has(self):
+        grid_ids, distances = self.index.k_nearest_many([79.9], [6.93], len(self.grid_ids) + 2)
+        self.assertEqual(sorted(grid_ids[0, :-2]), list(self.grid_ids))
+        self.assertEqual(list(grid_ids[0, -2:]), [-1, -1])
+        self.assertTrue(np.isinf(distances[0, -2:]).all())
+
+    def test_within(self):
+        grid_ids, distances = self.index.within(79.87, 6.95, 600)
+        self.assertEqual(len(grid_ids), (self.brute_force(79.87, 6.95) <= 600).sum())
+        self.assertTrue((np.diff(distances) >= 0).all())
+
+
+class ObsMappingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.grid_dir = tempfile.mkdtemp()
+        for grid_csv in ('flo2d_250m.csv', 'flo2d_150m.csv'):
+            shutil.copy(os.path.join(REPO_DIR, grid_csv), self.grid_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.grid_dir)
+
+    def test_stations_are_mapped_in_one_batch(self):
+        index = load_grid_index(os.path.join(self.grid_dir, 'flo2d_250m.csv'))
+        x, y = index.x[100], index.y[100]
+        stations = [ObsStation(1, 'on a cell', y, x), ObsStation(2, 'at sea', y, x - 1.0)]
+        matches = map_stations(stations, self.grid_dir, alternatives=3)
+
+        on_cell, at_sea = matches['FLO2D_250']
+        self.assertEqual((on_cell.grid_id, on_cell.status), (int(index.grid_ids[100]), MAPPED))
+        self.assertEqual(len(on_cell.alternatives), 3)
+        self.assertNotIn(on_cell.grid_id, [grid_id for grid_id, distance in on_cell.alternatives])
+        self.assertEqual(at_sea.status, OUTSIDE)
+
+
+if __name__=='__main__':
+    unittest.main()
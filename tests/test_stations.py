@@ -0,0 +1,107 @@
+import os
+import sys
+import unittest
+from collections import OrderedDict
+from enum import Enum
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flo2d.stations import diff_stations, mapped_stations, sync_stations
+
+
+class StationType(Enum):
+    FLO2D_250 = 1000000
+
+    @staticmethod
+    def getRange(station_type):
+        return 1000
+
+
+class StubCursor(object):
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, sql, args):
+        self.statements.append((sql, args))
+
+    def executemany(self, sql, rows):
+        self.statements.append((sql, rows))
+
+    def fetchall(self):
+        return self.rows
+
+
+class StubConnection(object):
+
+    def __init__(self, cursor):
+        self.stub_cursor = cursor
+        self.committed = False
+
+    def cursor(self):
+        return self.stub_cursor
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class StubPool(object):
+
+    def __init__(self, rows):
+        self.stub_connection = StubConnection(StubCursor(rows))
+
+    def connection(self):
+        return self.stub_connection
+
+
+GRIDS = [[str(i + 1), '79.{:03d}'.format(i), '6.{:03d}'.format(i)] for i in range(10)]
+PARAMS = {'CHANNEL_CELL_MAP': OrderedDict([('2', 'Hanwella'), ('5', 'Glencourse'), ('7', 'Kithulgala')]),
+          'FLOOD_PLAIN_CELL_MAP': {}}
+
+
+class SyncStationsTest(unittest.TestCase):
+
+    def test_cells_with_several_stations_are_reported_not_renamed(self):
+        mapped = mapped_stations(PARAMS, GRIDS, 'FLO2D_250')
+        diff = diff_stations(mapped, {'2': [(1000001, '2_Hanwella'), (1000004, '2_Hanwella_old')],
+                                      '5': [(1000002, '5_Glencourse_old')]})
+        self.assertEqual(list(diff.duplicated), ['2'])
+        self.assertEqual([(id_, station.name) for id_, station in diff.renamed], [(1000002, '5_Glencourse')])
+        self.assertEqual([station.name for station in diff.new], ['7_Kithulgala'])
+        self.assertEqual(diff.unchanged, 0)
+
+    def test_new_stations_take_ids_after_the_last_of_the_locked_range(self):
+        pool = StubPool([(1000000, '2_Hanwella'), (1000003, '5_Glencourse')])
+        diffs = sync_stations(pool, [(StationType.FLO2D_250, 'FLO2D_250', PARAMS, GRIDS)])
+
+        statements = pool.stub_connection.stub_cursor.statements
+        select, select_args = statements[0]
+        self.assertTrue(select.endswith('FOR UPDATE'))
+        self.assertEqual(select_args, (1000000, 1001000))
+        insert, rows = statements[1]
+        self.assertTrue(insert.startswith('INSERT'))
+        self.assertEqual([(row[0], row[1]) for row in rows], [(1000004, '7_Kithulgala')])
+        self.assertEqual(diffs['FLO2D_250'].unchanged, 2)
+        self.assertTrue(pool.stub_connection.committed)
+
+    def test_full_range_is_refused(self):
+        pool = StubPool([(1000999, '2_Hanwella')])
+        with self.assertRaises(ValueError):
+            sync_stations(pool, [(StationType.FLO2D_250, 'FLO2D_250', PARAMS, GRIDS)])
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flo2d.timeseries import MISSING_VALUE
+from flo2d.verification import CsvObservations, VerificationStore, to_datetime64, verify
+
+TIMES = ['2019-05-24 00:00:00', '2019-05-24 01:00:00', '2019-05-24 02:00:00', '2019-05-24 03:00:00']
+
+
+class VerifyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.observations_path = os.path.join(self.work_dir, 'observations.csv')
+        with open(self.observations_path, 'w') as f:
+            f.write('station,time,value\n')
+            for time_, value in zip(TIMES, [1.0, 2.0, MISSING_VALUE, 1.0]):
+                f.write('Hanwella,{},{}\n'.format(time_, value))
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_missing_values_make_no_pair(self):
+        # The forecast is missing at 01:00 and the observation at 02:00, only 00:00 and 03:00 are scored
+        series = OrderedDict([('Hanwella', (to_datetime64(TIMES), np.array([1.5, MISSING_VALUE, 3.0, 2.0])))])
+        score, = verify(series, CsvObservations(self.observations_path), 'WaterLevel')
+        self.assertEqual(score.n, 2)
+        self.assertAlmostEqual(score.bias, 0.75)
+        self.assertAlmostEqual(score.rmse, np.sqrt((0.5 ** 2 + 1.0 ** 2) / 2))
+        self.assertEqual(score.observed_peak, 1.0)
+        self.assertEqual(score.forecast_peak, 2.0)
+
+    def test_scores_are_stored_per_run(self):
+        series = OrderedDict([('Hanwella', (to_datetime64(TIMES), np.array([1.0, 2.0, 0.5, 1.0])))])
+        scores = verify(series, CsvObservations(self.observations_path), 'WaterLevel')
+        store = VerificationStore(os.path.join(self.work_dir, 'verification.db'))
+        run = {'fgt': '2019-05-24 06:00:00', 'sim_tag': 'hourly_run', 'model': 'FLO2D', 'version': '250'}
+        store.save(run, 'WaterLevel', scores, {'Hanwella': '3559'})
+        row, = store.load('2019-05-24 06:00:00')
+        self.assertEqual((row['station'], row['element'], row['n'], row['rmse']), ('Hanwella', '3559', 3, 0.0))
+        self.assertEqual(row['nse'], 1.0)
+
+
+if __name__=='__main__':
+    unittest.main()